@@ -0,0 +1,172 @@
+import os
+import argparse
+import warnings
+import torch
+from colorama import Fore, Style
+
+from models.inference import HDHGNInference, HDHGNOnnxOutputs, ONNX_INPUT_NAMES, ONNX_OUTPUT_NAMES
+from registry import LANGUAGES, BACKENDS
+
+# Formats the models can be exported to and the file extensions of the exported models
+EXPORT_FORMATS = {
+    "torchscript": ".torchscript.pt",
+    "onnx": ".onnx",
+    "int8": ".int8.pt",
+}
+
+# Methods of the inference model kept in the frozen TorchScript archives besides forward
+PRESERVED_METHODS = ["embed", "classify"]
+
+
+def load_model(model_path: str):
+    """
+    Load a trained HDHGN model on the CPU in eval mode.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter(action='ignore', category=FutureWarning)
+        model = torch.load(model_path, map_location="cpu", weights_only=False)
+    return model.eval()
+
+
+def example_inputs():
+    """
+    Return the inputs of a small batch of two hypergraphs used to trace the model.
+    """
+    x = torch.zeros(5, dtype=torch.long)
+    types = torch.zeros(5, dtype=torch.long)
+    edge_types = torch.zeros(3, dtype=torch.long)
+    edge_in_out_indexs = torch.tensor([[0, 0, 1, 1, 2, 2], [0, 1, 1, 2, 3, 4]])
+    edge_in_out_head_tail = torch.tensor([0, 1, 0, 1, 0, 1])
+    batch = torch.tensor([0, 0, 0, 1, 1])
+    return x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch
+
+
+def export_torchscript(model_path: str, output_path: str):
+    """
+    Export a trained HDHGN model to a TorchScript archive.
+
+    The archive contains the inference-only model (HDHGNInference) compiled by TorchScript and frozen. It takes
+    x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch and optionally edge_in_out_node_order,
+    and it is loaded with torch.jit.load, without the Python model classes. The embed method returns the pooled
+    vectors of the graphs.
+
+    Args:
+        model_path (str): Path to the trained model saved by the training script.
+        output_path (str): Path to save the TorchScript archive.
+
+    Returns:
+        torch.jit.ScriptModule: The exported model.
+    """
+    scripted = torch.jit.script(HDHGNInference(load_model(model_path)).eval())
+    scripted = torch.jit.freeze(scripted, preserved_attrs=PRESERVED_METHODS)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    torch.jit.save(scripted, output_path)
+    return scripted
+
+
+def export_onnx(model_path: str, output_path: str):
+    """
+    Export a trained HDHGN model to ONNX.
+
+    The inference-only model (HDHGNInference) is traced with the segments reduced by scatter operators, as the
+    operators of torch_scatter have no ONNX counterpart. The numbers of nodes, node-edges, hyperedges and graphs
+    are dynamic. The model takes x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail and batch, the
+    node-edges and the batch do not have to be sorted. It returns the output and the pooled vectors (embedding).
+
+    Args:
+        model_path (str): Path to the trained model saved by the training script.
+        output_path (str): Path to save the ONNX model.
+    """
+    model = HDHGNOnnxOutputs(HDHGNInference(load_model(model_path), scatter=True)).eval()
+    dynamic_axes = {
+        "x": {0: "num_nodes"},
+        "types": {0: "num_nodes"},
+        "edge_types": {0: "num_edges"},
+        "edge_in_out_indexs": {1: "num_node_edges"},
+        "edge_in_out_head_tail": {0: "num_node_edges"},
+        "batch": {0: "num_nodes"},
+        "output": {0: "num_graphs"},
+        "embedding": {0: "num_graphs"},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter(action='ignore')
+        torch.onnx.export(model, example_inputs(), output_path, input_names=ONNX_INPUT_NAMES, output_names=ONNX_OUTPUT_NAMES,
+                          dynamic_axes=dynamic_axes, opset_version=18, dynamo=False)
+
+
+def export_int8(model_path: str, output_path: str):
+    """
+    Export a trained HDHGN model quantized to int8 to a TorchScript archive.
+
+    The linear layers of the inference-only model (HDHGNInference) are quantized dynamically: the weights are
+    stored as int8 and the activations are quantized on the fly for each batch, so no calibration data is needed.
+    This covers the query, key-value, edge and update projections of every layer and the MLP. The embeddings,
+    normalization and attention pooling stay in float32. The quantized model runs on the CPU.
+
+    Args:
+        model_path (str): Path to the trained model saved by the training script.
+        output_path (str): Path to save the TorchScript archive.
+
+    Returns:
+        torch.jit.ScriptModule: The exported model.
+    """
+    model = HDHGNInference(load_model(model_path)).eval()
+    with warnings.catch_warnings():
+        warnings.simplefilter(action='ignore', category=DeprecationWarning)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    scripted = torch.jit.freeze(torch.jit.script(model), preserved_attrs=PRESERVED_METHODS)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    torch.jit.save(scripted, output_path)
+    return scripted
+
+
+def ExportModel(languages: list, export_format: str = "torchscript"):
+    """
+    Export the trained models of the given languages to the default paths of the format.
+
+    Args:
+        languages (list): Languages of the models ("Python", "C").
+        export_format (str): Format of the exported models ("torchscript", "onnx" or "int8").
+    """
+    export = EXPORTERS[export_format]
+    for language in languages:
+        model_path = LANGUAGES[language]["model_path"]
+        output_path = LANGUAGES[language][BACKENDS[export_format]]
+        if not os.path.exists(model_path):
+            print(Fore.RED + f"Error: The {language} model could not be found: " + Style.RESET_ALL + model_path)
+            continue
+        export(model_path, output_path)
+        print(Fore.GREEN + f"Exported the {language} model to: " + Style.RESET_ALL + output_path)
+
+
+# Export function of each format
+EXPORTERS = {
+    "torchscript": export_torchscript,
+    "onnx": export_onnx,
+    "int8": export_int8,
+}
+
+
+if __name__ == '__main__':
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="ExportModel", description="Export the trained HDHGN models to TorchScript, ONNX or int8 TorchScript.")
+
+    # Adding optional arguments
+    parser.add_argument("-l", "--languages", help="Languages of the models to export", type=str, nargs="+", choices=list(LANGUAGES), default=list(LANGUAGES))
+    parser.add_argument("-f", "--format", help="Format of the exported models", type=str, choices=list(EXPORT_FORMATS), default="torchscript")
+    parser.add_argument("-mp", "--model_path", help="Path to a trained model to export instead of the default ones", type=str, default="")
+    parser.add_argument("-o", "--output_path", help="Path to save the exported model given by --model_path", type=str, default="")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    if args.model_path:
+        output_path = args.output_path or os.path.splitext(args.model_path)[0] + EXPORT_FORMATS[args.format]
+        EXPORTERS[args.format](args.model_path, output_path)
+        print(Fore.GREEN + "Exported the model to: " + Style.RESET_ALL + output_path)
+    else:
+        ExportModel(args.languages, args.format)
@@ -1,10 +1,15 @@
 import os
 import ast
+import json
+import numpy as np
 import torch
-from torch_geometric.data import Dataset, Data
-from pycparser import c_parser, c_ast, parse_file
+from concurrent.futures import ProcessPoolExecutor
+from colorama import Fore, Style
+from torch_geometric.data import Dataset, InMemoryDataset, Data
 
 from utilities.utils import pre_walk_tree, pre_walk_tree_c
+from utilities.preprocessor import parse_c_file
+from models.layers import sort_incidences
 from vocab import Vocab
 
 class HDHGData(Data):
@@ -20,14 +25,199 @@ class HDHGData(Data):
         """
         if key == 'edge_in_out_indexs':
             return torch.tensor([[self.edge_types.size(0)], [self.x.size(0)]])
+        elif key == 'edge_in_out_node_order':
+            return self.edge_in_out_head_tail.size(0)
         else:
             return super().__inc__(key, value, *args, **kwargs)
 
+
+def encode_tree(vocab: Vocab, tree: tuple, labels: torch.Tensor = None):
+    """
+    Encode the output of the AST walk into a data object using the vocabulary.
+
+    Args:
+        vocab (Vocab): Vocabulary of the language the tree was parsed as.
+        tree (tuple): The output of the AST walk.
+        labels (torch.Tensor): Label of the source file, if known.
+
+    Returns:
+        HDHGData: Data object of the encoded tree.
+    """
+    index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = tree
+
+    # Encode types, features, and edge types
+    types_encoded = [vocab.vocab["types"].word2id[t] for t in types]
+    types_encoded = torch.tensor(types_encoded, dtype=torch.long)
+    features_encoded = [vocab.vocab[types[i]].word2id.get(f, 1) for (i, f) in enumerate(features)]
+    features_encoded = torch.tensor(features_encoded, dtype=torch.long)
+    edge_types_encoded = [vocab.vocab["edge_types"].word2id.get(e, 1) for e in edge_types]
+    edge_types_encoded = torch.tensor(edge_types_encoded, dtype=torch.long)
+    edge_in_out_indexs_encoded = torch.tensor([edge_in_out_indexs_s, edge_in_out_indexs_t], dtype=torch.long)
+    edge_in_out_head_tail_encoded = torch.tensor(edge_in_out_head_tail, dtype=torch.long)
+    # Sort the node-edges by the hyperedge and keep their node order for the CSR incidence structure
+    edge_in_out_indexs_encoded, edge_in_out_head_tail_encoded, edge_in_out_node_order = sort_incidences(
+        edge_in_out_indexs_encoded, edge_in_out_head_tail_encoded)
+
+    # Create data object
+    data = HDHGData(x=features_encoded, types=types_encoded, edge_types=edge_types_encoded,
+                    edge_in_out_indexs=edge_in_out_indexs_encoded, edge_in_out_head_tail=edge_in_out_head_tail_encoded,
+                    edge_in_out_node_order=edge_in_out_node_order)
+    if labels is not None:
+        data.labels = labels
+    return data
+
+
+def parse_python_file(file_path: str):
+    """
+    Parse a Python source file and walk its AST.
+    """
+    with open(file_path, encoding="utf-8") as file:
+        root = ast.parse(file.read())
+    return pre_walk_tree(root, 0, 0)
+
+
+def parse_c_source_file(file_path: str):
+    """
+    Parse a C source file and walk its AST.
+    """
+    return pre_walk_tree_c(parse_c_file(file_path), 0, 0)
+
+
+# Names of the files of the packed dataset layout
+PACKED_DATA_FILE_NAME = "packed_data.bin"
+PACKED_INDEX_FILE_NAME = "packed_index.npy"
+
+
+def pack_samples(processed_dir: str, file_names: list):
+    """
+    Convert the per-sample layout (one .pt file per sample) into the packed layout.
+
+    All tensors of all samples are written one after another into a single int64 file. The index holds for
+    each sample its offset in that file and its number of nodes, edges and node-edge incidences. Samples
+    processed before the node-edges were sorted are sorted while packing.
+
+    Args:
+        processed_dir (str): Directory containing the per-sample files, where the packed files are written.
+        file_names (list): Names of the per-sample files in the order of the dataset.
+    """
+    data_path = os.path.join(processed_dir, PACKED_DATA_FILE_NAME)
+    index = np.zeros((len(file_names), 4), dtype=np.int64)
+    offset = 0
+    with open(data_path + ".tmp", "wb") as file:
+        for i, file_name in enumerate(file_names):
+            d = torch.load(os.path.join(processed_dir, file_name), weights_only=False)
+            if "edge_in_out_node_order" not in d:
+                d.edge_in_out_indexs, d.edge_in_out_head_tail, d.edge_in_out_node_order = sort_incidences(
+                    d.edge_in_out_indexs, d.edge_in_out_head_tail)
+            values = np.concatenate([d.x.numpy(), d.types.numpy(), d.edge_types.numpy(),
+                                     d.edge_in_out_indexs.numpy().reshape(-1), d.edge_in_out_head_tail.numpy(),
+                                     d.edge_in_out_node_order.numpy(), d.labels.numpy().reshape(-1)[:1]]).astype("<i8")
+            values.tofile(file)
+            index[i] = (offset, d.x.size(0), d.edge_types.size(0), d.edge_in_out_head_tail.size(0))
+            offset += values.size
+    np.save(os.path.join(processed_dir, PACKED_INDEX_FILE_NAME), index)
+    os.replace(data_path + ".tmp", data_path)
+
+
+class PackedStorage:
+    """
+    Read-only access to the packed dataset layout.
+
+    The data file is memory-mapped when first accessed, so every process (e.g. a DataLoader worker) maps it
+    on its own and the samples are views into the mapping instead of unpickled objects.
+    """
+    def __init__(self, processed_dir: str):
+        """
+        Initialize the storage.
+
+        Args:
+            processed_dir (str): Directory containing the packed files.
+        """
+        self.data_path = os.path.join(processed_dir, PACKED_DATA_FILE_NAME)
+        self.index = np.load(os.path.join(processed_dir, PACKED_INDEX_FILE_NAME))
+        self.data = None
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def __getstate__(self):
+        # The memory mapping is not sent to other processes, each one maps the file itself
+        state = self.__dict__.copy()
+        state["data"] = None
+        return state
+
+    def get(self, idx: int):
+        """
+        Get the data object at the specified index.
+
+        Args:
+            idx (int): Index of the data object to retrieve.
+
+        Returns:
+            HDHGData: Data object with tensors viewing the memory-mapped file.
+        """
+        if self.data is None:
+            if len(self) == 0:
+                # Nothing was packed because no sample could be processed, and an empty file cannot be mapped
+                self.data = torch.zeros(0, dtype=torch.long)
+            else:
+                # Copy-on-write mapping, so the tensors are writable without changing the file
+                self.data = torch.from_numpy(np.memmap(self.data_path, dtype="<i8", mode="c"))
+
+        offset, num_nodes, num_edges, num_nodeedges = self.index[idx].tolist()
+        sizes = [num_nodes, num_nodes, num_edges, 2 * num_nodeedges, num_nodeedges, num_nodeedges, 1]
+        x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, edge_in_out_node_order, labels = \
+            self.data[offset:offset + sum(sizes)].split(sizes)
+        return HDHGData(x=x, types=types, edge_types=edge_types,
+                        edge_in_out_indexs=edge_in_out_indexs.view(2, num_nodeedges),
+                        edge_in_out_head_tail=edge_in_out_head_tail, edge_in_out_node_order=edge_in_out_node_order,
+                        labels=labels)
+
+
+# Vocabulary of the worker processes, set once by init_worker instead of being sent with every file
+_worker_vocab = None
+
+
+def init_worker(vocab: Vocab):
+    """
+    Initialize a worker process of the dataset processing pool.
+    """
+    global _worker_vocab
+    _worker_vocab = vocab
+    torch.set_num_threads(1)
+
+
+def process_source_file(task: tuple):
+    """
+    Parse, walk, encode and save a single source file.
+
+    Args:
+        task (tuple): Index of the sample, path to the source file, parse function, processed directory
+            and vocabulary (None in a worker process, which uses the vocabulary set by init_worker).
+
+    Returns:
+        str: Error message, None if the file was processed successfully.
+    """
+    i, file_path, parse, processed_dir, vocab = task
+    vocab = vocab or _worker_vocab
+    try:
+        tree = parse(file_path)
+        labels = torch.tensor([vocab.vocab["labels"].word2id[file_path.split("/")[-2]]], dtype=torch.long)
+        d = encode_tree(vocab, tree, labels)
+        torch.save(d, os.path.join(processed_dir, f"processed_data_{i}.pt"))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
 class HDHGNDataset(Dataset):
     """
     Custom dataset class for HDHGN Python model.
     """
-    def __init__(self, root: str, paths_file_path: str, vocab: Vocab):
+    # Function parsing a source file into the output of the AST walk
+    parse = staticmethod(parse_python_file)
+
+    def __init__(self, root: str, paths_file_path: str, vocab: Vocab, num_workers: int = 0, packed: bool = False):
         """
         Initialize the Python dataset.
 
@@ -35,63 +225,98 @@ class HDHGNDataset(Dataset):
             root (str): Root directory where the Python dataset should be saved.
             paths_file_path (str): Path to the file containing paths of the Python source files.
             vocab (Vocab): Python Vocabulary object.
+            num_workers (int): Number of worker processes used to process the source files. 0 processes them serially.
+            packed (bool): Whether to store all samples in a single memory-mapped file instead of one file per sample.
         """
         self.paths_file_path = paths_file_path
         self.vocab = vocab
+        self.num_workers = num_workers
+        self.packed = packed
+        self.packed_storage = None
         self.processed_file_names_list = []
 
-        # Read file paths and create processed file names list
+        # Read file paths and create processed file names list, skipping the files that failed to process
+        failed = self.read_failed(os.path.join(root, "processed"))
         paths_file = open(self.paths_file_path)
         for i, file_path in enumerate(paths_file):
-            self.processed_file_names_list.append(f"processed_data_{i}.pt")
+            if i not in failed:
+                self.processed_file_names_list.append(f"processed_data_{i}.pt")
         paths_file.close()
 
         super().__init__(root, transform=None, pre_transform=None, pre_filter=None)
 
+        if self.packed:
+            self.packed_storage = PackedStorage(self.processed_dir)
+
     @property
     def processed_file_names(self):
         """
         Return the list of processed file names.
         """
+        if self.packed:
+            return [PACKED_DATA_FILE_NAME, PACKED_INDEX_FILE_NAME]
         return self.processed_file_names_list
 
+    @staticmethod
+    def read_failed(processed_dir: str):
+        """
+        Return the indices of the source files that failed to process.
+        """
+        failed_path = os.path.join(processed_dir, "failed.json")
+        if not os.path.exists(failed_path):
+            return set()
+        with open(failed_path) as file:
+            return set(int(i) for i in json.load(file))
+
     def process(self):
         """
         Process the source files and save the processed data.
+
+        With num_workers > 0 the files are parsed, walked and encoded in a process pool. The output file of each
+        source file is named after its line in the paths file, so the indices do not depend on the order in which
+        the workers finish. Files that fail are reported, listed in failed.json and left out of the dataset.
+
+        In the packed mode the per-sample files are converted into the packed layout afterwards. Per-sample files
+        left by an earlier run are converted without processing the source files again.
         """
-        paths_file = open(self.paths_file_path)
-        for i, file_path in enumerate(paths_file):
-            file_path = "../" + file_path.strip()
-            file = open(file_path, encoding="utf-8")
-            code = file.read()
-
-            root = ast.parse(code)
-            index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = pre_walk_tree(
-                root, 0, 0)
-            types_encoded = [self.vocab.vocab["types"].word2id[t] for t in types]
-            types_encoded = torch.tensor(types_encoded, dtype=torch.long)
-            features_encoded = [self.vocab.vocab[types[i]].word2id.get(f, 1) for (i, f) in enumerate(features)]
-            features_encoded = torch.tensor(features_encoded, dtype=torch.long)
-            edge_types_encoded = [self.vocab.vocab["edge_types"].word2id.get(e, 1) for e in edge_types]
-            edge_types_encoded = torch.tensor(edge_types_encoded, dtype=torch.long)
-            edge_in_out_indexs_encoded = torch.tensor([edge_in_out_indexs_s, edge_in_out_indexs_t], dtype=torch.long)
-            edge_in_out_head_tail_encoded = torch.tensor(edge_in_out_head_tail, dtype=torch.long)
-            file_path = file_path.strip()
-            labels = torch.tensor([self.vocab.vocab["labels"].word2id[file_path.split("/")[-2]]], dtype=torch.long)
-
-            d = HDHGData(x=features_encoded, types=types_encoded, edge_types=edge_types_encoded,
-                         edge_in_out_indexs=edge_in_out_indexs_encoded,
-                         edge_in_out_head_tail=edge_in_out_head_tail_encoded, labels=labels)
-
-            torch.save(d, os.path.join(self.processed_dir, f"processed_data_{i}.pt"))
+        if self.packed and all(os.path.exists(os.path.join(self.processed_dir, file_name))
+                               for file_name in self.processed_file_names_list):
+            pack_samples(self.processed_dir, self.processed_file_names_list)
+            return
 
+        paths_file = open(self.paths_file_path)
+        files_paths = ["../" + file_path.strip() for file_path in paths_file]
         paths_file.close()
 
+        if self.num_workers > 0:
+            tasks = [(i, file_path, self.parse, self.processed_dir, None) for i, file_path in enumerate(files_paths)]
+            with ProcessPoolExecutor(max_workers=self.num_workers, initializer=init_worker, initargs=(self.vocab,)) as executor:
+                errors = list(executor.map(process_source_file, tasks, chunksize=max(1, len(tasks) // (self.num_workers * 4))))
+        else:
+            errors = [process_source_file((i, file_path, self.parse, self.processed_dir, self.vocab))
+                      for i, file_path in enumerate(files_paths)]
+
+        failed = {}
+        for i, (file_path, error) in enumerate(zip(files_paths, errors)):
+            if error is not None:
+                print(Fore.RED + f"Failed to process file: {file_path}. File will be ignored. Error: {error}" + Style.RESET_ALL)
+                failed[i] = file_path
+        with open(os.path.join(self.processed_dir, "failed.json"), "w") as file:
+            json.dump(failed, file, indent=2)
+        if failed:
+            print(f"{len(failed)} of {len(files_paths)} files failed to process.")
+
+        self.processed_file_names_list = [f"processed_data_{i}.pt" for i in range(len(files_paths)) if i not in failed]
+        if self.packed:
+            pack_samples(self.processed_dir, self.processed_file_names_list)
+
     def len(self):
         """
         Return the length of the dataset.
         """
-        return len(self.processed_file_names)
+        if self.packed_storage is not None:
+            return len(self.packed_storage)
+        return len(self.processed_file_names_list)
 
     def get(self, idx: int):
         """
@@ -103,89 +328,332 @@ class HDHGNDataset(Dataset):
         Returns:
             HDHGData: Data object at the specified index.
         """
-        import warnings
-        warnings.simplefilter(action='ignore', category=FutureWarning)
-        d = torch.load(os.path.join(self.processed_dir, f'processed_data_{idx}.pt'))
-        return d
+        if self.packed_storage is not None:
+            return self.packed_storage.get(idx)
 
+        # The samples are data objects, which are only loaded with weights_only=False
+        return torch.load(os.path.join(self.processed_dir, self.processed_file_names_list[idx]), weights_only=False)
 
-class HDHGNDataset_C(Dataset):
+
+class HDHGNDataset_C(HDHGNDataset):
     """
     Custom dataset class for HDHGN C model.
+
+    Processed the same way as the Python dataset, but the source files are parsed as C code.
+    """
+    # Function parsing a source file into the output of the AST walk
+    parse = staticmethod(parse_c_source_file)
+
+
+def gather_slices(ptr: torch.Tensor, idx: torch.Tensor):
+    """
+    Gather the positions of the slices of the selected samples in a collated storage.
+
+    Args:
+        ptr (torch.Tensor): Slice pointers of an attribute, the i-th sample occupies positions ptr[i]:ptr[i + 1].
+        idx (torch.Tensor): Indices of the selected samples.
+
+    Returns:
+        torch.Tensor: Positions of the selected slices, concatenated in the order of the indices.
+        torch.Tensor: Length of each selected slice.
+    """
+    starts = ptr[idx]
+    lengths = ptr[idx + 1] - starts
+    offsets = torch.cumsum(lengths, 0) - lengths
+    positions = torch.arange(int(lengths.sum()), dtype=torch.long) + torch.repeat_interleave(starts - offsets, lengths)
+    return positions, lengths
+
+
+class HDHGNInMemoryDataset(InMemoryDataset):
+    """
+    In-memory variant of the HDHGN Python dataset.
+
+    The whole split is built once from the per-sample dataset and kept as one collated storage with slice
+    pointers, which is saved to processed/in_memory.pt and loaded with a single read afterwards.
     """
-    def __init__(self, root: str, paths_file_path: str, vocab: Vocab):
+    # Dataset the in-memory storage is built from
+    dataset_class = HDHGNDataset
+
+    def __init__(self, root: str, paths_file_path: str, vocab: Vocab, num_workers: int = 0):
         """
-        Initialize the C dataset.
+        Initialize the in-memory Python dataset.
 
         Args:
-            root (str): Root directory where the C dataset should be saved.
-            paths_file_path (str): Path to the file containing paths of the C source files.
-            vocab (Vocab): C Vocabulary object.
+            root (str): Root directory where the Python dataset should be saved.
+            paths_file_path (str): Path to the file containing paths of the Python source files.
+            vocab (Vocab): Python Vocabulary object.
+            num_workers (int): Number of worker processes used to process the source files. 0 processes them serially.
         """
         self.paths_file_path = paths_file_path
         self.vocab = vocab
-        self.processed_file_names_list = []
-
-        # Read file paths and create processed file names list
-        paths_file = open(self.paths_file_path)
-        for i, file_path in enumerate(paths_file):
-            self.processed_file_names_list.append(f"processed_data_{i}.pt")
-        paths_file.close()
-
+        self.num_workers = num_workers
         super().__init__(root, transform=None, pre_transform=None, pre_filter=None)
+        self.load(self.processed_paths[0], data_cls=HDHGData)
 
     @property
     def processed_file_names(self):
         """
         Return the list of processed file names.
         """
-        return self.processed_file_names_list
+        return ["in_memory.pt"]
 
     def process(self):
         """
-        Process the source files and save the processed data.
+        Build the per-sample dataset and save all of its samples as one collated storage.
         """
-        paths_file = open(self.paths_file_path)
-        for i, file_path in enumerate(paths_file):
-            file_path = "../" + file_path.strip()
-            root = parse_file(file_path, use_cpp=True, cpp_path="clang", cpp_args=["-E", "-I" + "../utilities/fake_libc_include", "-std=c99"])
-            index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = pre_walk_tree_c(
-                root, 0, 0)
-            types_encoded = [self.vocab.vocab["types"].word2id[t] for t in types]
-            types_encoded = torch.tensor(types_encoded, dtype=torch.long)
-            features_encoded = [self.vocab.vocab[types[i]].word2id.get(f, 1) for (i, f) in enumerate(features)]
-            features_encoded = torch.tensor(features_encoded, dtype=torch.long)
-            edge_types_encoded = [self.vocab.vocab["edge_types"].word2id.get(e, 1) for e in edge_types]
-            edge_types_encoded = torch.tensor(edge_types_encoded, dtype=torch.long)
-            edge_in_out_indexs_encoded = torch.tensor([edge_in_out_indexs_s, edge_in_out_indexs_t], dtype=torch.long)
-            edge_in_out_head_tail_encoded = torch.tensor(edge_in_out_head_tail, dtype=torch.long)
-            labels = torch.tensor([self.vocab.vocab["labels"].word2id[file_path.split("/")[-2]]], dtype=torch.long)
-
-            d = HDHGData(x=features_encoded, types=types_encoded, edge_types=edge_types_encoded,
-                         edge_in_out_indexs=edge_in_out_indexs_encoded,
-                         edge_in_out_head_tail=edge_in_out_head_tail_encoded, labels=labels)
-
-            torch.save(d, os.path.join(self.processed_dir, f"processed_data_{i}.pt"))
+        dataset = self.dataset_class(self.root, self.paths_file_path, self.vocab, num_workers=self.num_workers)
+        self.save([dataset.get(i) for i in range(dataset.len())], self.processed_paths[0])
 
-        paths_file.close()
 
-    def len(self):
+class HDHGNInMemoryDataset_C(HDHGNInMemoryDataset):
+    """
+    In-memory variant of the HDHGN C dataset.
+    """
+    # Dataset the in-memory storage is built from
+    dataset_class = HDHGNDataset_C
+
+
+def graph_sizes(dataset):
+    """
+    Return the numbers of nodes and node-edges of the graphs of a dataset.
+
+    The sizes are read from the slice pointers of an in-memory dataset or from the index of a packed dataset.
+    The samples of a per-sample dataset are loaded once.
+
+    Args:
+        dataset (HDHGNDataset | HDHGNInMemoryDataset): The dataset.
+
+    Returns:
+        torch.Tensor: Number of nodes of each graph.
+        torch.Tensor: Number of node-edges of each graph.
+    """
+    if isinstance(dataset, InMemoryDataset):
+        idx = torch.as_tensor(list(dataset.indices()), dtype=torch.long)
+        return dataset.slices["x"].diff()[idx], dataset.slices["edge_in_out_head_tail"].diff()[idx]
+    if dataset.packed_storage is not None:
+        index = torch.from_numpy(dataset.packed_storage.index)
+        return index[:, 1], index[:, 3]
+    samples = [dataset.get(i) for i in range(dataset.len())]
+    return (torch.tensor([d.x.size(0) for d in samples], dtype=torch.long),
+            torch.tensor([d.edge_in_out_head_tail.size(0) for d in samples], dtype=torch.long))
+
+
+class BucketBatchSampler(torch.utils.data.Sampler):
+    """
+    Batch sampler grouping graphs of similar size and filling each batch up to a node and node-edge budget.
+
+    Graphs are sorted by their number of nodes and added to a batch as long as the totals of the batch stay
+    within the budgets, so the batches of small graphs hold many of them and the memory and time of a step do
+    not depend on which graphs were drawn. A graph larger than a budget makes a batch on its own.
+
+    Without shuffling the graphs are sorted by size, so the batches are the same in every epoch. When shuffling,
+    the graphs are shuffled, split into buckets of bucket_size graphs and sorted within each bucket by their
+    number of nodes multiplied by a random factor from [1 - size_jitter, 1 + size_jitter] drawn every epoch.
+    Graphs of similar size therefore land in different batches in every epoch, while the batches stay close to
+    uniform in size. Finally the order of the batches is shuffled.
+
+    The sampler yields lists of positions in the dataset, so it is used as the batch_sampler of a DataLoader over
+    an HDHGNDataset or as the batch_sampler of an InMemoryBatchLoader.
+    """
+    def __init__(self, num_nodes: torch.Tensor, num_node_edges: torch.Tensor, max_nodes: int = None,
+                 max_node_edges: int = None, shuffle: bool = False, bucket_size: int = 1024, size_jitter: float = 0.2):
         """
-        Return the length of the dataset.
+        Initialize the sampler.
+
+        Args:
+            num_nodes (torch.Tensor): Number of nodes of each graph, as returned by graph_sizes.
+            num_node_edges (torch.Tensor): Number of node-edges of each graph, as returned by graph_sizes.
+            max_nodes (int): Maximum number of nodes in a batch. None for no limit.
+            max_node_edges (int): Maximum number of node-edges in a batch. None for no limit.
+            shuffle (bool): Whether to shuffle the batches in every epoch.
+            bucket_size (int): Number of graphs sorted together when shuffling.
+            size_jitter (float): Relative random change of the sizes the graphs are sorted by when shuffling.
         """
-        return len(self.processed_file_names)
+        if max_nodes is None and max_node_edges is None:
+            raise ValueError("At least one of max_nodes and max_node_edges must be set.")
+        self.num_nodes = num_nodes.tolist()
+        self.num_node_edges = num_node_edges.tolist()
+        self.max_nodes = max_nodes if max_nodes is not None else float("inf")
+        self.max_node_edges = max_node_edges if max_node_edges is not None else float("inf")
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size
+        self.size_jitter = size_jitter
+        self.num_batches = None
+
+    def __len__(self):
+        # Number of batches of the graphs sorted without shuffling, the shuffled epochs can differ slightly
+        if self.num_batches is None:
+            self.num_batches = len(self.fill(sorted(range(len(self.num_nodes)), key=self.num_nodes.__getitem__)))
+        return self.num_batches
+
+    def __iter__(self):
+        if not self.shuffle:
+            yield from self.fill(sorted(range(len(self.num_nodes)), key=self.num_nodes.__getitem__))
+            return
+        sizes = torch.tensor(self.num_nodes, dtype=torch.float64)
+        sizes *= 1 + self.size_jitter * (2 * torch.rand(len(sizes), dtype=torch.float64) - 1)
+        order = []
+        for bucket in torch.randperm(len(self.num_nodes)).split(self.bucket_size):
+            order.extend(bucket[sizes[bucket].argsort()].tolist())
+        batches = self.fill(order)
+        for i in torch.randperm(len(batches)).tolist():
+            yield batches[i]
 
-    def get(self, idx):
+    def fill(self, order: list):
         """
-        Get the data object at the specified index.
+        Split the graphs in the given order into consecutive batches within the budgets.
+        """
+        batches, batch, nodes, node_edges = [], [], 0, 0
+        for i in order:
+            if batch and (nodes + self.num_nodes[i] > self.max_nodes or node_edges + self.num_node_edges[i] > self.max_node_edges):
+                batches.append(batch)
+                batch, nodes, node_edges = [], 0, 0
+            batch.append(i)
+            nodes += self.num_nodes[i]
+            node_edges += self.num_node_edges[i]
+        if batch:
+            batches.append(batch)
+        return batches
+
+
+def init_loader_worker(worker_id: int):
+    """
+    Initialize a worker process of the batch loader, which gathers one batch at a time on a single thread.
+    """
+    torch.set_num_threads(1)
+
+
+class BatchIndices:
+    """
+    Sampler yielding the indices of the samples of each batch of an InMemoryBatchLoader.
+    """
+    def __init__(self, loader: "InMemoryBatchLoader"):
+        self.loader = loader
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        return self.loader.batch_indices()
+
+
+class InMemoryBatchLoader:
+    """
+    Data loader producing batches of an in-memory dataset by index slicing.
+
+    Instead of separating every sample from the storage and collating the samples again, the tensors of a batch
+    are gathered from the collated storage at once and the incidence indices are shifted to the batch.
+
+    With num_workers > 0 the batches are gathered in worker processes of a torch DataLoader, which prefetches
+    prefetch_factor batches per worker while the model computes on the current one. The batches are shuffled
+    in the main process, so they are the same as without workers.
+    """
+    def __init__(self, dataset: HDHGNInMemoryDataset, batch_size: int = 1, shuffle: bool = False, drop_last: bool = False,
+                 num_workers: int = 0, persistent_workers: bool = False, prefetch_factor: int = 2, pin_memory: bool = False,
+                 batch_sampler: BucketBatchSampler = None):
+        """
+        Initialize the loader.
 
         Args:
-            idx (int): Index of the data object to retrieve.
+            dataset (HDHGNInMemoryDataset): The in-memory dataset.
+            batch_size (int): Number of samples in a batch.
+            shuffle (bool): Whether to shuffle the samples in every epoch.
+            drop_last (bool): Whether to drop the last incomplete batch.
+            num_workers (int): Number of worker processes gathering the batches. 0 gathers them in the main process.
+            persistent_workers (bool): Whether to keep the worker processes alive between epochs.
+            prefetch_factor (int): Number of batches prefetched by each worker.
+            pin_memory (bool): Whether to put the batches in pinned memory for faster copies to the GPU.
+            batch_sampler (BucketBatchSampler): Sampler of the batches. If given, batch_size, shuffle and drop_last
+                are ignored.
+        """
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.pin_memory = pin_memory
+        self.batch_sampler = batch_sampler
+        self.workers_loader = None
+        if num_workers > 0:
+            self.workers_loader = torch.utils.data.DataLoader(self, batch_size=None, sampler=BatchIndices(self),
+                                                              num_workers=num_workers, persistent_workers=persistent_workers,
+                                                              prefetch_factor=prefetch_factor, pin_memory=pin_memory,
+                                                              worker_init_fn=init_loader_worker,
+                                                              # The seeds of the workers, which draw no random numbers, are
+                                                              # not taken from the generator shuffling the batches
+                                                              generator=torch.Generator())
+
+    def __len__(self):
+        if self.batch_sampler is not None:
+            return len(self.batch_sampler)
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, idx: torch.Tensor):
+        # Called by the workers with the indices of a batch
+        return self.collate(idx)
+
+    def __getstate__(self):
+        # The DataLoader of the workers stays in the main process
+        state = self.__dict__.copy()
+        state["workers_loader"] = None
+        return state
+
+    def __iter__(self):
+        if self.workers_loader is not None:
+            yield from self.workers_loader
+            return
+        for idx in self.batch_indices():
+            batch = self.collate(idx)
+            yield batch.pin_memory() if self.pin_memory else batch
+
+    def batch_indices(self):
+        """
+        Yield the indices of the samples of each batch of an epoch.
+        """
+        indices = self.dataset.indices()
+        indices = torch.as_tensor(indices if isinstance(indices, list) else list(indices), dtype=torch.long)
+        if self.batch_sampler is not None:
+            for batch in self.batch_sampler:
+                yield indices[torch.tensor(batch, dtype=torch.long)]
+            return
+        if self.shuffle:
+            indices = indices[torch.randperm(len(indices))]
+        for start in range(0, len(indices), self.batch_size):
+            idx = indices[start:start + self.batch_size]
+            if self.drop_last and len(idx) < self.batch_size:
+                break
+            yield idx
+
+    def collate(self, idx: torch.Tensor):
+        """
+        Gather the batch of the selected samples from the collated storage.
+
+        Args:
+            idx (torch.Tensor): Indices of the samples in the storage.
 
         Returns:
-            HDHGData: Data object at the specified index.
+            HDHGData: The batch, with the batch vector and number of graphs like a PyG Batch.
         """
-        import warnings
-        warnings.simplefilter(action='ignore', category=FutureWarning)
-        d = torch.load(os.path.join(self.processed_dir, f'processed_data_{idx}.pt'))
-        return d
\ No newline at end of file
+        data, slices = self.dataset._data, self.dataset.slices
+
+        nodes, num_nodes = gather_slices(slices["x"], idx)
+        edges, num_edges = gather_slices(slices["edge_types"], idx)
+        nodeedges, num_nodeedges = gather_slices(slices["edge_in_out_indexs"], idx)
+        labels, _ = gather_slices(slices["labels"], idx)
+
+        # Shift the incidence indices of every sample by the numbers of edges and nodes of the samples before it
+        increment = torch.stack([torch.cumsum(num_edges, 0) - num_edges, torch.cumsum(num_nodes, 0) - num_nodes])
+        edge_in_out_indexs = data.edge_in_out_indexs[:, nodeedges] + torch.repeat_interleave(increment, num_nodeedges, dim=1)
+
+        batch = torch.repeat_interleave(torch.arange(len(idx)), num_nodes)
+        out = HDHGData(x=data.x[nodes], types=data.types[nodes], edge_types=data.edge_types[edges],
+                       edge_in_out_indexs=edge_in_out_indexs, edge_in_out_head_tail=data.edge_in_out_head_tail[nodeedges],
+                       labels=data.labels[labels], batch=batch, num_graphs=len(idx))
+
+        # The node order of every sample is shifted by the numbers of node-edges of the samples before it
+        if "edge_in_out_node_order" in slices:
+            node_order, _ = gather_slices(slices["edge_in_out_node_order"], idx)
+            out.edge_in_out_node_order = data.edge_in_out_node_order[node_order] + \
+                torch.repeat_interleave(torch.cumsum(num_nodeedges, 0) - num_nodeedges, num_nodeedges)
+        return out
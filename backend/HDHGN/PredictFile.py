@@ -1,125 +1,357 @@
 import sys
 import os
 import argparse
+import threading
 import torch
 import ast
+from collections import Counter
 from colorama import Fore, Style
-from pycparser import c_parser, parse_file
+from pycparser import c_parser
+from torch_geometric.data import Batch
 
 sys.path.append(os.path.dirname(__file__))
 
-from MyDataset import HDHGData
-from vocab import Vocab
+from MyDataset import encode_tree
+from registry import BACKENDS, DEFAULT_BACKEND, get_registry, configure_registry
+from embedding_index import IndexNotBuilt, get_index, embed_graphs
+from prediction_cache import get_prediction_cache, configure_prediction_cache, source_hash
+from reference_store import get_reference_store, configure_reference_stores
 from utilities.utils import pre_walk_tree, pre_walk_tree_c
+from utilities.detect_language import detect_language
+from utilities.preprocessor import parse_c_file, parse_c_source
 
 
-def predict(file_path: str, model_path = "", vocab_path = ""):
+# Number of files parsed by each path: detected as Python, detected as C, or trying both parsers. The files are
+# parsed by the request threads and the job workers at once, so the counts are changed under the lock
+parse_paths = Counter()
+parse_paths_lock = threading.Lock()
+
+
+def count_parse_path(path: str):
+    with parse_paths_lock:
+        parse_paths[path] += 1
+
+
+def parse_python(code: str):
     """
-    Predict the label for a given file using a pre-trained model.
+    Parse the code as Python code and walk its AST.
 
     Args:
-        file_path (str): Path to the file to be predicted.
-        model_path (str): Path to the pre-trained model.
-        vocab_path (str): Path to the vocabulary file.
+        code (str): The source code.
 
     Returns:
-        [(str, float, float)]: List of tuples containing the label, similarity value, and probability.
-        str: The type of file that was predicted (Python or C).
+        tuple: The output of the AST walk, None if the code could not be parsed.
     """
-    python_parsed = False # Tells if the file was parsed as a Python file
-    c_parsed = False # Tells if the file was parsed as a C file
+    try:
+        root = ast.parse(code)
+        return pre_walk_tree(root, 0, 0)
+    except SyntaxError:
+        print("The file could not be parsed as Python code due to a unknown syntax error.")
+    except Exception as e:
+        print("The file could not be parsed as Python code:")
+        print(e)
+    return None
 
-    # Process the file
+
+def parse_c(file_path: str, source: bytes = None, source_dir: str = None):
+    """
+    Parse the file as C code and walk its AST.
+
+    Args:
+        file_path (str): Path to the source file.
+        source (bytes): Contents of the file. If given, the file is not read and file_path is only its name.
+        source_dir (str): Directory of the file on disk the source was read from, searched for its includes.
+
+    Returns:
+        tuple: The output of the AST walk, None if the file could not be parsed.
+    """
+    try:
+        if source is not None:
+            root = parse_c_source(source.decode('utf-8', errors='replace'), os.path.basename(file_path), local_dir=source_dir)
+        else:
+            root = parse_c_file(file_path)
+        return pre_walk_tree_c(root, 0, 0)
+    except c_parser.ParseError:
+        print("The file could not be parsed as C code due to a parsing error.")
+    except Exception as e:
+        print("The file could not be parsed as C code:")
+        print(e)
+    return None
+
+
+def parse_source(file_path: str, source: bytes = None, source_dir: str = None):
+    """
+    Detect the language of a source file, parse it and walk its AST.
+
+    The parser is picked up front by the language detector. Only when the detector is unsure the file is
+    parsed as Python code and, if that fails, as C code. The path taken is counted in parse_paths.
+
+    Args:
+        file_path (str): Path to the source file.
+        source (bytes): Contents of the file, e.g. an upload held in memory. If given, the file is not read
+            and file_path is only its name.
+        source_dir (str): Directory of the file on disk the source was read from, searched for the includes
+            of C code. None for an upload.
+
+    Returns:
+        str: The language the file was parsed as (Python or C), None if the file could not be parsed.
+        tuple: The output of the AST walk, None if the file could not be parsed.
+    """
     file_path = file_path.strip()
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            None
+        if source is not None:
+            code = source.decode('utf-8')
+        else:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                code = file.read()
     except FileNotFoundError:
         print(Fore.RED + "Error: The file could not be found: " + Style.RESET_ALL + file_path )
         return None, None
+    except UnicodeDecodeError:
+        code = None
+
+    file_lang, reason = detect_language(file_path, code)
+    if file_lang == "Python":
+        print(f"Parsing the file as Python code (detected by {reason}).")
+        count_parse_path("Python")
+        tree = parse_python(code)
+    elif file_lang == "C":
+        print(f"Parsing the file as C code (detected by {reason}).")
+        count_parse_path("C")
+        tree = parse_c(file_path, source, source_dir)
+    else:
+        print("The language of the file could not be detected, trying to parse it as Python and C code.")
+        count_parse_path("fallback")
+        file_lang = "Python"
+        tree = parse_python(code) if code is not None else None
+        if tree is None:
+            file_lang = "C"
+            tree = parse_c(file_path, source, source_dir)
 
+    if tree is None:
+        print(Fore.RED + "Error: The file could not be processed as " + ("either Python or C" if reason == "unsure" else file_lang) + " code." + Style.RESET_ALL)
+        return None, None
+    return file_lang, tree
+
+
+def read_source(file_path: str):
+    """
+    Read a source file once for both the prediction cache and the parser.
+
+    Args:
+        file_path (str): Path to the source file.
+
+    Returns:
+        bytes: Contents of the file, None if the file could not be read.
+        str: Directory of the file, None if the file could not be read.
+    """
+    file_path = file_path.strip()
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            root = ast.parse(file.read())
-        index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = pre_walk_tree(root, 0, 0)
+        with open(file_path, 'rb') as file:
+            return file.read(), os.path.dirname(os.path.abspath(file_path))
+    except OSError:
+        return None, None
 
-        vocab_path = os.path.join(os.path.dirname(__file__), "data/vocab4ast.json")
-        model_path = os.path.join(os.path.dirname(__file__), "work_dir/HDHGN/HDHGN.pt")
-        python_parsed = True
-    except SyntaxError:
-        print("The file could not be parsed as Python code due to a unknown syntax error.")
-    except Exception as e:
-        print("The file could not be parsed as Python code:")
-        print(e)
 
-    if not python_parsed:
-        try:
-            fake_lib_path = os.path.join(os.path.dirname(__file__), "utilities/fake_libc_include")  
-            root = parse_file(file_path, use_cpp=True, cpp_path="clang", cpp_args=["-E", f"-I{fake_lib_path}", "-std=c99"])
-            index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = pre_walk_tree_c(root, 0, 0)
-
-            vocab_path = os.path.join(os.path.dirname(__file__), "data/vocab4ast_c.json")
-            model_path = os.path.join(os.path.dirname(__file__), "work_dir/HDHGN_C/HDHGN_C.pt")
-            c_parsed = True
-        except c_parser.ParseError:
-            print("The file could not be parsed as C code due to a parsing error.")
-        except Exception as e:
-            print("The file could not be parsed as C code:")
-            print(e)
-
-    if not python_parsed and not c_parsed:
-        print(Fore.RED + "Error: The file could not be processed as either Python or C code." + Style.RESET_ALL)
+def decode_output(output: torch.Tensor, probabilities: torch.Tensor, labels: list):
+    """
+    Decode the output of the model for a single file into a list sorted by the similarity value.
+
+    Args:
+        output (torch.Tensor): Output of the model for the file [label_size].
+        probabilities (torch.Tensor): Probabilities of the labels for the file [label_size].
+        labels (list): Labels from the vocabulary.
+
+    Returns:
+        [(str, float, float)]: List of tuples containing the label, similarity value, and probability.
+    """
+    sorted_values, sorted_indices = torch.sort(output, descending=True)
+    sorted_probabilities = probabilities[sorted_indices]
+
+    # Create output frame
+    output_frame = []
+    for i, value, probability in zip(sorted_indices.tolist(), sorted_values.tolist(), sorted_probabilities.tolist()):
+        output_frame.append((labels[i], value, probability))
+    return output_frame
+
+
+def predict(file_path: str, model_path = "", vocab_path = "", use_cache = True):
+    """
+    Predict the label for a given file using a pre-trained model.
+
+    The model and vocabulary are taken from the process-wide registry, so they are loaded from disk only once
+    per process and reloaded when the files change. Results of files already predicted with the same model
+    are taken from the prediction cache without parsing the file.
+
+    Args:
+        file_path (str): Path to the file to be predicted.
+        model_path (str): Path to the pre-trained model. Defaults to the model for the detected language.
+        vocab_path (str): Path to the vocabulary file. Defaults to the vocabulary for the detected language.
+        use_cache (bool): Whether to use the prediction cache.
+
+    Returns:
+        [(str, float, float)]: List of tuples containing the label, similarity value, and probability.
+        str: The type of file that was predicted (Python or C).
+    """
+    registry = get_registry()
+    cache = get_prediction_cache() if use_cache else None
+
+    source, source_dir = read_source(file_path)
+
+    # Look up the cached results
+    file_hash = source_hash(source) if cache is not None and source is not None else None
+    if file_hash is not None:
+        output_frame, file_lang = cache.get(file_hash, lambda language: registry.fingerprint(language, model_path, vocab_path))
+        if output_frame is not None:
+            print("Using cached prediction.")
+            return output_frame, file_lang
+
+    # Process the file
+    file_lang, tree = parse_source(file_path, source, source_dir)
+    if file_lang is None:
         return None, None
-    else:
-        print(Fore.GREEN + "Predicting " + Fore.LIGHTBLUE_EX + ("Python" if python_parsed else "C") + Fore.GREEN + " file..." + Style.RESET_ALL)
+    print(Fore.GREEN + "Predicting " + Fore.LIGHTBLUE_EX + file_lang + Fore.GREEN + " file..." + Style.RESET_ALL)
 
-    # Load vocab
-    vocab = Vocab.load(vocab_path)
-    
-    # Load model
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    import warnings
-    warnings.simplefilter(action='ignore', category=FutureWarning)
-    model = torch.load(model_path, map_location=torch.device("cuda:0" if torch.cuda.is_available() else "cpu"))
-    model = model.to(device)
-    model.eval()
-
-    # Encode types, features, and edge types
-    types_encoded = [vocab.vocab["types"].word2id[t] for t in types]
-    types_encoded = torch.tensor(types_encoded, dtype=torch.long)
-    features_encoded = [vocab.vocab[types[i]].word2id.get(f, 1) for (i, f) in enumerate(features)]
-    features_encoded = torch.tensor(features_encoded, dtype=torch.long)
-    edge_types_encoded = [vocab.vocab["edge_types"].word2id.get(e, 1) for e in edge_types]
-    edge_types_encoded = torch.tensor(edge_types_encoded, dtype=torch.long)
-    edge_in_out_indexs_encoded = torch.tensor([edge_in_out_indexs_s, edge_in_out_indexs_t], dtype=torch.long)
-    edge_in_out_head_tail_encoded = torch.tensor(edge_in_out_head_tail, dtype=torch.long)
-    
-    # Create data object
-    data = HDHGData(x=features_encoded, types=types_encoded, edge_types=edge_types_encoded,
-                    edge_in_out_indexs=edge_in_out_indexs_encoded, edge_in_out_head_tail=edge_in_out_head_tail_encoded)
+    # Get the loaded model and vocab
+    entry = registry.get(file_lang, model_path, vocab_path)
+    vocab = entry.vocab
+    model = entry.model
+    device = entry.device
+
+    data = encode_tree(vocab, tree)
     data.batch = torch.zeros(data.x.size(0), dtype=torch.long)  # Add batch index
     data = data.to(device)
     
     # Make prediction
     with torch.no_grad():
-        output = model(data.x, data.types, data.edge_types, data.edge_in_out_indexs, data.edge_in_out_head_tail, data.batch)
+        output = model(data.x, data.types, data.edge_types, data.edge_in_out_indexs, data.edge_in_out_head_tail, data.batch,
+                       data.edge_in_out_node_order)
         probabilities = torch.nn.functional.softmax(output, dim=-1)
 
     # Decode predictions
     labels = list(vocab.vocab["labels"].word2id.keys())
+    output_frame = decode_output(output[0].cpu(), probabilities[0].cpu(), labels)
+    if file_hash is not None:
+        cache.put(file_hash, file_lang, entry.fingerprint, output_frame)
 
-    sorted_indices = torch.argsort(output, descending=True)
-    sorted_labels = [labels[i] for i in sorted_indices[0]]
-    sorted_values = [output[0][i].item() for i in sorted_indices[0]]
-    sorted_probabilities = torch.sort(probabilities, descending=True).values
+    print("Done predicting.")
+    return output_frame, file_lang
 
-    # Create output frame
-    output_frame = []
-    for label, value, probability in zip(sorted_labels, sorted_values, sorted_probabilities[0]):
-        output_frame.append((label, value, probability.item()))
+
+def predict_batch(file_paths: list, use_cache = True, sources = None):
+    """
+    Predict the labels for many files at once.
+
+    The files are parsed and grouped by language, and each group is collated into one batch,
+    so the model runs a single forward pass per language instead of one per file.
+    Files found in the prediction cache are not parsed at all.
+
+    Args:
+        file_paths (list): Paths to the files to be predicted.
+        use_cache (bool): Whether to use the prediction cache.
+        sources (list): Contents of the files as bytes, e.g. uploads held in memory. If given, the files are
+            not read from disk and file_paths are only their names.
+
+    Returns:
+        list: For each file, in the order of file_paths, a tuple with the output frame and the type of the file
+        as returned by predict. Both are None if the file could not be processed.
+    """
+    registry = get_registry()
+    cache = get_prediction_cache() if use_cache else None
+    results = [(None, None)] * len(file_paths)
+    if sources is None:
+        sources, source_dirs = zip(*[read_source(file_path) for file_path in file_paths]) if file_paths else ((), ())
+    else:
+        source_dirs = [None] * len(file_paths)
+    file_hashes = [None] * len(file_paths)
+    if cache is not None:
+        file_hashes = [None if source is None else source_hash(source) for source in sources]
+
+    # Process the files and group them by language
+    groups = {}
+    for position, file_path in enumerate(file_paths):
+        if file_hashes[position] is not None:
+            output_frame, file_lang = cache.get(file_hashes[position], registry.fingerprint)
+            if output_frame is not None:
+                results[position] = (output_frame, file_lang)
+                continue
+
+        file_lang, tree = parse_source(file_path, sources[position], source_dirs[position])
+        if file_lang is not None:
+            groups.setdefault(file_lang, []).append((position, tree))
+
+    for file_lang, items in groups.items():
+        print(Fore.GREEN + "Predicting " + str(len(items)) + " " + Fore.LIGHTBLUE_EX + file_lang + Fore.GREEN + " files..." + Style.RESET_ALL)
+
+        # Get the loaded model and vocab
+        entry = registry.get(file_lang)
+        vocab = entry.vocab
+        model = entry.model
+
+        batch = Batch.from_data_list([encode_tree(vocab, tree) for position, tree in items])
+        batch = batch.to(entry.device)
+
+        # Make prediction
+        with torch.no_grad():
+            output = model(batch.x, batch.types, batch.edge_types, batch.edge_in_out_indexs, batch.edge_in_out_head_tail, batch.batch,
+                           batch.edge_in_out_node_order)
+            probabilities = torch.nn.functional.softmax(output, dim=-1)
+        output = output.cpu()
+        probabilities = probabilities.cpu()
+
+        # Decode predictions and map them back to the files
+        labels = list(vocab.vocab["labels"].word2id.keys())
+        for row, (position, tree) in enumerate(items):
+            output_frame = decode_output(output[row], probabilities[row], labels)
+            if file_hashes[position] is not None:
+                cache.put(file_hashes[position], file_lang, entry.fingerprint, output_frame)
+            results[position] = (output_frame, file_lang)
 
     print("Done predicting.")
-    return output_frame, "Python" if python_parsed else "C"
+    return results
+
+
+def find_similar(file_paths: list, top_k = 5, sources = None):
+    """
+    Find the files of the indexed corpus most similar to each of the given files.
+
+    The files are parsed and grouped by language like in predict_batch, and the pooled vectors of each group
+    are computed in one pass of the model and searched in the embedding index of the language.
+
+    Args:
+        file_paths (list): Paths to the files.
+        top_k (int): Number of the returned similar files.
+        sources (list): Contents of the files as bytes. If given, the files are not read from disk and
+            file_paths are only their names.
+
+    Returns:
+        list: For each file, in the order of file_paths, a tuple with the list of (name, path, cosine similarity)
+        of the similar files and the type of the file. Both are None if the file could not be processed.
+
+    Raises:
+        IndexNotBuilt: If the index of a language of the files is not built for the current model and corpus.
+    """
+    registry = get_registry()
+    results = [(None, None)] * len(file_paths)
+    sources = sources if sources is not None else [None] * len(file_paths)
+
+    # Process the files and group them by language
+    groups = {}
+    for position, file_path in enumerate(file_paths):
+        file_lang, tree = parse_source(file_path, sources[position])
+        if file_lang is not None:
+            groups.setdefault(file_lang, []).append((position, tree))
+
+    for file_lang, items in groups.items():
+        print(Fore.GREEN + "Searching files similar to " + str(len(items)) + " " + Fore.LIGHTBLUE_EX + file_lang + Fore.GREEN + " files..." + Style.RESET_ALL)
+        entry = registry.get(file_lang)
+        index = get_index(file_lang, entry)
+        vectors = embed_graphs(entry, [encode_tree(entry.vocab, tree) for position, tree in items])
+        for (position, tree), similar in zip(items, index.search(vectors, top_k)):
+            results[position] = (similar, file_lang)
+
+    print("Done searching.")
+    return results
 
 
 if __name__ == '__main__':
@@ -130,11 +362,13 @@ if __name__ == '__main__':
     parser.add_argument("-fp", "--file_path", help = "Path to the file to be predicted", type = str, required=True)
     parser.add_argument("-mp", "--model_path", help = "Path to the pre-trained model", type = str, default="")
     parser.add_argument("-vp", "--vocab_path", help = "Path to the vocabulary file", type = str, default="")
+    parser.add_argument("-b", "--backend", help = "Backend running the default model", type = str, choices = list(BACKENDS), default = DEFAULT_BACKEND)
     parser.add_argument("-s", "--show_output", help = "Whether to show the probabilities for each label or not", type=bool, action = argparse.BooleanOptionalAction, default = False)
 
     # Read arguments from command line
     args = parser.parse_args()
 
+    configure_registry(args.backend)
     print(Fore.GREEN + "Making predictions..." + Style.RESET_ALL, end="\n", flush=True)
     model_path = args.model_path
     vocab_path = args.vocab_path
@@ -3,7 +3,9 @@ import os
 import ast
 from colorama import Fore, Style
 from sklearn.model_selection import train_test_split
-from pycparser import c_parser, parse_file
+from pycparser import c_parser
+
+from utilities.preprocessor import parse_c_file
 
 
 def splitdata(source_files_path: str):
@@ -100,7 +102,7 @@ def splitdata_c(source_files_path: str):
             if file_name.endswith('.c'):
                 file_path = os.path.join(root, file_name)
                 try:
-                    parse_file(file_path, use_cpp=True, cpp_path="clang", cpp_args=["-E", "-I./utilities/fake_libc_include", "-std=c99"])
+                    parse_c_file(file_path)
                     files_paths.append(file_path.replace("\\", "/"))
                     labels.append(root)
                 except c_parser.ParseError as e:
@@ -7,25 +7,18 @@ from utilities.prepare_source_files import prepare_source_files
 from utilities.clear_train_directories import clear_train_directories
 from ProcessData import ProccesData
 from vocab import make_vocab
-from trains.trainHDHGN_c import TrainHDHGN_C
-from trains.trainHDHGN import TrainHDHGN
-
-from MyDataset import HDHGData
-from vocab import Vocab
-from utilities import 
-from models.HDHGN import HDHGN 
+from trains.train import DEFAULT_CONFIGS, load_config, train_concurrently
 
 
 def TrainModel():
     """
-    Train the HDHGN model.
+    Train the HDHGN models of both languages.
     """
     prepare_source_files()
     clear_train_directories()
     ProccesData()
     make_vocab()
-    TrainHDHGN_C()
-    TrainHDHGN()
+    train_concurrently([load_config(config_path) for config_path in DEFAULT_CONFIGS])
     
 
 if __name__ == '__main__':
@@ -0,0 +1,510 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+import torch
+from colorama import Fore, Style
+from torch_geometric.data import Batch
+
+sys.path.append(os.path.dirname(__file__))
+
+from MyDataset import encode_tree, parse_python_file, parse_c_source_file
+from registry import BASE_DIR, LANGUAGES, BACKENDS, DEFAULT_BACKEND, get_registry, configure_registry
+
+# Kinds of the vector indexes: exact search over all vectors or the approximate inverted file index
+INDEX_KINDS = ("flat", "ivf")
+
+# Names of the files of a saved index
+VECTORS_FILE_NAME = "vectors.npy"
+IVF_FILE_NAME = "ivf.npz"
+META_FILE_NAME = "meta.json"
+
+# Minimum number of seconds between the checks whether the indexed corpus changed
+CORPUS_CHECK_INTERVAL = 60.0
+
+
+class IndexNotBuilt(Exception):
+    """
+    Error raised when there is no saved index matching the current model and corpus of a language.
+    """
+    pass
+
+
+def normalize(vectors: np.ndarray):
+    """
+    Scale the vectors to unit length, so their dot products are the cosine similarities.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def resolve_path(path: str):
+    """
+    Return the absolute path of a file stored in an index.
+    """
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def top_k(scores: np.ndarray, k: int):
+    """
+    Return the positions and values of the k highest scores in each row, sorted from the highest.
+    """
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64), np.zeros(scores.shape[:-1] + (0,), dtype=scores.dtype)
+    positions = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    values = np.take_along_axis(scores, positions, axis=-1)
+    order = np.argsort(-values, axis=-1, kind="stable")
+    return np.take_along_axis(positions, order, axis=-1), np.take_along_axis(values, order, axis=-1)
+
+
+class FlatIndex:
+    """
+    Exact search comparing the query with every vector in a single matrix product.
+    """
+    kind = "flat"
+
+    def __init__(self, vectors: np.ndarray):
+        """
+        Initialize the index.
+
+        Args:
+            vectors (np.ndarray): Normalized vectors [num_vectors, dim].
+        """
+        self.vectors = vectors
+
+    def add(self, vectors: np.ndarray):
+        """
+        Add normalized vectors to the index.
+        """
+        self.vectors = np.concatenate([self.vectors, vectors])
+
+    def search(self, queries: np.ndarray, k: int):
+        """
+        Find the k vectors most similar to each of the normalized queries.
+
+        Returns:
+            np.ndarray: Ids of the found vectors [num_queries, k].
+            np.ndarray: Their cosine similarities [num_queries, k].
+        """
+        return top_k(queries @ self.vectors.T, k)
+
+    def save(self, directory: str):
+        pass
+
+    @classmethod
+    def load(cls, directory: str, vectors: np.ndarray, meta: dict):
+        return cls(vectors)
+
+
+class IVFIndex:
+    """
+    Approximate search over an inverted file index.
+
+    The vectors are clustered by spherical k-means into num_lists lists. A query is compared with the centroids
+    and only with the vectors of the nprobe most similar lists, so a search reads about nprobe / num_lists of
+    the vectors. The vectors are kept sorted by their list, so the vectors of a list are one contiguous block.
+    """
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, num_lists: int = None, nprobe: int = 8, iterations: int = 20,
+                 max_training_vectors: int = 65536, seed: int = 0):
+        """
+        Build the index.
+
+        Args:
+            vectors (np.ndarray): Normalized vectors [num_vectors, dim].
+            num_lists (int): Number of lists. Defaults to 4 * sqrt(num_vectors).
+            nprobe (int): Number of lists searched for a query.
+            iterations (int): Number of k-means iterations.
+            max_training_vectors (int): Maximum number of vectors the centroids are trained on.
+            seed (int): Seed of the centroid initialization and the training sample.
+        """
+        self.nprobe = nprobe
+        if num_lists is None:
+            num_lists = max(1, int(4 * np.sqrt(len(vectors))))
+        self.centroids = self.train(vectors, min(num_lists, max(len(vectors), 1)), iterations, max_training_vectors, seed)
+        self.assign(vectors)
+
+    @staticmethod
+    def train(vectors: np.ndarray, num_lists: int, iterations: int, max_training_vectors: int, seed: int):
+        """
+        Compute the centroids of the lists by spherical k-means on a sample of the vectors.
+
+        Returns:
+            np.ndarray: Normalized centroids [num_lists, dim].
+        """
+        generator = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > max_training_vectors:
+            sample = vectors[generator.choice(len(vectors), max_training_vectors, replace=False)]
+        centroids = sample[generator.choice(len(sample), num_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = (sample @ centroids.T).argmax(-1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            # Empty lists keep their centroid
+            empty = np.bincount(assignment, minlength=num_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+        return centroids
+
+    def assign(self, vectors: np.ndarray):
+        """
+        Assign the vectors to the lists and sort them by their list.
+        """
+        self.assignment = (vectors @ self.centroids.T).argmax(-1) if len(vectors) else np.zeros(0, dtype=np.int64)
+        self.order = np.argsort(self.assignment, kind="stable")
+        self.sorted_vectors = np.ascontiguousarray(vectors[self.order])
+        self.ptr = np.concatenate([[0], np.cumsum(np.bincount(self.assignment, minlength=len(self.centroids)))])
+
+    def add(self, vectors: np.ndarray):
+        """
+        Add normalized vectors to the lists of their nearest centroids, without retraining the centroids.
+        """
+        all_vectors = np.empty((len(self.order) + len(vectors), self.centroids.shape[1]), dtype=np.float32)
+        all_vectors[self.order] = self.sorted_vectors
+        all_vectors[len(self.order):] = vectors
+        self.assign(all_vectors)
+
+    def search(self, queries: np.ndarray, k: int):
+        """
+        Find approximately the k vectors most similar to each of the normalized queries.
+
+        Returns:
+            np.ndarray: Ids of the found vectors [num_queries, k], -1 where fewer vectors were searched.
+            np.ndarray: Their cosine similarities [num_queries, k].
+        """
+        lists, _ = top_k(queries @ self.centroids.T, self.nprobe)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            positions = np.concatenate([np.arange(self.ptr[j], self.ptr[j + 1]) for j in lists[i]])
+            found, values = top_k(self.sorted_vectors[positions] @ query, k)
+            ids[i, :len(found)] = self.order[positions[found]]
+            scores[i, :len(found)] = values
+        return ids, scores
+
+    def save(self, directory: str):
+        path = os.path.join(directory, IVF_FILE_NAME)
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, centroids=self.centroids)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory: str, vectors: np.ndarray, meta: dict):
+        index = cls.__new__(cls)
+        index.nprobe = meta["nprobe"]
+        index.centroids = np.load(os.path.join(directory, IVF_FILE_NAME))["centroids"]
+        index.assign(vectors)
+        return index
+
+
+INDEX_CLASSES = {index_class.kind: index_class for index_class in (FlatIndex, IVFIndex)}
+
+
+class EmbeddingIndex:
+    """
+    Persistent index of the pooled vectors of a corpus of source files, searched by cosine similarity.
+
+    Besides the vectors it keeps the name and path of every file, the fingerprint of the model that computed
+    them and the stamp of the corpus, so an index built with another model or from other files is detected.
+    """
+    def __init__(self, language: str, fingerprint: str, vectors: np.ndarray, names: list, paths: list,
+                 kind: str = "flat", corpus_stamp: str = None, **params):
+        """
+        Build the index.
+
+        Args:
+            language (str): Language of the files ("Python" or "C").
+            fingerprint (str): Fingerprint of the model and vocabulary that computed the vectors.
+            vectors (np.ndarray): Pooled vectors of the files [num_files, dim].
+            names (list): Names of the files.
+            paths (list): Paths to the files.
+            kind (str): Kind of the vector index ("flat" or "ivf").
+            corpus_stamp (str): Stamp of the corpus files, as returned by corpus_stamp.
+            params: Parameters of the IVF index (num_lists, nprobe, iterations, max_training_vectors, seed).
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index kind: {kind}. Available kinds: {', '.join(INDEX_KINDS)}")
+        self.language = language
+        self.fingerprint = fingerprint
+        self.corpus_stamp = corpus_stamp
+        self.vectors = normalize(vectors)
+        self.names = list(names)
+        self.paths = list(paths)
+        self.index = FlatIndex(self.vectors) if kind == "flat" else IVFIndex(self.vectors, **params)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, vectors: np.ndarray, names: list, paths: list):
+        """
+        Add the vectors of more files to the index.
+        """
+        vectors = normalize(vectors)
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.names.extend(names)
+        self.paths.extend(paths)
+        self.index.add(vectors)
+
+    def search(self, queries: np.ndarray, k: int):
+        """
+        Find the k files most similar to each query vector.
+
+        Args:
+            queries (np.ndarray): Pooled vectors of the queried files [num_queries, dim].
+            k (int): Number of the returned files.
+
+        Returns:
+            list: For each query a list of tuples with the name, absolute path and cosine similarity of the found
+                files, from the most similar.
+        """
+        ids, scores = self.index.search(normalize(queries), k)
+        return [[(self.names[i], resolve_path(self.paths[i]), float(score)) for i, score in zip(row_ids, row_scores) if i >= 0]
+                for row_ids, row_scores in zip(ids.tolist(), scores.tolist())]
+
+    def save(self, directory: str):
+        """
+        Save the index to a directory. Every file is replaced atomically and the metadata, which refers to the
+        others, is written last.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, VECTORS_FILE_NAME)
+        with open(path + ".tmp", "wb") as file:
+            np.save(file, self.vectors)
+        os.replace(path + ".tmp", path)
+        self.index.save(directory)
+
+        meta = {"language": self.language, "fingerprint": self.fingerprint, "corpus_stamp": self.corpus_stamp,
+                "kind": self.index.kind, "names": self.names, "paths": self.paths}
+        if self.index.kind == "ivf":
+            meta["nprobe"] = self.index.nprobe
+        path = os.path.join(directory, META_FILE_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory: str):
+        """
+        Load an index saved by save. The vectors are memory-mapped.
+
+        Returns:
+            EmbeddingIndex: The index, None if there is no index in the directory.
+        """
+        meta_path = os.path.join(directory, META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as file:
+            meta = json.load(file)
+        index = cls.__new__(cls)
+        index.language = meta["language"]
+        index.fingerprint = meta["fingerprint"]
+        index.corpus_stamp = meta.get("corpus_stamp")
+        index.vectors = np.load(os.path.join(directory, VECTORS_FILE_NAME), mmap_mode="r")
+        index.names = meta["names"]
+        index.paths = meta["paths"]
+        index.index = INDEX_CLASSES[meta["kind"]].load(directory, index.vectors, meta)
+        return index
+
+
+def embed_graphs(entry, graphs: list):
+    """
+    Compute the pooled vectors of encoded graphs with the model of a registry entry.
+
+    Args:
+        entry (RegistryEntry): The entry with the model.
+        graphs (list): Data objects returned by encode_tree.
+
+    Returns:
+        np.ndarray: Pooled vectors [num_graphs, dim].
+    """
+    if not hasattr(entry.model, "embed"):
+        raise ValueError(f"The model has no embed method, export it again with ExportModel.py: {entry.model_path}")
+    batch = Batch.from_data_list(graphs).to(entry.device)
+    with torch.no_grad():
+        vectors = entry.model.embed(batch.x, batch.types, batch.edge_types, batch.edge_in_out_indexs,
+                                    batch.edge_in_out_head_tail, batch.batch, batch.edge_in_out_node_order)
+    return vectors.float().cpu().numpy()
+
+
+def corpus_files(directories: list):
+    """
+    Return the paths of the source files in the directories, skipping the files starting with an underscore.
+    """
+    paths = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("_"))
+            paths.extend(os.path.join(root, file_name) for file_name in sorted(files) if not file_name.startswith("_"))
+    return paths
+
+
+def corpus_stamp(directories: list):
+    """
+    Return a stamp of the source files in the directories used to detect changes of the corpus.
+
+    Args:
+        directories (list): Directories of the corpus.
+
+    Returns:
+        str: Hash of the paths relative to their directory, modification times and sizes of the files.
+    """
+    digest = hashlib.sha256()
+    for directory in directories:
+        for file_path in corpus_files([directory]):
+            stat = os.stat(file_path)
+            digest.update(f"{os.path.relpath(file_path, directory)}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+def build_index(language: str, directories: list, kind: str = "flat", batch_size: int = 64, entry=None, **params):
+    """
+    Build the embedding index of the source files in the directories.
+
+    Args:
+        language (str): Language of the files ("Python" or "C").
+        directories (list): Directories of the corpus.
+        kind (str): Kind of the vector index ("flat" or "ivf").
+        batch_size (int): Number of files embedded at once.
+        entry (RegistryEntry): Entry with the model and vocabulary. Defaults to the registry entry of the language.
+        params: Parameters of the IVF index.
+
+    Returns:
+        EmbeddingIndex: The index.
+    """
+    entry = entry or get_registry().get(language)
+    parse = parse_python_file if language == "Python" else parse_c_source_file
+    stamp = corpus_stamp(directories)
+    vectors, names, paths, graphs = [], [], [], []
+    file_paths = corpus_files(directories)
+    for position, file_path in enumerate(file_paths):
+        try:
+            graphs.append(encode_tree(entry.vocab, parse(file_path)))
+            names.append(os.path.basename(file_path))
+            # Paths inside the HDHGN directory are stored relative to it, so the index can be moved with it
+            path = os.path.abspath(file_path)
+            paths.append(os.path.relpath(path, BASE_DIR) if path.startswith(os.path.abspath(BASE_DIR) + os.sep) else path)
+        except Exception as e:
+            print(Fore.YELLOW + f"Skipping {file_path}: {type(e).__name__}: {e}" + Style.RESET_ALL)
+        if graphs and (len(graphs) == batch_size or position == len(file_paths) - 1):
+            vectors.append(embed_graphs(entry, graphs))
+            graphs = []
+    if not vectors:
+        raise ValueError("None of the files of the corpus could be parsed: " + ", ".join(directories))
+    return EmbeddingIndex(language, entry.fingerprint, np.concatenate(vectors), names, paths, kind, stamp, **params)
+
+
+# State of the index of the default corpus of each language: the loaded index (None if there is no matching
+# index), the fingerprint of the model it was checked against, the time of the check and the modification time
+# of the saved metadata at the check
+indexes = {}
+# Events of the checks in progress of each language, set when the check finishes
+index_checks = {}
+indexes_lock = threading.Lock()
+
+
+def get_index(language: str, entry=None, check_interval: float = CORPUS_CHECK_INTERVAL):
+    """
+    Return the embedding index of the default corpus of the language.
+
+    The index is never built here, building it for a large corpus takes much longer than a request. It has to be
+    built beforehand with the command line of this module. The saved index is used only if it was built with the
+    current model and from the current corpus files, which are checked at most every check_interval seconds or
+    when a new index was saved. During a check the other callers keep the previous index of the current model,
+    the callers without one wait for the result of the check.
+
+    Args:
+        language (str): Language of the index ("Python" or "C").
+        entry (RegistryEntry): Entry with the current model. Defaults to the registry entry of the language.
+        check_interval (float): Minimum number of seconds between the checks of the corpus.
+
+    Returns:
+        EmbeddingIndex: The index.
+
+    Raises:
+        IndexNotBuilt: If there is no saved index matching the current model and corpus.
+    """
+    entry = entry or get_registry().get(language)
+    while True:
+        now = time.monotonic()
+        meta_mtime = meta_modification_time(LANGUAGES[language]["index_path"])
+        with indexes_lock:
+            index, fingerprint, checked, checked_meta_mtime = indexes.get(language, (None, None, None, None))
+            # The index of another model is not used anymore
+            if fingerprint != entry.fingerprint:
+                index = None
+            check = index_checks.get(language)
+            checked_now = fingerprint == entry.fingerprint and now - checked < check_interval and meta_mtime == checked_meta_mtime
+            if checked_now or (check is not None and index is not None):
+                if index is None:
+                    raise IndexNotBuilt(not_built_message(language))
+                return index
+            if check is None:
+                # Claim the check
+                check = index_checks[language] = threading.Event()
+                break
+        # There is no previous index to keep, wait for the check in progress and look at its result
+        check.wait()
+
+    try:
+        stamp = corpus_stamp([LANGUAGES[language]["corpus_path"]])
+        if index is None or index.corpus_stamp != stamp:
+            index = EmbeddingIndex.load(LANGUAGES[language]["index_path"])
+            if index is not None and (index.fingerprint != entry.fingerprint or index.corpus_stamp != stamp):
+                index = None
+        with indexes_lock:
+            indexes[language] = (index, entry.fingerprint, now, meta_mtime)
+    finally:
+        with indexes_lock:
+            del index_checks[language]
+        check.set()
+    if index is None:
+        raise IndexNotBuilt(not_built_message(language))
+    return index
+
+
+def meta_modification_time(directory: str):
+    """
+    Return the modification time of the metadata of the index saved in a directory, None if there is none.
+    """
+    try:
+        return os.stat(os.path.join(directory, META_FILE_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def not_built_message(language: str):
+    return (f"The embedding index of the {language} corpus is not built for the current model and files, "
+            f"build it with: python embedding_index.py --language {language}")
+
+
+if __name__ == '__main__':
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="EmbeddingIndex", description="Build the embedding index of a corpus of source files for the similarity search.")
+
+    # Adding optional arguments
+    parser.add_argument("-l", "--language", help="Language of the files", type=str, choices=list(LANGUAGES), default="Python")
+    parser.add_argument("-d", "--directories", help="Directories of the corpus. Defaults to the sample files of the language", type=str, nargs="+", default=[])
+    parser.add_argument("-o", "--output", help="Directory to save the index. Defaults to the index path of the language", type=str, default="")
+    parser.add_argument("-k", "--kind", help="Kind of the index: exact (flat) or approximate (ivf)", type=str, choices=INDEX_KINDS, default="flat")
+    parser.add_argument("-nl", "--num_lists", help="Number of lists of the ivf index. Defaults to 4 * sqrt(number of files)", type=int, default=None)
+    parser.add_argument("-np", "--nprobe", help="Number of lists searched by the ivf index", type=int, default=8)
+    parser.add_argument("-b", "--backend", help="Backend running the model", type=str, choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("-bs", "--batch_size", help="Number of files embedded at once", type=int, default=64)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    configure_registry(args.backend)
+    params = {"num_lists": args.num_lists, "nprobe": args.nprobe} if args.kind == "ivf" else {}
+    index = build_index(args.language, args.directories or [LANGUAGES[args.language]["corpus_path"]], args.kind,
+                        args.batch_size, **params)
+    output = args.output or LANGUAGES[args.language]["index_path"]
+    index.save(output)
+    print(Fore.GREEN + f"Saved the index of {len(index)} files to: " + Style.RESET_ALL + output)
@@ -6,7 +6,7 @@ from torch_geometric.nn import HeteroLinear, MLP
 from torch_geometric.utils import softmax
 from torch_scatter import scatter_add
 
-from models.layers import HeteroEmbedding, HDHGConv
+from models.layers import HeteroEmbedding, HDHGConv, build_incidence
 
 class HDHGN(nn.Module):
     """
@@ -64,7 +64,8 @@ class HDHGN(nn.Module):
         nn.init.xavier_uniform_(self.attn)
 
     def forward(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, 
-                edge_in_out_indexs: torch.Tensor, edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor):
+                edge_in_out_indexs: torch.Tensor, edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor,
+                edge_in_out_node_order: torch.Tensor = None):
         """
         Forward pass of the model.
 
@@ -75,10 +76,31 @@ class HDHGN(nn.Module):
             edge_in_out_indexs (torch.Tensor): Edge in-out indices.
             edge_in_out_head_tail (torch.Tensor): Edge head-tail indices.
             batch (torch.Tensor): Batch indices.
+            edge_in_out_node_order (torch.Tensor): Node-major order of the node-edges sorted by the hyperedge,
+                as emitted by the dataset. The node-edges are sorted in the forward pass if not given.
 
         Returns:
             torch.Tensor: Output of the model.
         """
+        v = self.embed(x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch, edge_in_out_node_order)
+        # v [batch_size, dim_size]
+        out = self.mlp(v)
+        # out [batch_size, label_size]
+
+        return out
+
+    def embed(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor,
+              edge_in_out_indexs: torch.Tensor, edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor,
+              edge_in_out_node_order: torch.Tensor = None):
+        """
+        Compute the pooled vector of each graph, the input of the MLP.
+
+        The vectors of similar programs are close, so they are used to search for similar files by cosine similarity.
+        The arguments are the same as in forward.
+
+        Returns:
+            torch.Tensor: Pooled vectors [batch_size, dim_size].
+        """
         # x, types [num_nodes] edge_types [num_edges] edge_in_out_indexs [2, num_nodeedges]
         x = self.embedding(x, types)
         # x [num_nodes, embed_size]
@@ -86,8 +108,13 @@ class HDHGN(nn.Module):
         # x [num_nodes, dim_size]
         edge_attr = self.edge_embedding(edge_types)
         # edge_attr [num_edges, dim_size]
+        # The CSR incidence structure is shared by all layers
+        incidence = None
+        if self.HPHG[0].fused:
+            incidence = build_incidence(edge_in_out_indexs, edge_in_out_head_tail, edge_attr.size(0), x.size(0),
+                                        edge_in_out_node_order)
         for i in range(self.num_layers):
-            x = self.HPHG[i](x, edge_attr, edge_in_out_indexs, edge_in_out_head_tail, batch)
+            x = self.HPHG[i](x, edge_attr, edge_in_out_indexs, edge_in_out_head_tail, batch, incidence)
 
         x = x.reshape(-1, self.num_heads, self.dim_size // self.num_heads)
         attn = (self.attn * x).sum(dim=-1)
@@ -100,7 +127,5 @@ class HDHGN(nn.Module):
         # v [batch_size, num_heads, head_size]
         v = v.reshape(-1, self.dim_size)
         # v [batch_size, dim_size]
-        out = self.mlp(v)
-        # out [batch_size, label_size]
-        
-        return out
+
+        return v
@@ -0,0 +1,377 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch_scatter import segment_csr
+from torch_geometric.utils.sparse import index2ptr
+from typing import Optional
+import math
+
+
+class ScatterRows(torch.autograd.Function):
+    """
+    Reduction of the rows of src with the same index, exported to ONNX as a single ScatterND.
+
+    The exporter of PyTorch turns index_put with accumulation into ScatterND without reduction, which is wrong for
+    repeated indices, and scatter_reduce into ScatterElements, which reduces element by element and is much slower
+    in ONNX Runtime. The number of segments is taken from the number of rows of rows, so it stays dynamic.
+    """
+    @staticmethod
+    def forward(ctx, src: torch.Tensor, index: torch.Tensor, rows: torch.Tensor, reduce: str):
+        size = [rows.size(0)] + list(src.shape[1:])
+        if reduce == "max":
+            index = index.view([-1] + [1] * (src.dim() - 1)).expand_as(src)
+            return torch.full(size, float("-inf"), dtype=src.dtype, device=src.device).scatter_reduce(0, index, src, reduce="amax")
+        return src.new_zeros(size).index_add_(0, index, src)
+
+    @staticmethod
+    def symbolic(g, src, index, rows, reduce):
+        shape = g.op("Concat", g.op("Shape", rows, start_i=0, end_i=1), g.op("Shape", src, start_i=1), axis_i=0)
+        out = g.op("ConstantOfShape", shape, value_t=torch.tensor([float("-inf") if reduce == "max" else 0.0]))
+        index = g.op("Unsqueeze", index, g.op("Constant", value_t=torch.tensor([-1])))
+        return g.op("ScatterND", out, index, src, reduction_s="max" if reduce == "max" else "add")
+
+
+def scatter_segments(src: torch.Tensor, index: torch.Tensor, rows: torch.Tensor, reduce: str):
+    """
+    Reduce the rows of src with the same index using scatter operators, which can be exported to ONNX.
+
+    Unlike segment_csr the index does not have to be sorted.
+
+    Args:
+        src (torch.Tensor): Values to reduce.
+        index (torch.Tensor): Segment of each row of src.
+        rows (torch.Tensor): Tensor with one row per segment.
+        reduce (str): Reduction ("sum", "mean" or "max").
+
+    Returns:
+        torch.Tensor: Reduced values of the segments.
+    """
+    if reduce == "max":
+        return ScatterRows.apply(src, index, rows, "max")
+    out = ScatterRows.apply(src, index, rows, "sum")
+    if reduce == "mean":
+        ones = src.new_ones([src.size(0)] + [1] * (src.dim() - 1))
+        out = out / ScatterRows.apply(ones, index, rows, "sum").clamp(min=1)
+    return out
+
+
+def segment_reduce(src: torch.Tensor, index: torch.Tensor, ptr: torch.Tensor, rows: torch.Tensor, reduce: str, scatter: bool):
+    """
+    Reduce the rows of src by segments, with segment_csr over the sorted index or with scatter operators.
+
+    The scatter operators are used only outside TorchScript, when the model is run eagerly or traced for the
+    ONNX export.
+
+    Args:
+        src (torch.Tensor): Values to reduce.
+        index (torch.Tensor): Segment of each row of src.
+        ptr (torch.Tensor): CSR pointers of the sorted index, used by segment_csr.
+        rows (torch.Tensor): Tensor with one row per segment, used by the scatter operators.
+        reduce (str): Reduction ("sum", "mean" or "max").
+        scatter (bool): Whether to use the scatter operators.
+
+    Returns:
+        torch.Tensor: Reduced values of the segments.
+    """
+    if not torch.jit.is_scripting():
+        if scatter:
+            return scatter_segments(src, index, rows, reduce)
+    return segment_csr(src, ptr, reduce=reduce)
+
+
+class HDHGConvInference(nn.Module):
+    """
+    Inference-only HDHGConv layer with the fused computation and weights prepared for it.
+
+    The head-tail linear layers are composed with the key and value projections once at export time.
+    """
+    def __init__(self, conv, scatter: bool = False):
+        """
+        Initialize the layer from a trained HDHGConv layer.
+
+        Args:
+            conv (HDHGConv): The trained layer.
+            scatter (bool): Whether to aggregate with scatter operators instead of segment_csr.
+        """
+        super(HDHGConvInference, self).__init__()
+        self.scatter = scatter
+        self.dim_size = conv.dim_size
+        self.num_edge_heads = conv.num_edge_heads
+        self.num_node_heads = conv.num_node_heads
+
+        with torch.no_grad():
+            self.Q1 = nn.Linear(self.dim_size, self.dim_size, bias=False)
+            self.Q1.weight.copy_(conv.Q1.weight)
+            self.Q2 = nn.Linear(self.dim_size, self.dim_size, bias=False)
+            self.Q2.weight.copy_(conv.Q2.weight)
+            self.edge_linear = nn.Linear(self.dim_size, self.dim_size)
+            self.edge_linear.load_state_dict(conv.edge_linear.state_dict())
+            self.u1 = nn.Linear(self.dim_size, self.dim_size)
+            self.u1.load_state_dict(conv.u1.state_dict())
+            self.u2 = nn.Linear(self.dim_size, self.dim_size)
+            self.u2.load_state_dict(conv.u2.state_dict())
+
+            # Keys and values of every head-tail type: weight [num_types * 2 * dim_size, dim_size]
+            self.num_head_tail_types = conv.head_tail_linear.weight.size(0)
+            for name, head_tail_linear, key, value in (("key_value1", conv.head_tail_linear, conv.K1, conv.V1),
+                                                       ("key_value2", conv.to_head_tail_linear, conv.K2, conv.V2)):
+                key_value = torch.cat([key.weight, value.weight], 0).t()
+                weight = torch.matmul(head_tail_linear.weight, key_value)
+                bias = torch.matmul(head_tail_linear.bias, key_value)
+                linear = nn.Linear(self.dim_size, self.num_head_tail_types * 2 * self.dim_size)
+                linear.weight.copy_(weight.transpose(0, 1).reshape(self.dim_size, -1).t())
+                linear.bias.copy_(bias.reshape(-1))
+                setattr(self, name, linear)
+
+            self.register_buffer("norm_weight", conv.norm.weight.detach().clone())
+            self.register_buffer("norm_bias", conv.norm.bias.detach().clone())
+            self.register_buffer("norm_mean_scale", conv.norm.mean_scale.detach().clone())
+            self.norm_eps = float(conv.norm.eps)
+
+    def softmax_aggregate(self, attn: torch.Tensor, value: torch.Tensor, index: torch.Tensor, ptr: torch.Tensor,
+                          rows: torch.Tensor):
+        attn_max = segment_reduce(attn, index, ptr, rows, "max", self.scatter)
+        attn = (attn - attn_max.index_select(0, index)).exp()
+        denominator = segment_reduce(attn, index, ptr, rows, "sum", self.scatter) + 1e-16
+        out = segment_reduce(value * attn.unsqueeze(-1), index, ptr, rows, "sum", self.scatter)
+        return out / denominator.unsqueeze(-1)
+
+    def forward(self, x: torch.Tensor, edge_attr: torch.Tensor, edges: torch.Tensor, nodes: torch.Tensor,
+                head_tail: torch.Tensor, edge_ptr: torch.Tensor, node_edges: torch.Tensor, node_nodes: torch.Tensor,
+                node_head_tail: torch.Tensor, node_ptr: torch.Tensor, batch: torch.Tensor, graph_ptr: torch.Tensor,
+                graphs: torch.Tensor):
+        edge_head_size = self.dim_size // self.num_edge_heads
+        node_head_size = self.dim_size // self.num_node_heads
+
+        # Nodes to hyperedges
+        query = self.Q1(edge_attr).index_select(0, edges).reshape(-1, self.num_edge_heads, edge_head_size)
+        key_value = self.key_value1(x).reshape(-1, 2 * self.dim_size)
+        key_value = key_value.index_select(0, nodes * self.num_head_tail_types + head_tail).reshape(-1, 2, self.num_edge_heads, edge_head_size)
+        attn = (query * key_value[:, 0]).sum(dim=-1) / math.sqrt(edge_head_size)
+        hyperedges = self.softmax_aggregate(attn, key_value[:, 1], edges, edge_ptr, edge_attr).reshape(-1, self.dim_size)
+        hyperedges = hyperedges + self.edge_linear(edge_attr)
+
+        # Hyperedges to nodes
+        query = self.Q2(x).index_select(0, node_nodes).reshape(-1, self.num_node_heads, node_head_size)
+        key_value = self.key_value2(hyperedges).reshape(-1, 2 * self.dim_size)
+        key_value = key_value.index_select(0, node_edges * self.num_head_tail_types + node_head_tail).reshape(-1, 2, self.num_node_heads, node_head_size)
+        attn = (query * key_value[:, 0]).sum(dim=-1) / math.sqrt(node_head_size)
+        inputs = self.softmax_aggregate(attn, key_value[:, 1], node_nodes, node_ptr, x).reshape(-1, self.dim_size)
+
+        # Update with the graph normalization
+        out = self.u2(inputs) + self.u1(x)
+        mean = segment_reduce(out, batch, graph_ptr, graphs, "mean", self.scatter)
+        out = out - mean.index_select(0, batch) * self.norm_mean_scale
+        var = segment_reduce(out.pow(2), batch, graph_ptr, graphs, "mean", self.scatter)
+        std = (var + self.norm_eps).sqrt().index_select(0, batch)
+        return F.elu(self.norm_weight * out / std + self.norm_bias)
+
+
+class HDHGNInference(nn.Module):
+    """
+    Inference-only HDHGN model which can be compiled with TorchScript.
+
+    It is built from a trained HDHGN model and computes the same outputs in eval mode with the weights prepared
+    for inference: the embeddings are passed through the heterogeneous linear layer in advance, so a node is
+    embedded by a single lookup, and the batch normalization is folded into the linear layers of the MLP.
+
+    With scatter=True the segments are reduced with scatter operators instead of segment_csr of torch_scatter.
+    The node-edges then do not have to be sorted and the model can be exported to ONNX.
+    """
+    def __init__(self, model, scatter: bool = False):
+        """
+        Initialize the inference model from a trained HDHGN model.
+
+        Args:
+            model (HDHGN): The trained model.
+            scatter (bool): Whether to reduce the segments with scatter operators (needed for the ONNX export).
+        """
+        super(HDHGNInference, self).__init__()
+        model = model.eval()
+        self.scatter = scatter
+        self.dim_size = model.dim_size
+        self.num_heads = model.num_heads
+
+        with torch.no_grad():
+            # Embedding of every (type, feature) pair followed by the heterogeneous linear layer of its type
+            embedding = model.embedding
+            ends = torch.cat([embedding.offsets[1:], torch.tensor([embedding.weight.size(0)], device=embedding.offsets.device)])
+            node_table = embedding.weight.new_empty(embedding.weight.size(0), self.dim_size)
+            for i, (start, end) in enumerate(zip(embedding.offsets.tolist(), ends.tolist())):
+                node_table[start:end] = embedding.weight[start:end] @ model.hetero_linear.weight[i] + model.hetero_linear.bias[i]
+            self.register_buffer("node_table", node_table)
+            self.register_buffer("node_offsets", embedding.offsets.clone())
+            self.register_buffer("edge_table", model.edge_embedding.weight.detach().clone())
+
+            self.layers = nn.ModuleList([HDHGConvInference(conv, scatter) for conv in model.HPHG])
+            self.register_buffer("attn", model.attn.detach().clone())
+
+            # Linear layers of the MLP with the following batch normalization folded into them
+            linears = []
+            for i, linear in enumerate(model.mlp.lins):
+                folded = nn.Linear(linear.in_channels, linear.out_channels)
+                weight, bias = linear.weight.detach().clone(), linear.bias.detach().clone()
+                if i < len(model.mlp.norms) and isinstance(getattr(model.mlp.norms[i], "module", None), nn.BatchNorm1d):
+                    norm = model.mlp.norms[i].module
+                    scale = norm.weight / torch.sqrt(norm.running_var + norm.eps)
+                    weight = weight * scale.unsqueeze(-1)
+                    bias = (bias - norm.running_mean) * scale + norm.bias
+                folded.weight.copy_(weight)
+                folded.bias.copy_(bias)
+                linears.append(folded)
+            self.hidden = nn.ModuleList(linears[:-1])
+            self.output = linears[-1]
+
+    def forward(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, edge_in_out_indexs: torch.Tensor,
+                edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor, edge_in_out_node_order: Optional[torch.Tensor] = None):
+        """
+        Forward pass of the model.
+
+        Args:
+            x (torch.Tensor): Node features.
+            types (torch.Tensor): Node types.
+            edge_types (torch.Tensor): Edge types.
+            edge_in_out_indexs (torch.Tensor): Edge in-out indices.
+            edge_in_out_head_tail (torch.Tensor): Edge head-tail indices.
+            batch (torch.Tensor): Batch indices, sorted unless the scatter operators are used.
+            edge_in_out_node_order (torch.Tensor): Node-major order of the node-edges sorted by the hyperedge.
+                The node-edges are sorted in the forward pass if not given. Not used by the scatter operators.
+
+        Returns:
+            torch.Tensor: Output of the model.
+        """
+        return self.classify(self.embed(x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch,
+                                        edge_in_out_node_order))
+
+    @torch.jit.export
+    def embed(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, edge_in_out_indexs: torch.Tensor,
+              edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor, edge_in_out_node_order: Optional[torch.Tensor] = None):
+        """
+        Compute the pooled vector of each graph, the input of the MLP. The arguments are the same as in forward.
+
+        Returns:
+            torch.Tensor: Pooled vectors [num_graphs, dim_size].
+        """
+        edges, nodes = edge_in_out_indexs[0], edge_in_out_indexs[1]
+        if self.scatter:
+            # The scatter operators take the node-edges in any order and need only one row per graph
+            node_edges, node_nodes, node_head_tail = edges, nodes, edge_in_out_head_tail
+            edge_ptr = node_ptr = graph_ptr = batch
+            graphs = torch.arange(batch.max() + 1, device=batch.device)
+        else:
+            # CSR incidence structure shared by all layers
+            if edge_in_out_node_order is None:
+                perm = torch.sort(edges, stable=True)[1]
+                edges, nodes = edges.index_select(0, perm), nodes.index_select(0, perm)
+                edge_in_out_head_tail = edge_in_out_head_tail.index_select(0, perm)
+                edge_in_out_node_order = torch.sort(nodes, stable=True)[1]
+            node_edges = edges.index_select(0, edge_in_out_node_order)
+            node_nodes = nodes.index_select(0, edge_in_out_node_order)
+            node_head_tail = edge_in_out_head_tail.index_select(0, edge_in_out_node_order)
+            edge_ptr = index2ptr(edges, edge_types.size(0))
+            node_ptr = index2ptr(node_nodes, x.size(0))
+            graph_ptr = index2ptr(batch, int(batch.max()) + 1)
+            graphs = graph_ptr
+
+        x = self.node_table.index_select(0, x + self.node_offsets.index_select(0, types))
+        edge_attr = self.edge_table.index_select(0, edge_types)
+        for layer in self.layers:
+            x = layer(x, edge_attr, edges, nodes, edge_in_out_head_tail, edge_ptr, node_edges, node_nodes,
+                      node_head_tail, node_ptr, batch, graph_ptr, graphs)
+
+        # Attention pooling over the nodes of each graph
+        x = x.reshape(-1, self.num_heads, self.dim_size // self.num_heads)
+        attn = (self.attn * x).sum(dim=-1)
+        attn = (attn - segment_reduce(attn, batch, graph_ptr, graphs, "max", self.scatter).index_select(0, batch)).exp()
+        attn = attn / (segment_reduce(attn, batch, graph_ptr, graphs, "sum", self.scatter).index_select(0, batch) + 1e-16)
+        return segment_reduce(x * attn.unsqueeze(-1), batch, graph_ptr, graphs, "sum", self.scatter).reshape(-1, self.dim_size)
+
+    @torch.jit.export
+    def classify(self, v: torch.Tensor):
+        """
+        Compute the output of the model from the pooled vectors.
+        """
+        for linear in self.hidden:
+            v = F.elu(linear(v))
+        return self.output(v)
+
+
+# Names of the inputs of the models exported to ONNX, in the order of the arguments of HDHGNInference
+ONNX_INPUT_NAMES = ["x", "types", "edge_types", "edge_in_out_indexs", "edge_in_out_head_tail", "batch"]
+# Names of the outputs of the models exported to ONNX
+ONNX_OUTPUT_NAMES = ["output", "embedding"]
+
+
+class HDHGNOnnxOutputs(nn.Module):
+    """
+    Inference model returning both the output and the pooled vectors, traced for the ONNX export.
+    """
+    def __init__(self, model: HDHGNInference):
+        super(HDHGNOnnxOutputs, self).__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, edge_in_out_indexs: torch.Tensor,
+                edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor):
+        v = self.model.embed(x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch)
+        return self.model.classify(v), v
+
+
+class OnnxInference:
+    """
+    HDHGN model exported to ONNX and run by ONNX Runtime on the CPU.
+
+    It is called with the same arguments as the PyTorch models and returns the output as a tensor on the device
+    of the inputs, so it can be used in their place for predictions.
+    """
+    def __init__(self, model_path: str, num_threads: int = 0):
+        """
+        Create the ONNX Runtime session of the model.
+
+        Args:
+            model_path (str): Path to the model exported to ONNX.
+            num_threads (int): Number of threads used by the operators. 0 lets ONNX Runtime decide.
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        options.log_severity_level = 3
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, edge_in_out_indexs: torch.Tensor,
+                 edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor, edge_in_out_node_order: Optional[torch.Tensor] = None):
+        """
+        Run the model. The order of the node-edges is not needed by the exported model and is ignored.
+
+        Returns:
+            torch.Tensor: Output of the model.
+        """
+        return self.run("output", x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch)
+
+    def embed(self, x: torch.Tensor, types: torch.Tensor, edge_types: torch.Tensor, edge_in_out_indexs: torch.Tensor,
+              edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor, edge_in_out_node_order: Optional[torch.Tensor] = None):
+        """
+        Compute the pooled vector of each graph, the embedding output of the exported model.
+
+        Returns:
+            torch.Tensor: Pooled vectors [num_graphs, dim_size].
+        """
+        if "embedding" not in [output.name for output in self.session.get_outputs()]:
+            raise ValueError(f"The ONNX model has no embedding output, export it again with ExportModel.py: {self.model_path}")
+        return self.run("embedding", x, types, edge_types, edge_in_out_indexs, edge_in_out_head_tail, batch)
+
+    def run(self, output_name: str, *inputs):
+        """
+        Run the session on the inputs and return the given output as a tensor on the device of the inputs.
+        """
+        output = self.session.run([output_name], {name: tensor.detach().cpu().numpy() for name, tensor in zip(ONNX_INPUT_NAMES, inputs)})[0]
+        return torch.from_numpy(output).to(inputs[0].device)
+
+    def to(self, device):
+        # The session always runs on the CPU
+        return self
+
+    def eval(self):
+        return self
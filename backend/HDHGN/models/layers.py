@@ -5,12 +5,16 @@ from torch_geometric.nn import HeteroLinear
 from torch_geometric.nn.conv import MessagePassing
 from torch_geometric.nn.norm import GraphNorm
 from torch_geometric.utils import softmax
-from torch_scatter import scatter_add
+from torch_geometric.utils.sparse import index2ptr
+from torch_scatter import scatter_add, segment_csr
+from typing import NamedTuple, Optional
 import math
 
 class HeteroEmbedding(nn.Module):
     """
     Heterogeneous embedding layer for different node types.
+
+    The embeddings of all node types are kept in one table, the rows of the i-th type start at offsets[i].
     """
     def __init__(self, num_types: int, vocab_sizes: dict, embed_size: int):
         """
@@ -26,8 +30,19 @@ class HeteroEmbedding(nn.Module):
         self.vocab_sizes = vocab_sizes
         self.embed_size = embed_size
 
-        self.embedding = nn.ModuleList(
-            [nn.Embedding(self.vocab_sizes[i], self.embed_size, padding_idx=0) for i in range(self.num_types)])
+        sizes = torch.tensor([self.vocab_sizes[i] for i in range(self.num_types)], dtype=torch.long)
+        self.register_buffer("offsets", torch.cumsum(sizes, 0) - sizes, persistent=False)
+        self.weight = nn.Parameter(torch.empty(int(sizes.sum()), self.embed_size))
+
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        """
+        Reset the parameters of the layer like separate nn.Embedding layers with padding_idx=0.
+        """
+        nn.init.normal_(self.weight)
+        with torch.no_grad():
+            self.weight[self.offsets] = 0
 
     def forward(self, x: torch.Tensor, types: torch.Tensor):
         """
@@ -41,17 +56,125 @@ class HeteroEmbedding(nn.Module):
             torch.Tensor: Embedded node features.
         """
         # x, types [num_nodes]
-        out = x.new_empty(x.size(0), self.embed_size, dtype=torch.float)
-        for i, embedding in enumerate(self.embedding):
-            mask = types == i
-            out[mask] = embedding(x[mask])
+        out = F.embedding(x + self.offsets[types], self.weight)
         # out [num_nodes, embed_size]
+        if self.training and torch.is_grad_enabled():
+            # Padding features (0) of every type do not update their rows, like padding_idx in nn.Embedding
+            out = torch.where((x == 0).unsqueeze(-1), out.detach(), out)
         return out
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Convert the weights of the separate embeddings of older checkpoints into the fused table
+        keys = [prefix + f"embedding.{i}.weight" for i in range(self.num_types)]
+        if keys[0] in state_dict:
+            state_dict[prefix + "weight"] = torch.cat([state_dict.pop(key) for key in keys], 0)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Convert the separate embeddings of older pickled models into the fused table
+        if "embedding" in self._modules:
+            embedding = self._modules.pop("embedding")
+            sizes = torch.tensor([e.num_embeddings for e in embedding], dtype=torch.long)
+            self.register_buffer("offsets", (torch.cumsum(sizes, 0) - sizes).to(embedding[0].weight.device), persistent=False)
+            self.weight = nn.Parameter(torch.cat([e.weight.data for e in embedding], 0),
+                                       requires_grad=embedding[0].weight.requires_grad)
+
+def sort_incidences(edge_in_out_indexs: torch.Tensor, edge_in_out_head_tail: torch.Tensor):
+    """
+    Sort the node-edges by their hyperedge and compute their order by node.
+
+    Args:
+        edge_in_out_indexs (torch.Tensor): Edge in-out indices [2, num_nodeedges].
+        edge_in_out_head_tail (torch.Tensor): Edge head-tail indices [num_nodeedges].
+
+    Returns:
+        torch.Tensor: Edge in-out indices sorted by the hyperedge (stable).
+        torch.Tensor: Edge head-tail indices in the same order.
+        torch.Tensor: Permutation of the sorted node-edges that sorts them by the node (stable).
+    """
+    perm = torch.sort(edge_in_out_indexs[0], stable=True)[1]
+    edge_in_out_indexs = edge_in_out_indexs.index_select(1, perm)
+    edge_in_out_head_tail = edge_in_out_head_tail.index_select(0, perm)
+    node_order = torch.sort(edge_in_out_indexs[1], stable=True)[1]
+    return edge_in_out_indexs, edge_in_out_head_tail, node_order
+
+
+class Incidence(NamedTuple):
+    """
+    The node-edges in hyperedge-major and node-major CSR form.
+    """
+    # Hyperedge-major: node-edges sorted by the hyperedge, edge_ptr [num_edges + 1]
+    edges: torch.Tensor
+    nodes: torch.Tensor
+    head_tail: torch.Tensor
+    edge_ptr: torch.Tensor
+    # Node-major: the same node-edges sorted by the node, node_ptr [num_nodes + 1]
+    node_edges: torch.Tensor
+    node_nodes: torch.Tensor
+    node_head_tail: torch.Tensor
+    node_ptr: torch.Tensor
+
+
+def build_incidence(edge_in_out_indexs: torch.Tensor, edge_in_out_head_tail: torch.Tensor, num_edges: int,
+                    num_nodes: int, node_order: Optional[torch.Tensor] = None):
+    """
+    Build the CSR incidence structure used by the fused HDHGConv.
+
+    The dataset emits the node-edges sorted by the hyperedge together with their node order. Without the node
+    order the node-edges are sorted here.
+
+    Args:
+        edge_in_out_indexs (torch.Tensor): Edge in-out indices [2, num_nodeedges].
+        edge_in_out_head_tail (torch.Tensor): Edge head-tail indices [num_nodeedges].
+        num_edges (int): Number of hyperedges.
+        num_nodes (int): Number of nodes.
+        node_order (torch.Tensor): Permutation sorting the node-edges by the node, None if not known.
+
+    Returns:
+        Incidence: The incidence structure.
+    """
+    if node_order is None:
+        edge_in_out_indexs, edge_in_out_head_tail, node_order = sort_incidences(edge_in_out_indexs, edge_in_out_head_tail)
+    edges, nodes = edge_in_out_indexs[0], edge_in_out_indexs[1]
+    node_edges = edges.index_select(0, node_order)
+    node_nodes = nodes.index_select(0, node_order)
+    node_head_tail = edge_in_out_head_tail.index_select(0, node_order)
+    return Incidence(edges, nodes, edge_in_out_head_tail, index2ptr(edges, num_edges),
+                     node_edges, node_nodes, node_head_tail, index2ptr(node_nodes, num_nodes))
+
+
+def softmax_aggregate(attn: torch.Tensor, value: torch.Tensor, index: torch.Tensor, ptr: torch.Tensor):
+    """
+    Softmax the attention scores within the segments and sum the values weighted by them in one step.
+
+    Equivalent to scatter_add(value * softmax(attn, index), index), but the node-edges are sorted by the index,
+    so the reductions are segment reductions over the CSR pointers without atomics, and the normalization is
+    applied to the aggregated values, so no normalized scores of size [num_nodeedges, num_heads] are materialized.
+
+    Args:
+        attn (torch.Tensor): Attention scores [num_nodeedges, num_heads].
+        value (torch.Tensor): Values [num_nodeedges, num_heads, head_size].
+        index (torch.Tensor): Sorted segment (target) of each node-edge [num_nodeedges].
+        ptr (torch.Tensor): CSR pointers of the segments [num_segments + 1].
+
+    Returns:
+        torch.Tensor: Aggregated values [num_segments, num_heads, head_size].
+    """
+    attn_max = segment_csr(attn, ptr, reduce="max")
+    attn = (attn - attn_max.index_select(0, index)).exp()
+    denominator = segment_csr(attn, ptr, reduce="sum") + 1e-16
+    out = segment_csr(value * attn.unsqueeze(-1), ptr, reduce="sum")
+    return out / denominator.unsqueeze(-1)
+
+
 class HDHGConv(MessagePassing):
     """
     Heterogeneous Directed Hypergraph Convolution layer.
     """
+    # Whether to use the fused implementation instead of the reference MessagePassing one
+    fused = True
+
     def __init__(self, dim_size: int, num_edge_heads: int, num_node_heads: int):
         """
         Initialize the HDHGConv layer.
@@ -86,7 +209,7 @@ class HDHGConv(MessagePassing):
         self.norm = GraphNorm(self.dim_size)
 
     def forward(self, x: torch.Tensor, edge_attr: torch.Tensor, edge_in_out_indexs: torch.Tensor, 
-                edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor):
+                edge_in_out_head_tail: torch.Tensor, batch: torch.Tensor, incidence: Incidence = None):
         """
         Forward pass of the HDHGConv layer.
 
@@ -96,11 +219,17 @@ class HDHGConv(MessagePassing):
             edge_in_out_indexs (torch.Tensor): Edge in-out indices.
             edge_in_out_head_tail (torch.Tensor): Edge head-tail indices.
             batch (torch.Tensor): Batch indices.
+            incidence (Incidence): CSR incidence structure for the fused implementation, built if not given.
 
         Returns:
             torch.Tensor: Output of the convolution layer.
         """
         # x [num_nodes, dim_size] edge_attr [num_edges, dim_size] edge_in_out_indexs [2, num_nodeedges] edge_in_out_head_tail [num_nodeedges]
+        if self.fused:
+            if incidence is None:
+                incidence = build_incidence(edge_in_out_indexs, edge_in_out_head_tail, edge_attr.size(0), x.size(0))
+            return self.fused_forward(x, edge_attr, incidence, batch)
+
         hyperedges = self.edge_updater(edge_in_out_indexs.flip([0]), x=x, edge_attr=edge_attr,
                                        edge_in_out_head_tail=edge_in_out_head_tail)
         # hyperedges [num_edges, dim_size]
@@ -110,6 +239,74 @@ class HDHGConv(MessagePassing):
                              edge_in_out_head_tail=edge_in_out_head_tail, batch=batch)
         return out
 
+    def fused_forward(self, x: torch.Tensor, edge_attr: torch.Tensor, incidence: Incidence, batch: torch.Tensor):
+        """
+        Fused forward pass of the HDHGConv layer, equivalent to the reference edge_update, message and update.
+
+        The queries, keys and values are projected once per edge or node before gathering them to the node-edges,
+        the key and value projections are one packed matmul, and the softmax and aggregation are done at once
+        by softmax_aggregate. The nodes to hyperedges step runs over the hyperedge-major node-edges and the
+        hyperedges to nodes step over the node-major ones, so no flip or scatter is needed.
+
+        Args:
+            x (torch.Tensor): Node features.
+            edge_attr (torch.Tensor): Edge attributes.
+            incidence (Incidence): CSR incidence structure.
+            batch (torch.Tensor): Batch indices.
+
+        Returns:
+            torch.Tensor: Output of the convolution layer.
+        """
+        # Nodes to hyperedges
+        query = self.Q1(edge_attr).index_select(0, incidence.edges).reshape(-1, self.num_edge_heads, self.dim_size // self.num_edge_heads)
+        key, value = self.project_key_value(x, incidence.nodes, incidence.head_tail, self.head_tail_linear, self.K1, self.V1).reshape(
+            -1, 2, self.num_edge_heads, self.dim_size // self.num_edge_heads).unbind(1)
+        # query, key, value [num_nodeedges, num_edge_heads, head_size]
+        attn = (query * key).sum(dim=-1) / math.sqrt(self.dim_size // self.num_edge_heads)
+        hyperedges = softmax_aggregate(attn, value, incidence.edges, incidence.edge_ptr).reshape(-1, self.dim_size)
+        # hyperedges [num_edges, dim_size]
+        hyperedges = hyperedges + self.edge_linear(edge_attr)
+
+        # Hyperedges to nodes
+        query = self.Q2(x).index_select(0, incidence.node_nodes).reshape(-1, self.num_node_heads, self.dim_size // self.num_node_heads)
+        key, value = self.project_key_value(hyperedges, incidence.node_edges, incidence.node_head_tail, self.to_head_tail_linear, self.K2, self.V2).reshape(
+            -1, 2, self.num_node_heads, self.dim_size // self.num_node_heads).unbind(1)
+        attn = (query * key).sum(dim=-1) / math.sqrt(self.dim_size // self.num_node_heads)
+        inputs = softmax_aggregate(attn, value, incidence.node_nodes, incidence.node_ptr)
+        # inputs [num_nodes, num_node_heads, head_size]
+
+        return self.update(inputs, x, batch)
+
+    def project_key_value(self, source: torch.Tensor, index: torch.Tensor, head_tail: torch.Tensor,
+                          head_tail_linear: HeteroLinear, key: nn.Linear, value: nn.Linear):
+        """
+        Compute key(head_tail_linear(source[index], head_tail)) and value(...) of the node-edges as one packed matmul.
+
+        The head-tail linear layer is composed with the key and value weights, and every source row is projected
+        once for each head-tail type. The node-edges then only gather their rows, so neither the per-type sorting
+        of HeteroLinear nor the intermediate [num_nodeedges, dim_size] features are needed.
+
+        Args:
+            source (torch.Tensor): Node or hyperedge features [num_sources, dim_size].
+            index (torch.Tensor): Source of each node-edge [num_nodeedges].
+            head_tail (torch.Tensor): Head-tail type of each node-edge [num_nodeedges].
+            head_tail_linear (HeteroLinear): The head-tail linear layer.
+            key (nn.Linear): The key projection.
+            value (nn.Linear): The value projection.
+
+        Returns:
+            torch.Tensor: Keys and values of the node-edges [num_nodeedges, 2 * dim_size].
+        """
+        key_value = torch.cat([key.weight, value.weight], 0).t()
+        # weight [num_types, dim_size, 2 * dim_size] bias [num_types, 2 * dim_size]
+        weight = torch.matmul(head_tail_linear.weight, key_value)
+        bias = torch.matmul(head_tail_linear.bias, key_value)
+        num_types = weight.size(0)
+        projected = torch.addmm(bias.reshape(-1), source, weight.transpose(0, 1).reshape(self.dim_size, -1))
+        # projected [num_sources * num_types, 2 * dim_size]
+        projected = projected.reshape(-1, 2 * self.dim_size)
+        return projected.index_select(0, index * num_types + head_tail)
+
     def edge_update(self, edge_index=None, x_j=None, edge_attr_i=None, edge_in_out_head_tail=None):
         """
         Update the edge features.
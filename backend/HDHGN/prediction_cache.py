@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_source(source: bytes):
+    """
+    Normalize the source bytes so that files differing only in encoding details get the same hash.
+
+    Removes the UTF-8 BOM, converts the line endings to LF and strips the trailing whitespace at the end of the file.
+
+    Args:
+        source (bytes): Contents of the source file.
+
+    Returns:
+        bytes: The normalized contents.
+    """
+    if source.startswith(b'\xef\xbb\xbf'):
+        source = source[3:]
+    source = source.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return source.rstrip()
+
+
+def source_hash(source: bytes):
+    """
+    Return the hash of the normalized source bytes.
+
+    Args:
+        source (bytes): Contents of the source file.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest of the normalized contents.
+    """
+    return hashlib.sha256(normalize_source(source)).hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU cache of the prediction results keyed by the hash of the source file.
+
+    Each entry stores the language of the file and the fingerprint of the model that produced the results.
+    An entry whose fingerprint does not match the current model is dropped, so retraining a model invalidates
+    its cached results. Optionally the entries are also stored in an SQLite database that survives restarts.
+    """
+    def __init__(self, max_size: int = 1024, path: str = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size (int): Maximum number of entries kept in memory and in the database.
+            path (str): Path to the SQLite database. The cache is kept only in memory if not given.
+        """
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.connection = None
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS predictions (source_hash TEXT PRIMARY KEY, "
+                                    "language TEXT, fingerprint TEXT, results TEXT, last_used REAL)")
+            self.connection.commit()
+
+    def get(self, source_hash: str, fingerprint):
+        """
+        Return the cached prediction for the source file.
+
+        Args:
+            source_hash (str): Hash of the source file.
+            fingerprint (callable): Function returning the fingerprint of the current model for a language.
+
+        Returns:
+            [(str, float, float)]: The cached list of the label, similarity value and probability, None on a miss.
+            str: The language of the file, None on a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(source_hash)
+            if entry is None and self.connection is not None:
+                row = self.connection.execute("SELECT language, fingerprint, results FROM predictions WHERE source_hash = ?",
+                                              (source_hash,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], [tuple(result) for result in json.loads(row[2])])
+            if entry is None:
+                return None, None
+
+        language, entry_fingerprint, results = entry
+        if entry_fingerprint != fingerprint(language):
+            self.remove(source_hash)
+            return None, None
+
+        with self.lock:
+            self.entries[source_hash] = entry
+            self.entries.move_to_end(source_hash)
+            self.evict()
+            if self.connection is not None:
+                self.connection.execute("UPDATE predictions SET last_used = ? WHERE source_hash = ?", (time.time(), source_hash))
+                self.connection.commit()
+        return results, language
+
+    def put(self, source_hash: str, language: str, fingerprint: str, results: list):
+        """
+        Store the prediction for the source file.
+
+        Args:
+            source_hash (str): Hash of the source file.
+            language (str): Language of the file.
+            fingerprint (str): Fingerprint of the model that produced the results.
+            results ([(str, float, float)]): List of the label, similarity value and probability.
+        """
+        with self.lock:
+            self.entries[source_hash] = (language, fingerprint, results)
+            self.entries.move_to_end(source_hash)
+            self.evict()
+            if self.connection is not None:
+                self.connection.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                                        (source_hash, language, fingerprint, json.dumps(results), time.time()))
+                self.connection.execute("DELETE FROM predictions WHERE source_hash NOT IN "
+                                        "(SELECT source_hash FROM predictions ORDER BY last_used DESC LIMIT ?)", (self.max_size,))
+                self.connection.commit()
+
+    def remove(self, source_hash: str):
+        """
+        Remove the entry for the source file.
+
+        Args:
+            source_hash (str): Hash of the source file.
+        """
+        with self.lock:
+            self.entries.pop(source_hash, None)
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM predictions WHERE source_hash = ?", (source_hash,))
+                self.connection.commit()
+
+    def evict(self):
+        """
+        Drop the least recently used entries from memory over the size limit.
+        """
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self.lock:
+            self.entries.clear()
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM predictions")
+                self.connection.commit()
+
+
+prediction_cache = PredictionCache()
+
+
+def get_prediction_cache():
+    """
+    Return the process-wide prediction cache.
+    """
+    return prediction_cache
+
+
+def configure_prediction_cache(max_size: int = 1024, path: str = None):
+    """
+    Replace the process-wide prediction cache with one of the given size and storage.
+
+    Args:
+        max_size (int): Maximum number of cached entries.
+        path (str): Path to the SQLite database. The cache is kept only in memory if not given.
+
+    Returns:
+        PredictionCache: The new cache.
+    """
+    global prediction_cache
+    prediction_cache = PredictionCache(max_size, path)
+    return prediction_cache
@@ -0,0 +1,163 @@
+import os
+import time
+import threading
+from types import MappingProxyType
+
+from registry import LANGUAGES
+
+
+def directory_stamp(directory: str):
+    """
+    Return a cheap stamp of the files in a directory used to detect changes on disk.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        tuple: Sorted names, modification times in nanoseconds and sizes of the files, None if the directory
+            does not exist.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                for entry in entries if entry.is_file()))
+    except FileNotFoundError:
+        return None
+
+
+class ReferenceStore:
+    """
+    Immutable in-memory contents of the reference source files of a language.
+
+    The files are read and decoded once when the store is created, so the responses take the contents from
+    memory. A changed directory is picked up by creating a new store, the existing one is never modified.
+    """
+    def __init__(self, directory: str, extension: str):
+        """
+        Read the source files of the directory.
+
+        Args:
+            directory (str): Directory of the reference files.
+            extension (str): Extension of the source files, the other files (e.g. _readme.md) are skipped.
+        """
+        self.directory = os.path.abspath(directory)
+        self.stamp = directory_stamp(directory)
+        files = {}
+        for file_name, mtime, size in self.stamp or ():
+            if not file_name.endswith(extension):
+                continue
+            with open(os.path.join(directory, file_name), 'r', encoding='utf-8', errors='replace') as file:
+                files[file_name] = file.read()
+        self.files = MappingProxyType(files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, file_name: str):
+        return file_name in self.files
+
+    def __getitem__(self, file_name: str):
+        """
+        Return the contents of a reference file, raising KeyError if there is no such file.
+        """
+        return self.files[file_name]
+
+    def get(self, file_name: str, default: str = None):
+        """
+        Return the contents of a reference file, default if there is no such file.
+        """
+        return self.files.get(file_name, default)
+
+    def read(self, file_path: str):
+        """
+        Return the contents of a file, from the store if it is one of the reference files or from the disk.
+        """
+        file_path = os.path.abspath(file_path)
+        if os.path.dirname(file_path) == self.directory and os.path.basename(file_path) in self.files:
+            return self.files[os.path.basename(file_path)]
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read()
+
+    def is_stale(self):
+        """
+        Check whether a file of the directory was added, removed or changed since the store was created.
+        """
+        return directory_stamp(self.directory) != self.stamp
+
+
+class ReferenceStores:
+    """
+    Process-wide reference stores of the supported languages, with the files of the default corpus paths.
+    """
+    def __init__(self, check_files: bool = True, check_interval: float = 1.0):
+        """
+        Initialize the stores.
+
+        Args:
+            check_files (bool): Whether to check if the files on disk changed and reload the store.
+            check_interval (float): Minimum number of seconds between the checks of a directory.
+        """
+        self.check_files = check_files
+        self.check_interval = check_interval
+        self.stores = {}
+        self.checked = {}
+        self.lock = threading.Lock()
+
+    def get(self, language: str):
+        """
+        Return the reference store of a language, loading it if necessary.
+
+        Args:
+            language (str): Language of the files ("Python" or "C").
+
+        Returns:
+            ReferenceStore: The store.
+        """
+        with self.lock:
+            store = self.stores.get(language)
+            now = time.monotonic()
+            stale = store is None
+            if not stale and self.check_files and now - self.checked[language] >= self.check_interval:
+                self.checked[language] = now
+                stale = store.is_stale()
+            if stale:
+                store = ReferenceStore(LANGUAGES[language]["corpus_path"], LANGUAGES[language]["extension"])
+                self.stores[language] = store
+                self.checked[language] = now
+            return store
+
+    def preload(self):
+        """
+        Load the stores of all supported languages.
+        """
+        for language in LANGUAGES:
+            self.get(language)
+
+
+reference_stores = ReferenceStores()
+
+
+def get_reference_store(language: str):
+    """
+    Return the process-wide reference store of a language.
+    """
+    return reference_stores.get(language)
+
+
+def configure_reference_stores(check_files: bool = True, check_interval: float = 1.0, preload: bool = False):
+    """
+    Replace the process-wide reference stores.
+
+    Args:
+        check_files (bool): Whether to check if the files on disk changed and reload the store.
+        check_interval (float): Minimum number of seconds between the checks of a directory.
+        preload (bool): Whether to load the stores of all languages now instead of on the first use.
+
+    Returns:
+        ReferenceStores: The new stores.
+    """
+    global reference_stores
+    reference_stores = ReferenceStores(check_files, check_interval)
+    if preload:
+        reference_stores.preload()
+    return reference_stores
@@ -0,0 +1,317 @@
+import os
+import hashlib
+import zipfile
+import threading
+import warnings
+import torch
+
+from vocab import Vocab
+
+
+BASE_DIR = os.path.dirname(__file__)
+
+# Default vocabulary, model, embedding index and indexed corpus paths and the source file extension for each
+# supported language
+LANGUAGES = {
+    "Python": {
+        "vocab_path": os.path.join(BASE_DIR, "data/vocab4ast.json"),
+        "model_path": os.path.join(BASE_DIR, "work_dir/HDHGN/HDHGN.pt"),
+        "torchscript_path": os.path.join(BASE_DIR, "work_dir/HDHGN/HDHGN.torchscript.pt"),
+        "onnx_path": os.path.join(BASE_DIR, "work_dir/HDHGN/HDHGN.onnx"),
+        "int8_path": os.path.join(BASE_DIR, "work_dir/HDHGN/HDHGN.int8.pt"),
+        "index_path": os.path.join(BASE_DIR, "work_dir/HDHGN/index"),
+        "corpus_path": os.path.join(BASE_DIR, "data/txt_python_files"),
+        "extension": ".py",
+    },
+    "C": {
+        "vocab_path": os.path.join(BASE_DIR, "data/vocab4ast_c.json"),
+        "model_path": os.path.join(BASE_DIR, "work_dir/HDHGN_C/HDHGN_C.pt"),
+        "torchscript_path": os.path.join(BASE_DIR, "work_dir/HDHGN_C/HDHGN_C.torchscript.pt"),
+        "onnx_path": os.path.join(BASE_DIR, "work_dir/HDHGN_C/HDHGN_C.onnx"),
+        "int8_path": os.path.join(BASE_DIR, "work_dir/HDHGN_C/HDHGN_C.int8.pt"),
+        "index_path": os.path.join(BASE_DIR, "work_dir/HDHGN_C/index"),
+        "corpus_path": os.path.join(BASE_DIR, "data/txt_c_files"),
+        "extension": ".c",
+    },
+}
+
+# Backends running the models and the default model path of each of them
+BACKENDS = {
+    "eager": "model_path",
+    "torchscript": "torchscript_path",
+    "onnx": "onnx_path",
+    "int8": "int8_path",
+}
+
+# Backends whose models run only on the CPU
+CPU_BACKENDS = ("int8",)
+DEFAULT_BACKEND = os.environ.get("HDHGN_BACKEND", "eager")
+
+
+def file_stamp(file_path: str):
+    """
+    Return a cheap stamp of a file used to detect changes on disk.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        tuple: Modification time in nanoseconds and size of the file.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def is_torchscript_archive(file_path: str):
+    """
+    Check whether the file is a TorchScript archive rather than a pickled model.
+
+    Args:
+        file_path (str): Path to the model file.
+
+    Returns:
+        bool: True if the file was saved by torch.jit.save.
+    """
+    if not zipfile.is_zipfile(file_path):
+        return False
+    with zipfile.ZipFile(file_path) as archive:
+        return any(name.split("/", 2)[1:2] == ["code"] for name in archive.namelist())
+
+
+def load_model(model_path: str, device: torch.device):
+    """
+    Load a model for predictions in eval mode.
+
+    Models exported with ExportModel.py are loaded as TorchScript archives, which does not need the Python model
+    classes, or run by ONNX Runtime on the CPU (files with the .onnx extension). Other models are unpickled.
+
+    Args:
+        model_path (str): Path to the model.
+        device (torch.device): Device on which the model is kept.
+
+    Returns:
+        The model, called with the inputs of HDHGN.
+    """
+    if model_path.endswith(".onnx"):
+        from models.inference import OnnxInference
+        return OnnxInference(model_path)
+
+    if is_torchscript_archive(model_path):
+        # The scripted model calls the operators of torch_scatter, which are registered by importing it
+        import torch_scatter
+        model = torch.jit.load(model_path, map_location=device)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter(action='ignore', category=FutureWarning)
+            model = torch.load(model_path, map_location=device, weights_only=False)
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+def file_hash(file_path: str):
+    """
+    Return the SHA-256 hash of the contents of a file.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hexadecimal digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RegistryEntry:
+    """
+    A loaded model together with its vocabulary and the stamps of the files it was loaded from.
+    """
+    def __init__(self, language: str, model_path: str, vocab_path: str, model, vocab: Vocab, device: torch.device):
+        self.language = language
+        self.model_path = model_path
+        self.vocab_path = vocab_path
+        self.model = model
+        self.vocab = vocab
+        self.device = device
+        self.model_stamp = file_stamp(model_path)
+        self.vocab_stamp = file_stamp(vocab_path)
+        self.model_hash = file_hash(model_path)
+        self.vocab_hash = file_hash(vocab_path)
+
+    @property
+    def fingerprint(self):
+        """
+        Fingerprint of the model and vocabulary files the entry was loaded from.
+        """
+        return self.model_hash + ":" + self.vocab_hash
+
+    def is_stale(self):
+        """
+        Check whether the model or vocabulary file changed on disk since the entry was loaded.
+
+        The modification time and size are checked first. Only when they differ the file contents are hashed,
+        so touching a file without changing it does not cause a reload.
+
+        Returns:
+            bool: True if the entry has to be reloaded.
+        """
+        try:
+            model_stamp = file_stamp(self.model_path)
+            vocab_stamp = file_stamp(self.vocab_path)
+        except FileNotFoundError:
+            return False
+
+        stale = False
+        if model_stamp != self.model_stamp:
+            stale = stale or file_hash(self.model_path) != self.model_hash
+            self.model_stamp = model_stamp
+        if vocab_stamp != self.vocab_stamp:
+            stale = stale or file_hash(self.vocab_path) != self.vocab_hash
+            self.vocab_stamp = vocab_stamp
+        return stale
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of the HDHGN models and vocabularies.
+
+    Every model and vocabulary is loaded once per process and kept in eval mode, so the prediction does not
+    deserialize them on each call.
+    """
+    def __init__(self, device: torch.device = None, check_files: bool = True, backend: str = None):
+        """
+        Initialize the registry.
+
+        Args:
+            device (torch.device): Device on which the models are kept. Defaults to CUDA if available and the
+                backend supports it.
+            check_files (bool): Whether to check on each access if the files on disk changed and reload them.
+            backend (str): Backend whose models are loaded by default ("eager", "torchscript", "onnx" or "int8").
+                Defaults to the HDHGN_BACKEND environment variable or "eager".
+        """
+        self.check_files = check_files
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {self.backend}. Available backends: {', '.join(BACKENDS)}")
+        use_cuda = torch.cuda.is_available() and self.backend not in CPU_BACKENDS
+        self.device = device or torch.device("cuda:0" if use_cuda else "cpu")
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, language: str, model_path: str = "", vocab_path: str = ""):
+        """
+        Return the loaded model and vocabulary for the given language, loading them if necessary.
+
+        Args:
+            language (str): Language of the model ("Python" or "C").
+            model_path (str): Path to the model. Defaults to the path for the language and backend.
+            vocab_path (str): Path to the vocabulary. Defaults to the path for the language.
+
+        Returns:
+            RegistryEntry: The entry with the ready model and vocabulary.
+        """
+        model_path = model_path or LANGUAGES[language][BACKENDS[self.backend]]
+        vocab_path = vocab_path or LANGUAGES[language]["vocab_path"]
+        key = (language, os.path.abspath(model_path), os.path.abspath(vocab_path))
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (self.check_files and entry.is_stale()):
+                entry = self.load(language, model_path, vocab_path)
+                self.entries[key] = entry
+            return entry
+
+    def fingerprint(self, language: str, model_path: str = "", vocab_path: str = ""):
+        """
+        Return the fingerprint of the current model and vocabulary for the given language.
+
+        Args:
+            language (str): Language of the model ("Python" or "C").
+            model_path (str): Path to the model. Defaults to the path for the language and backend.
+            vocab_path (str): Path to the vocabulary. Defaults to the path for the language.
+
+        Returns:
+            str: Fingerprint of the model and vocabulary files.
+        """
+        return self.get(language, model_path, vocab_path).fingerprint
+
+    def load(self, language: str, model_path: str, vocab_path: str):
+        """
+        Load the model and vocabulary from disk.
+
+        Args:
+            language (str): Language of the model ("Python" or "C").
+            model_path (str): Path to the model.
+            vocab_path (str): Path to the vocabulary.
+
+        Returns:
+            RegistryEntry: The entry with the loaded model and vocabulary.
+        """
+        vocab = Vocab.load(vocab_path)
+        model = load_model(model_path, self.device)
+        return RegistryEntry(language, model_path, vocab_path, model, vocab, self.device)
+
+    def reload(self, language: str = None):
+        """
+        Explicitly reload the loaded entries from disk.
+
+        Args:
+            language (str): Language of the entries to reload. Reloads all entries if not given.
+        """
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if language is None or entry.language == language:
+                    self.entries[key] = self.load(entry.language, entry.model_path, entry.vocab_path)
+
+    def refresh(self):
+        """
+        Reload only the entries whose files changed on disk.
+
+        Returns:
+            list: Languages of the reloaded entries.
+        """
+        reloaded = []
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry.is_stale():
+                    self.entries[key] = self.load(entry.language, entry.model_path, entry.vocab_path)
+                    reloaded.append(entry.language)
+        return reloaded
+
+    def clear(self):
+        """
+        Drop all loaded entries.
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_registry():
+    """
+    Return the process-wide model registry.
+    """
+    return registry
+
+
+def configure_registry(backend: str = None, device: torch.device = None, check_files: bool = True):
+    """
+    Replace the process-wide model registry with one using the given backend.
+
+    Args:
+        backend (str): Backend whose models are loaded by default ("eager", "torchscript", "onnx" or "int8").
+        device (torch.device): Device on which the models are kept. Defaults to CUDA if available.
+        check_files (bool): Whether to check on each access if the files on disk changed and reload them.
+
+    Returns:
+        ModelRegistry: The new registry.
+    """
+    global registry
+    registry = ModelRegistry(device, check_files, backend)
+    return registry
@@ -4,7 +4,4 @@ python utilities\clear_train_directories.py
 python ProcessData.py -p -c
 python vocab.py -p -c
 
-Set-location trains
-python trainHDHGN.py
-python trainHDHGN_c.py
-Set-location ..
+python trains\train.py -c trains\configs\python.json trains\configs\c.json
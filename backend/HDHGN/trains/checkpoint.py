@@ -0,0 +1,95 @@
+import os
+import glob
+import random
+import numpy as np
+import torch
+
+# Name of the checkpoint with the best model and the pattern of the periodic checkpoints
+BEST_CHECKPOINT = "best.pt"
+CHECKPOINT_PATTERN = "checkpoint_{epoch:04d}.pt"
+
+
+def atomic_save(obj, path: str):
+    """
+    Save an object with torch.save so that the file is either the previous or the complete new version.
+
+    The object is written to a temporary file in the same directory, flushed to the disk and then renamed over
+    the target, so a process killed in the middle of saving does not leave a truncated file.
+
+    Args:
+        obj: The object to save.
+        path (str): Path to the file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        torch.save(obj, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def get_rng_state():
+    """
+    Return the states of the random number generators used in training.
+    """
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+
+
+def set_rng_state(state: dict):
+    """
+    Restore the states of the random number generators saved by get_rng_state.
+    """
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+
+
+def save_checkpoint(checkpoint_dir: str, epoch: int, state: dict, keep: int):
+    """
+    Save the periodic checkpoint of an epoch and delete the oldest checkpoints above the retention limit.
+
+    Args:
+        checkpoint_dir (str): Directory of the checkpoints.
+        epoch (int): Number of the finished epoch.
+        state (dict): State of the training.
+        keep (int): Number of the newest periodic checkpoints to keep.
+
+    Returns:
+        str: Path to the saved checkpoint.
+    """
+    path = os.path.join(checkpoint_dir, CHECKPOINT_PATTERN.format(epoch=epoch))
+    atomic_save({**state, "epoch": epoch, "rng": get_rng_state()}, path)
+    for old_path in list_checkpoints(checkpoint_dir)[:-max(keep, 1)]:
+        os.remove(old_path)
+    return path
+
+
+def list_checkpoints(checkpoint_dir: str):
+    """
+    Return the paths of the periodic checkpoints in the directory, from the oldest to the newest.
+    """
+    return sorted(glob.glob(os.path.join(checkpoint_dir, CHECKPOINT_PATTERN.replace("{epoch:04d}", "[0-9]" * 4))))
+
+
+def load_checkpoint(path: str):
+    """
+    Load a checkpoint on the CPU. The model and optimizer states are moved to the device by load_state_dict.
+    """
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def clear_checkpoints(checkpoint_dir: str):
+    """
+    Delete the periodic and the best checkpoints of a previous training in the directory.
+    """
+    for path in list_checkpoints(checkpoint_dir) + [os.path.join(checkpoint_dir, BEST_CHECKPOINT)]:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,108 @@
+import torch
+
+
+class StreamingMetrics:
+    """
+    Classification metrics accumulated batch by batch as tensors.
+
+    Every batch adds its counts to a confusion matrix, top-k hits, a loss sum and confidence bins, so the metrics
+    of a whole dataset are computed in one pass without keeping the predictions of every sample.
+    """
+    def __init__(self, num_classes: int, top_k: int = 5, num_bins: int = 15, device: torch.device = None):
+        """
+        Initialize the metrics.
+
+        Args:
+            num_classes (int): Number of classes.
+            top_k (int): The k of the top-k accuracy.
+            num_bins (int): Number of confidence bins of the calibration error.
+            device (torch.device): Device of the counts, the device of the model outputs.
+        """
+        self.num_classes = num_classes
+        self.top_k = min(top_k, num_classes)
+        self.num_bins = num_bins
+        self.confusion = torch.zeros(num_classes, num_classes, dtype=torch.long, device=device)
+        self.top_k_hits = torch.zeros((), dtype=torch.long, device=device)
+        self.loss_sum = torch.zeros((), dtype=torch.float64, device=device)
+        self.bin_counts = torch.zeros(num_bins, dtype=torch.long, device=device)
+        self.bin_confidence = torch.zeros(num_bins, dtype=torch.float64, device=device)
+        self.bin_correct = torch.zeros(num_bins, dtype=torch.long, device=device)
+
+    @torch.no_grad()
+    def update(self, output: torch.Tensor, labels: torch.Tensor):
+        """
+        Add the outputs of a batch.
+
+        Args:
+            output (torch.Tensor): Logits of the batch, of shape (num_graphs, num_classes).
+            labels (torch.Tensor): Labels of the batch.
+        """
+        output = output.float()
+        self.loss_sum += torch.nn.functional.cross_entropy(output, labels, reduction="sum")
+        confidence, pred = output.softmax(-1).max(-1)
+        self.confusion += torch.bincount(labels * self.num_classes + pred,
+                                         minlength=self.num_classes ** 2).view(self.num_classes, self.num_classes)
+        self.top_k_hits += (output.topk(self.top_k, dim=-1).indices == labels.unsqueeze(-1)).any(-1).sum()
+
+        bins = (confidence * self.num_bins).long().clamp(max=self.num_bins - 1)
+        self.bin_counts += torch.bincount(bins, minlength=self.num_bins)
+        self.bin_confidence.index_add_(0, bins, confidence.double())
+        self.bin_correct += torch.bincount(bins, weights=(pred == labels).float(), minlength=self.num_bins).long()
+
+    def compute(self):
+        """
+        Compute the metrics of all added batches.
+
+        Returns:
+            dict: Number of samples, average loss, top-1 and top-k accuracy, expected calibration error, per-class
+                precision, recall and support (tensors on the CPU) and their macro averages over the classes with
+                samples or predictions, as sklearn with average="macro" and zero_division=0.
+        """
+        confusion = self.confusion.cpu()
+        num_samples = int(confusion.sum())
+        true_positives = confusion.diag().double()
+        support = confusion.sum(1)
+        predicted = confusion.sum(0)
+        precision = true_positives / predicted.clamp(min=1)
+        recall = true_positives / support.clamp(min=1)
+        # Classes with samples or predictions, like the labels of sklearn, undefined values count as 0
+        present = (support > 0) | (predicted > 0)
+
+        bin_counts = self.bin_counts.cpu().double()
+        gaps = (self.bin_confidence.cpu() - self.bin_correct.cpu().double()).abs()
+        return {
+            "num_samples": num_samples,
+            "loss": self.loss_sum.item() / max(num_samples, 1),
+            "top1": true_positives.sum().item() / max(num_samples, 1),
+            f"top{self.top_k}": self.top_k_hits.item() / max(num_samples, 1),
+            "ece": gaps.sum().item() / max(bin_counts.sum().item(), 1),
+            "precision": precision,
+            "recall": recall,
+            "support": support,
+            "macro_precision": precision[present].mean().item() if present.any() else 0.0,
+            "macro_recall": recall[present].mean().item() if present.any() else 0.0,
+        }
+
+
+def format_report(metrics: dict, class_names: list):
+    """
+    Format the metrics computed by StreamingMetrics as a text report with a row for every class with samples.
+
+    Args:
+        metrics (dict): The computed metrics.
+        class_names (list): Names of the classes by their id.
+
+    Returns:
+        str: The report.
+    """
+    # The top-k accuracy is missing when only the top-1 accuracy is tracked
+    top_k = next((key for key in metrics if key.startswith("top") and key != "top1"), None)
+    top_k_text = f"top-{top_k[3:]}={metrics[top_k] * 100:.2f}% " if top_k is not None else ""
+    lines = [f"samples={metrics['num_samples']} loss={metrics['loss']:.4f} top-1={metrics['top1'] * 100:.2f}% "
+             f"{top_k_text}ECE={metrics['ece']:.4f} "
+             f"macro precision={metrics['macro_precision'] * 100:.2f}% macro recall={metrics['macro_recall'] * 100:.2f}%",
+             f"{'class':<32} {'precision':>10} {'recall':>10} {'support':>8}"]
+    for i in metrics["support"].nonzero().view(-1).tolist():
+        lines.append(f"{class_names[i]:<32} {metrics['precision'][i].item() * 100:>9.2f}% "
+                     f"{metrics['recall'][i].item() * 100:>9.2f}% {metrics['support'][i].item():>8}")
+    return "\n".join(lines)
@@ -0,0 +1,579 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+import torch
+from colorama import Fore, Style
+from openpyxl import load_workbook
+from tqdm import tqdm
+import xlsxwriter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from MyDataset import HDHGNInMemoryDataset, HDHGNInMemoryDataset_C, InMemoryBatchLoader, BucketBatchSampler, graph_sizes
+from models.HDHGN import HDHGN
+from vocab import Vocab
+from utilities.utils import show_2scores, show_score
+from trains.metrics import StreamingMetrics, format_report
+from trains.checkpoint import (BEST_CHECKPOINT, atomic_save, clear_checkpoints, list_checkpoints, load_checkpoint,
+                               save_checkpoint, set_rng_state)
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TRAINS_DIR = os.path.join(BASE_DIR, "trains")
+
+# Dataset class and default paths of each language, relative to the HDHGN directory
+LANGUAGE_SETTINGS = {
+    "Python": {
+        "dataset_class": HDHGNInMemoryDataset,
+        "model_name": "HDHGN",
+        "vocab_path": "data/vocab4ast.json",
+        "train_root": "data/train",
+        "train_paths": "data/train_files_paths.txt",
+        "valid_root": "data/valid",
+        "valid_paths": "data/valid_files_paths.txt",
+        "test_root": "data/test",
+        "test_paths": "data/test_files_paths.txt",
+        "result_dir": "work_dir/HDHGN",
+        "results_file": "work_dir/results_python.xlsx",
+        "plot_suffix": "python",
+    },
+    "C": {
+        "dataset_class": HDHGNInMemoryDataset_C,
+        "model_name": "HDHGN_C",
+        "vocab_path": "data/vocab4ast_c.json",
+        "train_root": "data/train_c",
+        "train_paths": "data/train_files_paths_c.txt",
+        "valid_root": "data/valid_c",
+        "valid_paths": "data/valid_files_paths_c.txt",
+        "test_root": "data/test_c",
+        "test_paths": "data/test_files_paths_c.txt",
+        "result_dir": "work_dir/HDHGN_C",
+        "results_file": "work_dir/results_c.xlsx",
+        "plot_suffix": "c",
+    },
+}
+
+# Training settings used when the config file does not set them
+DEFAULT_CONFIG = {
+    "batch_size": 32,
+    "valid_batch_size": 256,
+    "max_nodes": None,
+    "max_node_edges": None,
+    "valid_max_nodes": None,
+    "valid_max_node_edges": None,
+    "lr": 5e-3,
+    "scheduler": False,
+    "num_epochs": 15,
+    "patience": 5,
+    "accumulation_steps": 1,
+    "mixed_precision": False,
+    "device": None,
+    "num_threads": None,
+    "process_workers": None,
+    "loader_workers": 0,
+    "persistent_workers": True,
+    "prefetch_factor": 2,
+    "pin_memory": None,
+    "seed": None,
+    "resume": False,
+    "checkpoint_every": 1,
+    "keep_checkpoints": 3,
+    "model": {
+        "embed_size": 128,
+        "dim_size": 128,
+        "num_layers": 4,
+        "num_edge_heads": 8,
+        "num_node_heads": 8,
+        "num_heads": 8,
+        "hidden_size": 1024,
+        "dropout": 0.2,
+    },
+}
+
+# Config files of the default training of both languages
+DEFAULT_CONFIGS = [os.path.join(TRAINS_DIR, "configs", "python.json"), os.path.join(TRAINS_DIR, "configs", "c.json")]
+
+PATH_KEYS = ("vocab_path", "train_root", "train_paths", "valid_root", "valid_paths", "test_root", "test_paths",
+             "result_dir", "results_file")
+
+
+def load_config(config_path: str):
+    """
+    Load a training config file and complete it with the defaults of its language.
+
+    The file is a JSON object with the "language" field ("Python" or "C"). The other fields override the
+    training settings of DEFAULT_CONFIG and the paths of LANGUAGE_SETTINGS. Relative paths are resolved
+    against the HDHGN directory.
+
+    Args:
+        config_path (str): Path to the config file.
+
+    Returns:
+        dict: The complete config.
+    """
+    with open(config_path, encoding="utf-8") as file:
+        values = json.load(file)
+
+    language = values.get("language")
+    if language not in LANGUAGE_SETTINGS:
+        raise ValueError(f"Unknown language in {config_path}: {language}. Available languages: {', '.join(LANGUAGE_SETTINGS)}")
+    settings = {key: value for key, value in LANGUAGE_SETTINGS[language].items() if key != "dataset_class"}
+    unknown = set(values) - set(DEFAULT_CONFIG) - set(settings) - {"language"}
+    if unknown:
+        raise ValueError(f"Unknown fields in {config_path}: {', '.join(sorted(unknown))}")
+
+    config = {**DEFAULT_CONFIG, **settings, **values}
+    config["model"] = {**DEFAULT_CONFIG["model"], **values.get("model", {})}
+    for key in PATH_KEYS:
+        config[key] = os.path.join(BASE_DIR, config[key])
+    return config
+
+
+def train(config: dict):
+    """
+    Train, validate and test the HDHGN model of a language.
+
+    Args:
+        config (dict): The training config, as returned by load_config.
+
+    Returns:
+        tuple: Maximum validation accuracy and test accuracy.
+    """
+    language = config["language"]
+    print(Fore.GREEN + f"Start training on {language} files..." + Style.RESET_ALL)
+
+    if config["seed"] is not None:
+        torch.manual_seed(config["seed"])
+
+    # Load vocabulary and datasets
+    v, dataset, valid_dataset, test_dataset = load_datasets(config)
+
+    # Set device
+    device = get_device(config)
+
+    dataloader = make_loader(config, dataset, config["batch_size"], True, device, config["max_nodes"], config["max_node_edges"])
+    valid_dataloader = make_loader(config, valid_dataset, config["valid_batch_size"], False, device,
+                                   config["valid_max_nodes"], config["valid_max_node_edges"])
+    test_dataloader = make_loader(config, test_dataset, config["valid_batch_size"], False, device,
+                                  config["valid_max_nodes"], config["valid_max_node_edges"])
+
+    # Model parameters
+    parameters = config["model"]
+    feed_sizes = [parameters["dim_size"], parameters["hidden_size"], len(v.vocab["labels"].word2id)]
+
+    # Model information
+    model_name = config["model_name"]
+    parameters_des = "embed size=" + str(parameters["embed_size"]) + " dim size=" + str(parameters["dim_size"]) + " num layers=" + str(
+        parameters["num_layers"]) + " num_edge_heads=" + str(parameters["num_edge_heads"]) + "num_node_heads=" + str(
+        parameters["num_node_heads"]) + " num_heads=" + str(parameters["num_heads"]) + " dropout=" + str(parameters["dropout"]) + " feed size=" + "".join(
+        [str(f) + " " for f in feed_sizes])
+
+    # Save path
+    result_save_path = config["result_dir"]
+    os.makedirs(result_save_path, exist_ok=True)
+    model_save_path = os.path.join(result_save_path, model_name + ".pt")
+    checkpoint_dir = os.path.join(result_save_path, "checkpoints")
+    best_checkpoint_path = os.path.join(checkpoint_dir, BEST_CHECKPOINT)
+
+    # Initialize model
+    model = build_model(config, v).to(device)
+    loss_function = torch.nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=config["lr"])
+    # ReduceLROnPlateau reduces the learning rate based on the accuracy on the validation dataset, which can make
+    # the results better. Previous work used a fixed learning rate, so it is enabled by the config.
+    scheduler = None
+    if config["scheduler"]:
+        scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode="max", factor=0.1, patience=1, eps=1e-12)
+
+    max_attk, attk = config["patience"], 0
+    max_accuracy = 0
+    m_epoch = 0
+    loss_list, valid_loss_list, valid_acc_list = [], [], []
+    start_epoch = 0
+
+    # Resume from the newest periodic checkpoint or start a new training
+    checkpoints = list_checkpoints(checkpoint_dir)
+    if config["resume"] and checkpoints:
+        checkpoint = load_checkpoint(checkpoints[-1])
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        if scheduler is not None and checkpoint["scheduler"] is not None:
+            scheduler.load_state_dict(checkpoint["scheduler"])
+        set_rng_state(checkpoint["rng"])
+        max_accuracy, m_epoch, attk = checkpoint["max_accuracy"], checkpoint["m_epoch"], checkpoint["attk"]
+        loss_list, valid_loss_list, valid_acc_list = checkpoint["loss_list"], checkpoint["valid_loss_list"], checkpoint["valid_acc_list"]
+        start_epoch = checkpoint["epoch"] + 1
+        print(Fore.GREEN + f"Resuming training on {language} files from epoch {start_epoch}: " + Style.RESET_ALL + checkpoints[-1])
+    else:
+        if config["resume"]:
+            print(Fore.YELLOW + f"No checkpoint of the {language} training found in {checkpoint_dir}, starting a new training." + Style.RESET_ALL)
+        clear_checkpoints(checkpoint_dir)
+
+    # Training loop
+    for epoch in tqdm(range(start_epoch, config["num_epochs"]), desc=language, initial=start_epoch, total=config["num_epochs"]):
+        train_loss, graphs_per_second, nodes_per_second = train_epoch(model, dataloader, optimizer, loss_function, device,
+                                                                      epoch, config["accumulation_steps"],
+                                                                      config["mixed_precision"])
+        print(f"{language} epoch throughput: {graphs_per_second:.1f} graphs/s {nodes_per_second:.1f} nodes/s")
+        valid_loss, valid_accuracy = valid(model, valid_dataloader, device)
+        if scheduler is not None:
+            scheduler.step(valid_accuracy)
+
+        loss_list.append(train_loss)
+        valid_loss_list.append(valid_loss)
+        valid_acc_list.append(valid_accuracy)
+
+        print(f"{language} epoch finished: train loss={train_loss} valid loss={valid_loss} valid accuracy={valid_accuracy}")
+
+        if valid_accuracy > max_accuracy:
+            atomic_save(model, model_save_path)
+            atomic_save({"model": model.state_dict(), "optimizer": optimizer.state_dict()}, best_checkpoint_path)
+            print("     successfully saved")
+            max_accuracy = valid_accuracy
+            m_epoch = epoch
+            attk = 0
+        else:
+            attk += 1
+            print("     epoch no better than last time")
+        if attk >= max_attk:
+            # The optimizer state is restored with the weights it belongs to, the learning rate set by the
+            # scheduler is kept
+            best = load_checkpoint(best_checkpoint_path)
+            learning_rates = [group["lr"] for group in optimizer.param_groups]
+            model.load_state_dict(best["model"])
+            optimizer.load_state_dict(best["optimizer"])
+            for group, lr in zip(optimizer.param_groups, learning_rates):
+                group["lr"] = lr
+            print("     reload last model")
+            attk = 0
+
+        if (epoch + 1) % config["checkpoint_every"] == 0 or epoch + 1 == config["num_epochs"]:
+            save_checkpoint(checkpoint_dir, epoch, {
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scheduler": scheduler.state_dict() if scheduler is not None else None,
+                "max_accuracy": max_accuracy,
+                "m_epoch": m_epoch,
+                "attk": attk,
+                "loss_list": loss_list,
+                "valid_loss_list": valid_loss_list,
+                "valid_acc_list": valid_acc_list,
+            }, config["keep_checkpoints"])
+
+    model.load_state_dict(load_checkpoint(best_checkpoint_path)["model"])
+    test_metrics = evaluate(model, test_dataloader, device)
+    test_loss, test_accuracy = test_metrics["loss"], test_metrics["top1"]
+
+    print(f"Training on {language} files finished\n max valid accuracy={max_accuracy} epoch={m_epoch} test accuracy={test_accuracy} test loss={test_loss}")
+    print(format_report(test_metrics, [v.vocab["labels"].id2word[i] for i in range(len(v.vocab["labels"].id2word))]))
+    suffix = config["plot_suffix"]
+    show_2scores(loss_list, valid_loss_list, "Loss", "train", "valid", "blue", "red",
+                 os.path.join(result_save_path, model_name + "-loss_" + suffix + ".png"))
+    show_score(valid_acc_list, "Accuracy", "valid", "red", os.path.join(result_save_path, model_name + "-accuracy_" + suffix + ".png"))
+
+    results_file = config["results_file"]
+    if not os.path.exists(results_file):
+        workbook = xlsxwriter.Workbook(results_file)
+        worksheet1 = workbook.add_worksheet("sheet1")
+        worksheet1.activate()
+        title = ['model', 'parameter', 'valid max accuracy', 'test accuracy']
+        worksheet1.write_row('A1', title)
+        workbook.close()
+    workbook = load_workbook(results_file)
+    worksheet = workbook.active
+    worksheet.append([model_name, parameters_des, max_accuracy, test_accuracy])
+    workbook.save(results_file)
+
+    print(f"Finished training on {language} files \n")
+    return max_accuracy, test_accuracy
+
+
+def load_datasets(config: dict):
+    """
+    Load the vocabulary and the train, validation and test datasets of a config, processing them if needed.
+
+    The datasets are kept in memory as collated storages the batches are sliced from.
+
+    Args:
+        config (dict): The training config.
+
+    Returns:
+        tuple: The vocabulary and the train, validation and test datasets.
+    """
+    dataset_class = LANGUAGE_SETTINGS[config["language"]]["dataset_class"]
+    v = Vocab.load(config["vocab_path"])
+
+    # Number of worker processes used to process the source files (0 processes them serially)
+    process_workers = config["process_workers"] if config["process_workers"] is not None else os.cpu_count()
+
+    # The paths of the source files in the paths files are relative to the directory of the training scripts
+    with contextlib.chdir(TRAINS_DIR):
+        datasets = [dataset_class(config[split + "_root"], config[split + "_paths"], v, num_workers=process_workers)
+                    for split in ("train", "valid", "test")]
+    return v, *datasets
+
+
+def get_device(config: dict):
+    """
+    Return the device of a config, the first GPU if available by default.
+    """
+    return torch.device(config["device"] or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+
+
+def make_loader(config: dict, dataset, batch_size: int, shuffle: bool, device: torch.device, max_nodes: int = None,
+                max_node_edges: int = None):
+    """
+    Create the batch loader of a dataset with the loading options of a config.
+
+    With a node or node-edge budget the graphs are grouped by size and each batch is filled up to the budget
+    (BucketBatchSampler) instead of holding batch_size graphs. The batches are gathered by loader_workers
+    processes while the model computes, each prefetching prefetch_factor batches. Pinned memory, used by
+    default on the GPU, speeds up the copies to the device.
+
+    Args:
+        config (dict): The training config.
+        dataset (HDHGNInMemoryDataset): The dataset.
+        batch_size (int): Number of graphs in a batch, used without budgets.
+        shuffle (bool): Whether to shuffle the samples in every epoch.
+        device (torch.device): The device the batches are used on.
+        max_nodes (int): Maximum number of nodes in a batch. None for no limit.
+        max_node_edges (int): Maximum number of node-edges in a batch. None for no limit.
+
+    Returns:
+        InMemoryBatchLoader: The loader.
+    """
+    batch_sampler = None
+    if max_nodes is not None or max_node_edges is not None:
+        batch_sampler = BucketBatchSampler(*graph_sizes(dataset), max_nodes=max_nodes, max_node_edges=max_node_edges,
+                                           shuffle=shuffle)
+    return InMemoryBatchLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=config["loader_workers"],
+                               persistent_workers=config["persistent_workers"] and config["loader_workers"] > 0,
+                               prefetch_factor=config["prefetch_factor"],
+                               pin_memory=config["pin_memory"] if config["pin_memory"] is not None else device.type == "cuda",
+                               batch_sampler=batch_sampler)
+
+
+def build_model(config: dict, vocab: Vocab):
+    """
+    Create a new HDHGN model with the hyperparameters of a config.
+
+    Args:
+        config (dict): The training config.
+        vocab (Vocab): Vocabulary of the language.
+
+    Returns:
+        HDHGN: The model.
+    """
+    num_types = len(vocab.vocab["types"].word2id)
+    vocab_sizes = [len(vocab.vocab[t].word2id) for t in vocab.vocab["types"].word2id]
+    edge_vocab_size = len(vocab.vocab["edge_types"].word2id)
+    parameters = config["model"]
+    feed_sizes = [parameters["dim_size"], parameters["hidden_size"], len(vocab.vocab["labels"].word2id)]
+    return HDHGN(num_types, vocab_sizes, edge_vocab_size, parameters["embed_size"], parameters["dim_size"],
+                 parameters["num_layers"], parameters["num_edge_heads"], parameters["num_node_heads"],
+                 parameters["num_heads"], feed_sizes, parameters["dropout"])
+
+
+def train_epoch(model, dataloader, optimizer, loss_function, device, epoch, accumulation_steps=1, mixed_precision=False):
+    """
+    Train the model for one epoch.
+
+    The gradients of accumulation_steps consecutive batches are summed before each optimizer step, so the effective
+    batch size grows while only the activations of one batch are kept in memory. With mixed precision the forward
+    pass runs under autocast in bfloat16, which keeps the range of float32 and needs no loss scaling.
+
+    Args:
+        model (torch.nn.Module): The model to train.
+        dataloader (InMemoryBatchLoader): The dataloader for the training dataset.
+        optimizer (torch.optim.Optimizer): The optimizer.
+        loss_function (torch.nn.Module): The loss function.
+        device (torch.device): The device to train on.
+        epoch (int): Number of the epoch, used in the progress messages.
+        accumulation_steps (int): Number of batches whose gradients are accumulated before each optimizer step.
+        mixed_precision (bool): Whether to run the forward pass under autocast in bfloat16.
+
+    Returns:
+        tuple: Average training loss, graphs per second and nodes per second.
+    """
+    model.train()
+    train_loss, num_graphs, num_nodes = 0, 0, 0
+    i = 0
+    optimizer.zero_grad()
+    start = time.perf_counter()
+    for i, batch_data in enumerate(dataloader):
+        batch_data = batch_data.to(device, non_blocking=True)
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=mixed_precision):
+            output = model(batch_data.x, batch_data.types, batch_data.edge_types, batch_data.edge_in_out_indexs,
+                           batch_data.edge_in_out_head_tail, batch_data.batch, batch_data.get("edge_in_out_node_order"))
+            loss = loss_function(output, batch_data.labels)
+        (loss / accumulation_steps).backward()
+        if (i + 1) % accumulation_steps == 0:
+            optimizer.step()
+            optimizer.zero_grad()
+        train_loss += loss.item()
+        num_graphs += batch_data.num_graphs
+        num_nodes += batch_data.x.size(0)
+        if (i + 1) % 400 == 0:
+            print(f"epoch={epoch} loss={train_loss / (i + 1)}")
+
+    # Step with the gradients of the last incomplete accumulation, averaged over its actual number of batches.
+    # The losses were divided by accumulation_steps because the number of batches of a bucketed epoch is not
+    # known in advance, so the gradients are rescaled here
+    remainder = (i + 1) % accumulation_steps
+    if remainder != 0:
+        for parameter in model.parameters():
+            if parameter.grad is not None:
+                parameter.grad.mul_(accumulation_steps / remainder)
+        optimizer.step()
+        optimizer.zero_grad()
+    elapsed = time.perf_counter() - start
+
+    return train_loss / (i + 1), num_graphs / elapsed, num_nodes / elapsed
+
+
+def evaluate(model, dataloader, device):
+    """
+    Evaluate the model on a dataset in one pass, accumulating the metrics batch by batch on the device.
+
+    Args:
+        model (torch.nn.Module): The model to evaluate.
+        dataloader (InMemoryBatchLoader): The dataloader for the dataset.
+        device (torch.device): The device to run the evaluation on.
+
+    Returns:
+        dict: The metrics computed by StreamingMetrics.
+    """
+    model.eval()
+    metrics = None
+    with torch.no_grad():
+        for batch_data in dataloader:
+            batch_data = batch_data.to(device, non_blocking=True)
+            output = model(batch_data.x, batch_data.types, batch_data.edge_types, batch_data.edge_in_out_indexs,
+                           batch_data.edge_in_out_head_tail, batch_data.batch, batch_data.get("edge_in_out_node_order"))
+            if metrics is None:
+                metrics = StreamingMetrics(output.size(-1), device=output.device)
+            metrics.update(output, batch_data.labels)
+    return metrics.compute()
+
+
+def valid(model, dataloader, device):
+    """
+    Validate the model on the validation or test dataset.
+
+    Args:
+        model (torch.nn.Module): The model to validate.
+        dataloader (InMemoryBatchLoader): The dataloader for the validation or test dataset.
+        device (torch.device): The device to run the validation on.
+
+    Returns:
+        tuple: A tuple containing the average loss and accuracy.
+    """
+    metrics = evaluate(model, dataloader, device)
+    return metrics["loss"], metrics["top1"]
+
+
+def available_cores():
+    """
+    Return the ids of the CPU cores the process may run on.
+    """
+    return sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+
+
+def split_cores(num_parts: int):
+    """
+    Split the CPU cores available to the process into disjoint parts of nearly equal size.
+
+    Args:
+        num_parts (int): Number of parts, not greater than the number of cores.
+
+    Returns:
+        list: Lists of the core ids of the parts.
+    """
+    cores = available_cores()
+    size, rest = divmod(len(cores), num_parts)
+    parts, start = [], 0
+    for i in range(num_parts):
+        end = start + size + (1 if i < rest else 0)
+        parts.append(cores[start:end])
+        start = end
+    return parts
+
+
+def run_training(config: dict, cores: list):
+    """
+    Train a model in a process restricted to the given CPU cores.
+
+    The process is pinned to the cores where the platform supports it, and its thread pools (PyTorch threads and
+    the workers processing the source files) are sized to them, so concurrent trainings do not compete for cores.
+
+    Args:
+        config (dict): The training config.
+        cores (list): Ids of the CPU cores of the process.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(config["num_threads"] or len(cores))
+    if config["process_workers"] is None:
+        config = {**config, "process_workers": len(cores)}
+    train(config)
+
+
+def train_concurrently(configs: list):
+    """
+    Train the models of several configs at the same time, each in its own process with its own share of the CPU cores.
+
+    The full training then takes about as long as the slowest model instead of the sum of all of them. With fewer
+    cores than configs the processes would only compete for the cores, so the models are trained one after another.
+
+    Args:
+        configs (list): The training configs.
+
+    Raises:
+        RuntimeError: If any of the trainings failed.
+    """
+    if len(available_cores()) < len(configs):
+        print(Fore.YELLOW + f"Only {len(available_cores())} CPU cores available, training the models one after another." + Style.RESET_ALL)
+        for config in configs:
+            train(config)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for config, cores in zip(configs, split_cores(len(configs))):
+        process = context.Process(target=run_training, args=(config, cores), name=f"train-{config['language']}")
+        process.start()
+        processes.append((config["language"], process))
+
+    failed = []
+    for language, process in processes:
+        process.join()
+        if process.exitcode != 0:
+            failed.append(language)
+    if failed:
+        raise RuntimeError(f"Training failed for: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="Train", description="Train the HDHGN models described by config files.")
+
+    # Adding optional arguments
+    parser.add_argument("-c", "--configs", help="Paths to the config files", type=str, nargs="+", default=DEFAULT_CONFIGS)
+    parser.add_argument("-r", "--resume", help="Whether to resume the trainings from their newest checkpoints", type=bool, action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument("-s", "--sequential", help="Whether to train the models one after another in this process instead of concurrently", type=bool, action=argparse.BooleanOptionalAction, default=False)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    configs = [load_config(config_path) for config_path in args.configs]
+    if args.resume:
+        configs = [{**config, "resume": True} for config in configs]
+    if args.sequential or len(configs) == 1:
+        for config in configs:
+            train(config)
+    else:
+        train_concurrently(configs)
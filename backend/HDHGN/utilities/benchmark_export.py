@@ -0,0 +1,133 @@
+import sys
+import os
+import time
+import argparse
+import torch
+from colorama import Fore, Style
+from torch_geometric.data import Batch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from MyDataset import encode_tree, parse_python_file, parse_c_source_file
+from registry import LANGUAGES, BACKENDS, load_model
+from vocab import Vocab
+
+# Backends whose outputs are expected to differ from the eager model, their accuracy is checked by evaluate_quantization.py
+LOSSY_BACKENDS = ("int8",)
+
+
+def load_samples(language: str, directory: str, vocab: Vocab):
+    """
+    Parse and encode the source files of the directory.
+
+    Returns:
+        list: Encoded data objects of the files that could be parsed.
+    """
+    parse = parse_python_file if language == "Python" else parse_c_source_file
+    samples = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.startswith("_"):
+            continue
+        try:
+            samples.append(encode_tree(vocab, parse(os.path.join(directory, file_name))))
+        except Exception as e:
+            print(Fore.YELLOW + f"Skipping {file_name}: {type(e).__name__}: {e}" + Style.RESET_ALL)
+    return samples
+
+
+def run_model(model, data):
+    """
+    Run the model on a batch with the stable input signature.
+    """
+    return model(data.x, data.types, data.edge_types, data.edge_in_out_indexs, data.edge_in_out_head_tail, data.batch,
+                 data.edge_in_out_node_order)
+
+
+def time_model(model, batches: list, repeats: int):
+    """
+    Measure the average time of running the model on each of the batches.
+
+    Returns:
+        float: Average time per batch in milliseconds.
+    """
+    with torch.no_grad():
+        for data in batches:
+            run_model(model, data)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for data in batches:
+                run_model(model, data)
+    return (time.perf_counter() - start) / (repeats * len(batches)) * 1000
+
+
+def benchmark_export(language: str, model_path: str, export_paths: dict, directory: str, repeats: int):
+    """
+    Compare the eager and the exported models: outputs, load time and prediction latency.
+
+    Args:
+        language (str): Language of the model ("Python" or "C").
+        model_path (str): Path to the trained model.
+        export_paths (dict): Paths to the exported models by the backend ("torchscript", "onnx").
+        directory (str): Directory of the source files used for the comparison.
+        repeats (int): Number of timed passes over the files.
+
+    Returns:
+        bool: True if the outputs of all exported models, except the quantized ones, match the eager model.
+    """
+    vocab = Vocab.load(LANGUAGES[language]["vocab_path"])
+    samples = load_samples(language, directory, vocab)
+    singles = [Batch.from_data_list([sample]) for sample in samples]
+    batch = Batch.from_data_list(samples)
+    device = torch.device("cpu")
+
+    models, load_times = {}, {}
+    for backend, path in [("eager", model_path)] + list(export_paths.items()):
+        start = time.perf_counter()
+        models[backend] = load_model(path, device)
+        load_times[backend] = (time.perf_counter() - start) * 1000
+
+    print(f"{language}: {len(samples)} files, {batch.x.size(0)} nodes, CPU threads: {torch.get_num_threads()}")
+    with torch.no_grad():
+        outputs = {backend: run_model(model, batch) for backend, model in models.items()}
+    matches = True
+    for backend in export_paths:
+        difference = (outputs["eager"] - outputs[backend]).abs().max().item()
+        agreement = (outputs["eager"].argmax(-1) == outputs[backend].argmax(-1)).float().mean().item()
+        print(f"{backend}: max absolute difference of the outputs: {difference:.3e}, top-1 agreement: {agreement * 100:.1f}%")
+        if backend in LOSSY_BACKENDS:
+            continue
+        if difference > 1e-4 * max(1.0, outputs["eager"].abs().max().item()) or agreement < 1.0:
+            print(Fore.RED + f"The outputs of the {backend} model differ from the eager model." + Style.RESET_ALL)
+            matches = False
+
+    header = f"{'':<28}" + "".join(f" {backend:>12}" for backend in models)
+    print(header)
+    print(f"{'load ms':<28}" + "".join(f" {load_times[backend]:>12.2f}" for backend in models))
+    for name, batches in (("single file latency ms", singles), (f"batch of {len(samples)} files ms", [batch])):
+        times = {backend: time_model(model, batches, repeats) for backend, model in models.items()}
+        print(f"{name:<28}" + "".join(f" {times[backend]:>12.2f}" for backend in models))
+        print(f"{'  speedup':<28}" + "".join(f" {times['eager'] / times[backend]:>11.2f}x" for backend in models))
+        print(f"{'  files / s':<28}" + "".join(f" {batches[0].num_graphs * 1000 / times[backend]:>12.1f}" for backend in models))
+    return matches
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="BenchmarkExport", description="Compare the eager and the exported HDHGN models.")
+
+    # Adding optional arguments
+    parser.add_argument("-l", "--language", help="Language of the model", type=str, choices=list(LANGUAGES), default="Python")
+    parser.add_argument("-b", "--backends", help="Backends of the exported models to compare", type=str, nargs="+", choices=[backend for backend in BACKENDS if backend != "eager"], default=["torchscript", "onnx"])
+    parser.add_argument("-mp", "--model_path", help="Path to the trained model. Defaults to the path for the language", type=str, default="")
+    parser.add_argument("-ep", "--export_paths", help="Paths to the exported models in the order of the backends. Default to the paths for the language", type=str, nargs="+", default=[])
+    parser.add_argument("-d", "--directory", help="Directory of the source files. Defaults to the sample files of the language", type=str, default="")
+    parser.add_argument("-r", "--repeats", help="Number of timed passes over the files", type=int, default=5)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    model_path = args.model_path or LANGUAGES[args.language]["model_path"]
+    export_paths = {backend: LANGUAGES[args.language][BACKENDS[backend]] for backend in args.backends}
+    export_paths.update(zip(args.backends, args.export_paths))
+    directory = args.directory or ("data/txt_python_files" if args.language == "Python" else "data/txt_c_files")
+    sys.exit(0 if benchmark_export(args.language, model_path, export_paths, directory, args.repeats) else 1)
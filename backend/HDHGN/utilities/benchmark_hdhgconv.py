@@ -0,0 +1,94 @@
+import sys
+import os
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.layers import HDHGConv, sort_incidences, build_incidence
+from utilities.check_hdhgconv import random_hypergraph
+
+
+def time_layer(layer: HDHGConv, inputs: tuple, repeats: int, backward: bool):
+    """
+    Measure the average time of a forward (and backward) pass of the layer.
+
+    Returns:
+        float: Average time in milliseconds.
+    """
+    def step():
+        if backward:
+            layer.zero_grad()
+            layer(*inputs).sum().backward()
+        else:
+            with torch.no_grad():
+                layer(*inputs)
+        if inputs[0].is_cuda:
+            torch.cuda.synchronize()
+
+    step()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        step()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def benchmark_hdhgconv(sizes: list, num_graphs: int, dim_size: int, num_heads: int, repeats: int, device: torch.device,
+                       threads: int = None):
+    """
+    Compare the speed of the reference and the fused HDHGConv on large AST-like hypergraphs.
+
+    The fused layer gets the node-edges presorted with the CSR incidence structure, like in the HDHGN model,
+    which builds the structure once for all layers.
+
+    Args:
+        sizes (list): Numbers of nodes of the benchmarked graphs.
+        num_graphs (int): Number of graphs in a batch.
+        dim_size (int): Dimension size of the layer.
+        num_heads (int): Number of edge and node heads.
+        repeats (int): Number of timed passes.
+        device (torch.device): Device to run the benchmark on.
+        threads (int): Number of CPU threads used by PyTorch. Defaults to the PyTorch setting.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    print(f"Device: {device}, CPU threads: {torch.get_num_threads()}")
+    torch.manual_seed(0)
+    layer = HDHGConv(dim_size, num_heads, num_heads).to(device)
+    print(f"{'nodes':>10} {'node-edges':>12} {'pass':>18} {'reference ms':>14} {'fused ms':>10} {'speedup':>8}")
+    for num_nodes in sizes:
+        edge_in_out_indexs, edge_in_out_head_tail, batch, num_edges = random_hypergraph(num_nodes, num_graphs, seed=num_nodes)
+        x, edge_attr = torch.randn(num_nodes * num_graphs, dim_size, device=device), torch.randn(num_edges, dim_size, device=device)
+        inputs = (x, edge_attr, edge_in_out_indexs.to(device), edge_in_out_head_tail.to(device), batch.to(device))
+        sorted_indexs, sorted_head_tail, node_order = sort_incidences(inputs[2], inputs[3])
+        incidence = build_incidence(sorted_indexs, sorted_head_tail, num_edges, x.size(0), node_order)
+        fused_inputs = (x, edge_attr, sorted_indexs, sorted_head_tail, inputs[4], incidence)
+        for backward in (False, True):
+            times = []
+            for fused in (False, True):
+                layer.fused = fused
+                times.append(time_layer(layer, fused_inputs if fused else inputs, repeats, backward))
+            name = "forward+backward" if backward else "forward"
+            print(f"{num_nodes * num_graphs:>10} {edge_in_out_indexs.size(1):>12} {name:>18} {times[0]:>14.2f} {times[1]:>10.2f} {times[0] / times[1]:>7.2f}x")
+    layer.fused = True
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="BenchmarkHDHGConv", description="Compare the speed of the reference and the fused HDHGConv.")
+
+    # Adding optional arguments
+    parser.add_argument("-s", "--sizes", help="Numbers of nodes of the benchmarked graphs", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("-g", "--num_graphs", help="Number of graphs in a batch", type=int, default=4)
+    parser.add_argument("-d", "--dim_size", help="Dimension size of the layer", type=int, default=128)
+    parser.add_argument("-hd", "--num_heads", help="Number of edge and node heads", type=int, default=8)
+    parser.add_argument("-r", "--repeats", help="Number of timed passes", type=int, default=10)
+    parser.add_argument("-t", "--threads", help="Number of CPU threads used by PyTorch", type=int, default=None)
+    parser.add_argument("--cpu", help="Run on the CPU even if CUDA is available", action="store_true")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    device = torch.device("cuda:0" if torch.cuda.is_available() and not args.cpu else "cpu")
+    benchmark_hdhgconv(args.sizes, args.num_graphs, args.dim_size, args.num_heads, args.repeats, device, args.threads)
@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from trains.train import DEFAULT_CONFIGS, load_config, load_datasets, get_device, make_loader, build_model
+
+
+def time_epoch(model, dataloader, optimizer, loss_function, device: torch.device):
+    """
+    Train the model for one epoch and split the time between waiting for the batches and computing on them.
+
+    Returns:
+        tuple: Time of loading and time of computing in seconds and the number of graphs.
+    """
+    model.train()
+    load_time, compute_time, num_graphs = 0.0, 0.0, 0
+    iterator = iter(dataloader)
+    while True:
+        start = time.perf_counter()
+        batch_data = next(iterator, None)
+        load_time += time.perf_counter() - start
+        if batch_data is None:
+            break
+
+        start = time.perf_counter()
+        batch_data = batch_data.to(device, non_blocking=True)
+        optimizer.zero_grad()
+        output = model(batch_data.x, batch_data.types, batch_data.edge_types, batch_data.edge_in_out_indexs,
+                       batch_data.edge_in_out_head_tail, batch_data.batch, batch_data.get("edge_in_out_node_order"))
+        loss_function(output, batch_data.labels).backward()
+        optimizer.step()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        compute_time += time.perf_counter() - start
+        num_graphs += batch_data.num_graphs
+    return load_time, compute_time, num_graphs
+
+
+def benchmark_loading(config: dict, workers: list, epochs: int):
+    """
+    Compare the training epochs with different numbers of loader workers.
+
+    For every number of workers one untimed epoch starts the workers and warms up the model, then the time of
+    the following epochs is split into waiting for the next batch (loading) and the forward, backward and
+    optimizer step (computing).
+
+    Args:
+        config (dict): The training config, its train split and loading options are used.
+        workers (list): Numbers of loader workers to compare.
+        epochs (int): Number of timed epochs for every number of workers.
+    """
+    torch.manual_seed(0)
+    vocab, dataset, _, _ = load_datasets(config)
+    device = get_device(config)
+    loss_function = torch.nn.CrossEntropyLoss()
+    print(f"{config['language']}: {len(dataset)} graphs, batch size: {config['batch_size']}, device: {device}, "
+          f"CPU threads: {torch.get_num_threads()}, prefetch factor: {config['prefetch_factor']}")
+    print(f"{'workers':>8} {'load s':>10} {'compute s':>10} {'epoch s':>10} {'load %':>8} {'graphs / s':>11}")
+    for num_workers in workers:
+        dataloader = make_loader({**config, "loader_workers": num_workers}, dataset, config["batch_size"], True, device,
+                                 config["max_nodes"], config["max_node_edges"])
+        model = build_model(config, vocab).to(device)
+        optimizer = torch.optim.Adam(model.parameters(), lr=config["lr"])
+        time_epoch(model, dataloader, optimizer, loss_function, device)
+
+        load_time, compute_time, num_graphs = 0.0, 0.0, 0
+        for _ in range(epochs):
+            epoch_load, epoch_compute, epoch_graphs = time_epoch(model, dataloader, optimizer, loss_function, device)
+            load_time, compute_time, num_graphs = load_time + epoch_load, compute_time + epoch_compute, num_graphs + epoch_graphs
+        load_time, compute_time, num_graphs = load_time / epochs, compute_time / epochs, num_graphs / epochs
+        total = load_time + compute_time
+        print(f"{num_workers:>8} {load_time:>10.3f} {compute_time:>10.3f} {total:>10.3f} {load_time / total * 100:>7.1f}% {num_graphs / total:>11.1f}")
+        del dataloader
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="BenchmarkLoading", description="Split the time of the training epochs between data loading and computing.")
+
+    # Adding optional arguments
+    parser.add_argument("-c", "--config", help="Path to the training config", type=str, default=DEFAULT_CONFIGS[0])
+    parser.add_argument("-w", "--workers", help="Numbers of loader workers to compare", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("-e", "--epochs", help="Number of timed epochs for every number of workers", type=int, default=2)
+    parser.add_argument("-pf", "--prefetch_factor", help="Number of batches prefetched by each worker. Defaults to the config", type=int, default=None)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.prefetch_factor is not None:
+        config["prefetch_factor"] = args.prefetch_factor
+    benchmark_loading(config, args.workers, args.epochs)
@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import argparse
+from colorama import Fore, Style
+from pycparser import preprocess_file
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utilities.preprocessor import Preprocessor, parse_c_file, FAKE_LIBC_PATH
+
+
+def find_c_files(directory: str):
+    """
+    Find all C files in the directory and its subdirectories.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths to the C files.
+    """
+    files_paths = []
+    for root, dir, files in os.walk(directory):
+        for file_name in files:
+            if file_name.endswith(".c"):
+                files_paths.append(os.path.join(root, file_name))
+    return sorted(files_paths)
+
+
+def benchmark_preprocessor(directory: str, backends: list):
+    """
+    Measure how many C files per second each preprocessor backend preprocesses and parses.
+
+    Args:
+        directory (str): Path to the directory containing the C files.
+        backends (list): Names of the backends to measure.
+    """
+    files_paths = find_c_files(directory)
+    if not files_paths:
+        print(Fore.RED + f"No C files found in '{directory}'." + Style.RESET_ALL)
+        return
+
+    print(Fore.GREEN + f"Benchmarking the C preprocessor on {len(files_paths)} files:" + Style.RESET_ALL)
+    for backend in backends:
+        start = time.perf_counter()
+        for file_path in files_paths:
+            if backend == "python":
+                Preprocessor([FAKE_LIBC_PATH]).preprocess_file(file_path)
+            else:
+                preprocess_file(file_path, cpp_path=backend, cpp_args=["-E", f"-I{FAKE_LIBC_PATH}", "-std=c99"])
+        elapsed = time.perf_counter() - start
+        print(f"{backend + ' (preprocess only)':<30} {len(files_paths) / elapsed:10.1f} files/sec")
+
+        start = time.perf_counter()
+        failed = 0
+        for file_path in files_paths:
+            try:
+                parse_c_file(file_path, backend)
+            except Exception:
+                failed += 1
+        elapsed = time.perf_counter() - start
+        print(f"{backend + ' (preprocess and parse)':<30} {len(files_paths) / elapsed:10.1f} files/sec" + (f"  ({failed} failed)" if failed else ""))
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="BenchmarkPreprocessor", description="Compare the C preprocessor backends.")
+
+    # Adding optional arguments
+    parser.add_argument("-d", "--directory", help="Path to the directory containing the C files", type=str, default="data/c_files")
+    parser.add_argument("-b", "--backends", help="Preprocessor backends to compare", type=str, nargs="+", default=["clang", "python"])
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    benchmark_preprocessor(args.directory, args.backends)
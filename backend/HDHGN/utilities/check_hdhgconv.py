@@ -0,0 +1,135 @@
+import sys
+import os
+import argparse
+import torch
+from colorama import Fore, Style
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.layers import HDHGConv, sort_incidences, build_incidence
+
+
+def random_hypergraph(num_nodes: int, num_graphs: int = 1, max_heads: int = 3, seed: int = 0):
+    """
+    Generate a batch of random AST-like hypergraphs.
+
+    Every node except the roots has a parent. The children of a node are split into hyperedges with the parent
+    as the tail and up to max_heads children as the heads, and the node-edges are shuffled like in the walk output.
+
+    Args:
+        num_nodes (int): Number of nodes of each graph.
+        num_graphs (int): Number of graphs in the batch.
+        max_heads (int): Maximum number of heads of a hyperedge.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        torch.Tensor: Edge in-out indices [2, num_nodeedges].
+        torch.Tensor: Edge head-tail indices [num_nodeedges].
+        torch.Tensor: Batch indices [num_nodes * num_graphs].
+        int: Number of edges.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    edges, nodes, head_tail = [], [], []
+    num_edges = 0
+    for g in range(num_graphs):
+        # Parent of every node except the root, and the children sorted by their parent
+        children = torch.arange(1, num_nodes)
+        parents = (torch.rand(num_nodes - 1, generator=generator) * children).long()
+        parents, order = torch.sort(parents, stable=True)
+        children = children[order]
+
+        # Split the children of each parent into hyperedges of up to max_heads heads
+        first = torch.searchsorted(parents, parents)
+        chunk = (torch.arange(num_nodes - 1) - first) // max_heads
+        key = parents * num_nodes + chunk
+        key, graph_edges = torch.unique_consecutive(key, return_inverse=True)
+        tails = key // num_nodes
+        num_graph_edges = len(tails)
+
+        offset = g * num_nodes
+        edges += [torch.arange(num_graph_edges) + num_edges, graph_edges + num_edges]
+        nodes += [tails + offset, children + offset]
+        head_tail += [torch.zeros(num_graph_edges, dtype=torch.long), torch.ones(num_nodes - 1, dtype=torch.long)]
+        num_edges += num_graph_edges
+
+    edges, nodes, head_tail = torch.cat(edges), torch.cat(nodes), torch.cat(head_tail)
+    permutation = torch.randperm(len(edges), generator=generator)
+    edge_in_out_indexs = torch.stack([edges, nodes])[:, permutation]
+    edge_in_out_head_tail = head_tail[permutation]
+    batch = torch.arange(num_graphs).repeat_interleave(num_nodes)
+    return edge_in_out_indexs, edge_in_out_head_tail, batch, num_edges
+
+
+def run_layer(layer: HDHGConv, fused: bool, inputs: tuple, incidence=None):
+    """
+    Run the layer forward and backward with the given implementation.
+
+    Returns:
+        list: The output followed by the gradients of the inputs and the parameters.
+    """
+    x, edge_attr, edge_in_out_indexs, edge_in_out_head_tail, batch = inputs
+    x = x.clone().requires_grad_()
+    edge_attr = edge_attr.clone().requires_grad_()
+    layer.zero_grad()
+    layer.fused = fused
+    out = layer(x, edge_attr, edge_in_out_indexs, edge_in_out_head_tail, batch, incidence)
+    (out * torch.linspace(-1, 1, out.numel()).reshape(out.shape)).sum().backward()
+    return [out.detach(), x.grad, edge_attr.grad] + [p.grad.clone() for p in layer.parameters()]
+
+
+def check_hdhgconv(sizes: list, num_graphs: int, dim_size: int, num_heads: int, tolerance: float):
+    """
+    Check that the fused HDHGConv gives the same outputs and gradients as the reference implementation.
+
+    The fused implementation is checked both on the shuffled node-edges, which it sorts itself, and on the
+    node-edges presorted by sort_incidences like in the dataset.
+
+    Args:
+        sizes (list): Numbers of nodes of the checked graphs.
+        num_graphs (int): Number of graphs in a batch.
+        dim_size (int): Dimension size of the layer.
+        num_heads (int): Number of edge and node heads.
+        tolerance (float): Maximum allowed difference, relative to the reference values larger than 1.
+
+    Returns:
+        bool: True if all outputs and gradients match.
+    """
+    torch.manual_seed(0)
+    layer = HDHGConv(dim_size, num_heads, num_heads).double()
+    passed = True
+    for num_nodes in sizes:
+        edge_in_out_indexs, edge_in_out_head_tail, batch, num_edges = random_hypergraph(num_nodes, num_graphs, seed=num_nodes)
+        inputs = (torch.randn(num_nodes * num_graphs, dim_size, dtype=torch.double),
+                  torch.randn(num_edges, dim_size, dtype=torch.double), edge_in_out_indexs, edge_in_out_head_tail, batch)
+        reference = run_layer(layer, False, inputs)
+        fused = run_layer(layer, True, inputs)
+        sorted_indexs, sorted_head_tail, node_order = sort_incidences(edge_in_out_indexs, edge_in_out_head_tail)
+        incidence = build_incidence(sorted_indexs, sorted_head_tail, num_edges, num_nodes * num_graphs, node_order)
+        presorted = run_layer(layer, True, inputs[:2] + (sorted_indexs, sorted_head_tail, batch), incidence)
+        difference = max(((a - b).abs().max() / b.abs().max().clamp_min(1)).item()
+                         for a, b in zip(fused + presorted, reference + reference))
+        if difference > tolerance:
+            print(Fore.RED + f"Different outputs for {num_graphs} graphs of {num_nodes} nodes: " + Style.RESET_ALL + f"relative difference {difference:.3e}")
+            passed = False
+        else:
+            print(f"{num_graphs} graphs of {num_nodes} nodes: relative difference {difference:.3e}")
+    if passed:
+        print(Fore.GREEN + "The fused HDHGConv matches the reference implementation." + Style.RESET_ALL)
+    return passed
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="CheckHDHGConv", description="Check that the fused HDHGConv matches the reference implementation.")
+
+    # Adding optional arguments
+    parser.add_argument("-s", "--sizes", help="Numbers of nodes of the checked graphs", type=int, nargs="+", default=[2, 10, 100, 1000])
+    parser.add_argument("-g", "--num_graphs", help="Number of graphs in a batch", type=int, default=4)
+    parser.add_argument("-d", "--dim_size", help="Dimension size of the layer", type=int, default=128)
+    parser.add_argument("-hd", "--num_heads", help="Number of edge and node heads", type=int, default=8)
+    parser.add_argument("-t", "--tolerance", help="Maximum allowed difference, relative to the reference values larger than 1", type=float, default=1e-10)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    sys.exit(0 if check_hdhgconv(args.sizes, args.num_graphs, args.dim_size, args.num_heads, args.tolerance) else 1)
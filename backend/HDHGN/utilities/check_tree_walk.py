@@ -0,0 +1,76 @@
+import sys
+import os
+import argparse
+import ast
+from colorama import Fore, Style
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utilities.utils import pre_walk_tree, pre_walk_tree_c, pre_walk_tree_recursive, pre_walk_tree_c_recursive
+from utilities.preprocessor import parse_c_file
+
+
+def same_walk(walk1: tuple, walk2: tuple):
+    """
+    Check whether two outputs of the AST walk are identical.
+
+    Args:
+        walk1 (tuple): Output of the first walk.
+        walk2 (tuple): Output of the second walk.
+
+    Returns:
+        bool: True if the outputs are identical.
+    """
+    return [a if isinstance(a, int) else list(a) for a in walk1] == [b if isinstance(b, int) else list(b) for b in walk2]
+
+
+def check_tree_walk(directory_python: str, directory_c: str):
+    """
+    Check that the iterative AST walk produces the same output as the recursive one for all source files.
+
+    Args:
+        directory_python (str): Path to the directory containing the Python files.
+        directory_c (str): Path to the directory containing the C files.
+
+    Returns:
+        bool: True if the outputs are identical for all files.
+    """
+    failed = []
+    checked = 0
+
+    for file_name in sorted(os.listdir(directory_python)):
+        if file_name.endswith((".py", ".txt")):
+            file_path = os.path.join(directory_python, file_name)
+            with open(file_path, encoding="utf-8") as file:
+                root = ast.parse(file.read())
+            if not same_walk(pre_walk_tree(root, 0, 0), pre_walk_tree_recursive(root, 0, 0)):
+                failed.append(file_path)
+            checked += 1
+
+    for file_name in sorted(os.listdir(directory_c)):
+        if file_name.endswith((".c", ".txt")):
+            file_path = os.path.join(directory_c, file_name)
+            root = parse_c_file(file_path)
+            if not same_walk(pre_walk_tree_c(root, 0, 0), pre_walk_tree_c_recursive(root, 0, 0)):
+                failed.append(file_path)
+            checked += 1
+
+    for file_path in failed:
+        print(Fore.RED + "Different output of the AST walk for file: " + Style.RESET_ALL + file_path)
+    if not failed:
+        print(Fore.GREEN + f"The AST walk output is identical for all {checked} files." + Style.RESET_ALL)
+    return not failed
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="CheckTreeWalk", description="Check that the iterative AST walk matches the recursive one.")
+
+    # Adding optional arguments
+    parser.add_argument("-dp", "--directory_python", help="Path to the directory containing the Python files", type=str, default="data/txt_python_files")
+    parser.add_argument("-dc", "--directory_c", help="Path to the directory containing the C files", type=str, default="data/txt_c_files")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    sys.exit(0 if check_tree_walk(args.directory_python, args.directory_c) else 1)
@@ -0,0 +1,87 @@
+import os
+import re
+
+
+# File extensions of the supported languages
+EXTENSIONS = {
+    ".py": "Python",
+    ".pyw": "Python",
+    ".c": "C",
+    ".h": "C",
+}
+
+# Lexical signals of the supported languages, each matching at the start of a line
+PYTHON_SIGNALS = [
+    re.compile(r"^\s*def\s+\w+\s*\(.*\)\s*(->.*)?:\s*(#.*)?$", re.MULTILINE),
+    re.compile(r"^\s*class\s+\w+\s*(\(.*\))?\s*:\s*(#.*)?$", re.MULTILINE),
+    re.compile(r"^\s*(import\s+\w+|from\s+[\w.]+\s+import\s+)", re.MULTILINE),
+    re.compile(r"^\s*(elif\s+.*|else|try|except.*|finally)\s*:\s*(#.*)?$", re.MULTILINE),
+    re.compile(r"^\s*(for\s+.+\s+in\s+.+|while\s+.+|if\s+.+)\s*:\s*(#.*)?$", re.MULTILINE),
+]
+C_SIGNALS = [
+    re.compile(r"^\s*#\s*(include|define|ifn?def|endif|pragma)\b", re.MULTILINE),
+    re.compile(r"^\s*((unsigned|signed|static|const|struct)\s+)*(void|int|char|long|short|float|double|struct\s+\w+)\s*\**\s*\w+\s*\(", re.MULTILINE),
+    re.compile(r";\s*(//.*|/\*.*)?$", re.MULTILINE),
+    re.compile(r"^\s*}\s*$", re.MULTILINE),
+    re.compile(r"/\*"),
+]
+
+
+def lexical_scores(code: str):
+    """
+    Count how many of the lexical signals of each language occur in the code.
+
+    Args:
+        code (str): The source code.
+
+    Returns:
+        int: The number of matched Python signals.
+        int: The number of matched C signals.
+    """
+    python_score = sum(1 for signal in PYTHON_SIGNALS if signal.search(code))
+    c_score = sum(1 for signal in C_SIGNALS if signal.search(code))
+    return python_score, c_score
+
+
+def detect_language(file_path: str, code: str = None):
+    """
+    Cheaply detect the language of a source file before parsing it.
+
+    The file extension and a shebang line are checked first and confirmed by the lexical signals of the code.
+    Without them the language is detected from the lexical signals alone.
+
+    Args:
+        file_path (str): Path or name of the source file.
+        code (str): The source code, None if it could not be read as text.
+
+    Returns:
+        str: The detected language (Python or C), None if the detector is unsure.
+        str: The reason of the decision.
+    """
+    extension = os.path.splitext(file_path.strip())[1].lower()
+    language = EXTENSIONS.get(extension)
+    reason = "extension " + extension
+    if language is None and code is not None and code.startswith("#!") and "python" in code.split("\n", 1)[0]:
+        language = "Python"
+        reason = "shebang"
+
+    if code is None:
+        return language, reason
+
+    python_score, c_score = lexical_scores(code)
+
+    # The extension or shebang is trusted unless the code clearly looks like the other language
+    if language == "Python" and not c_score > python_score + 1:
+        return language, reason
+    if language == "C" and not python_score > c_score + 1:
+        return language, reason
+
+    if python_score >= 2 and c_score == 0:
+        return "Python", "lexical signals"
+    if c_score >= 2 and python_score == 0:
+        return "C", "lexical signals"
+    if python_score >= 2 * c_score + 2:
+        return "Python", "lexical signals"
+    if c_score >= 2 * python_score + 2:
+        return "C", "lexical signals"
+    return None, "unsure"
@@ -0,0 +1,58 @@
+import sys
+import os
+import argparse
+import torch
+from colorama import Fore, Style
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from trains.train import DEFAULT_CONFIGS, load_config, load_datasets, get_device, make_loader, evaluate
+from trains.metrics import format_report
+from registry import load_model
+
+
+def evaluate_model(config: dict, model_path: str, split: str):
+    """
+    Evaluate a trained model on a split of the dataset of a config and print the report.
+
+    Args:
+        config (dict): The training config, its datasets and validation batching are used.
+        model_path (str): Path to the model, any format loaded by the registry.
+        split (str): The evaluated split ("train", "valid" or "test").
+
+    Returns:
+        dict: The metrics computed by StreamingMetrics.
+    """
+    vocab, *datasets = load_datasets(config)
+    dataset = datasets[("train", "valid", "test").index(split)]
+    device = get_device(config)
+    model = load_model(model_path, device)
+    dataloader = make_loader(config, dataset, config["valid_batch_size"], False, device, config["valid_max_nodes"],
+                             config["valid_max_node_edges"])
+    metrics = evaluate(model, dataloader, device)
+
+    print(f"{config['language']} {split} split, model: {model_path}")
+    print(format_report(metrics, [vocab.vocab["labels"].id2word[i] for i in range(len(vocab.vocab["labels"].id2word))]))
+    return metrics
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="EvaluateModel", description="Evaluate a trained HDHGN model on a split of its dataset.")
+
+    # Adding optional arguments
+    parser.add_argument("-c", "--config", help="Path to the training config", type=str, default=DEFAULT_CONFIGS[0])
+    parser.add_argument("-mp", "--model_path", help="Path to the model. Defaults to the model trained with the config", type=str, default="")
+    parser.add_argument("-s", "--split", help="The evaluated split", type=str, choices=["train", "valid", "test"], default="test")
+    parser.add_argument("-ma", "--min_accuracy", help="Minimum top-1 accuracy in percent, the script fails below it", type=float, default=None)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    model_path = args.model_path or os.path.join(config["result_dir"], config["model_name"] + ".pt")
+    with torch.no_grad():
+        metrics = evaluate_model(config, model_path, args.split)
+    if args.min_accuracy is not None and metrics["top1"] * 100 < args.min_accuracy:
+        print(Fore.RED + f"Top-1 accuracy {metrics['top1'] * 100:.2f}% is below {args.min_accuracy:.2f}%." + Style.RESET_ALL)
+        sys.exit(1)
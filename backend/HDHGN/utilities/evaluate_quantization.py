@@ -0,0 +1,168 @@
+import sys
+import os
+import gc
+import contextlib
+import time
+import argparse
+import psutil
+import torch
+from colorama import Fore, Style
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from MyDataset import HDHGNInMemoryDataset, HDHGNInMemoryDataset_C, InMemoryBatchLoader
+from registry import BASE_DIR, LANGUAGES, load_model
+from vocab import Vocab
+
+# Test split of each language, as used by the training scripts
+TEST_SPLITS = {
+    "Python": (HDHGNInMemoryDataset, "data/test", "data/test_files_paths.txt"),
+    "C": (HDHGNInMemoryDataset_C, "data/test_c", "data/test_files_paths_c.txt"),
+}
+
+
+def run_model(model, data):
+    """
+    Run the model on a batch with the stable input signature.
+    """
+    return model(data.x, data.types, data.edge_types, data.edge_in_out_indexs, data.edge_in_out_head_tail, data.batch,
+                 data.get("edge_in_out_node_order"))
+
+
+def measure_load(model_path: str):
+    """
+    Load the model on the CPU and measure the time and the growth of the resident memory of the process.
+
+    Returns:
+        tuple: The model, load time in milliseconds and resident memory growth in MB.
+    """
+    process = psutil.Process()
+    gc.collect()
+    memory = process.memory_info().rss
+    start = time.perf_counter()
+    model = load_model(model_path, torch.device("cpu"))
+    load_time = (time.perf_counter() - start) * 1000
+    return model, load_time, (process.memory_info().rss - memory) / 2 ** 20
+
+
+def evaluate(model, dataloader: InMemoryBatchLoader, latency_samples: int):
+    """
+    Evaluate the model on the dataset and measure its latency.
+
+    Args:
+        model: The model to evaluate.
+        dataloader (InMemoryBatchLoader): Loader of the dataset, without shuffling.
+        latency_samples (int): Number of graphs whose single-graph latency is measured.
+
+    Returns:
+        dict: Outputs, top-1 and top-5 accuracy, time per batch and per graph in milliseconds and graphs per second.
+    """
+    outputs, labels, batch_times = [], [], []
+    with torch.no_grad():
+        for data in dataloader:
+            start = time.perf_counter()
+            outputs.append(run_model(model, data))
+            batch_times.append(time.perf_counter() - start)
+            labels.append(data.labels)
+
+        single_times = []
+        for i in range(min(latency_samples, len(dataloader.dataset))):
+            data = dataloader.collate(torch.tensor([i]))
+            start = time.perf_counter()
+            run_model(model, data)
+            single_times.append(time.perf_counter() - start)
+
+    outputs, labels = torch.cat(outputs), torch.cat(labels)
+    top5 = outputs.topk(min(5, outputs.size(-1)), dim=-1).indices
+    return {
+        "outputs": outputs,
+        "top1": (outputs.argmax(-1) == labels).float().mean().item(),
+        "top5": (top5 == labels.unsqueeze(-1)).any(-1).float().mean().item(),
+        "batch_ms": sum(batch_times) / len(batch_times) * 1000,
+        "graph_ms": sum(single_times) / max(len(single_times), 1) * 1000,
+        "graphs_per_s": labels.size(0) / sum(batch_times),
+    }
+
+
+def evaluate_quantization(language: str, model_path: str, quantized_path: str, root: str, paths_file_path: str,
+                          batch_size: int, latency_samples: int):
+    """
+    Compare the int8 model with the float32 model on the test split: accuracy, latency and memory.
+
+    Args:
+        language (str): Language of the model ("Python" or "C").
+        model_path (str): Path to the trained float32 model.
+        quantized_path (str): Path to the int8 model exported by ExportModel.py.
+        root (str): Root directory of the test dataset.
+        paths_file_path (str): Path to the file with the paths of the test files.
+        batch_size (int): Number of graphs per batch.
+        latency_samples (int): Number of graphs whose single-graph latency is measured.
+
+    Returns:
+        dict: Results of the models by name ("fp32", "int8").
+    """
+    dataset_class = TEST_SPLITS[language][0]
+    vocab = Vocab.load(LANGUAGES[language]["vocab_path"])
+    # The paths of the source files are relative to the directory of the training scripts
+    root, paths_file_path = os.path.abspath(root), os.path.abspath(paths_file_path)
+    with contextlib.chdir(os.path.join(BASE_DIR, "trains")):
+        dataset = dataset_class(root, paths_file_path, vocab)
+    dataloader = InMemoryBatchLoader(dataset, batch_size=batch_size, shuffle=False)
+
+    results = {}
+    for name, path in (("fp32", model_path), ("int8", quantized_path)):
+        model, load_time, memory = measure_load(path)
+        results[name] = evaluate(model, dataloader, latency_samples)
+        results[name].update(load_ms=load_time, memory_mb=memory, file_mb=os.path.getsize(path) / 2 ** 20)
+        del model
+
+    fp32, int8 = results["fp32"], results["int8"]
+    agreement = (fp32["outputs"].argmax(-1) == int8["outputs"].argmax(-1)).float().mean().item()
+    difference = (fp32["outputs"] - int8["outputs"]).abs().max().item()
+
+    print(f"{language} test split: {len(dataset)} files, batch size: {batch_size}, CPU threads: {torch.get_num_threads()}")
+    print(f"{'':<24} {'fp32':>10} {'int8':>10} {'delta':>10}")
+    rows = (
+        ("top-1 accuracy %", "top1", 100, ".2f"),
+        ("top-5 accuracy %", "top5", 100, ".2f"),
+        ("batch latency ms", "batch_ms", 1, ".2f"),
+        ("single graph latency ms", "graph_ms", 1, ".2f"),
+        ("graphs / s", "graphs_per_s", 1, ".1f"),
+        ("load ms", "load_ms", 1, ".1f"),
+        ("file size MB", "file_mb", 1, ".2f"),
+        ("memory on load MB", "memory_mb", 1, ".2f"),
+    )
+    for label, key, scale, spec in rows:
+        a, b = fp32[key] * scale, int8[key] * scale
+        print(f"{label:<24} {a:>10{spec}} {b:>10{spec}} {b - a:>+10{spec}}")
+    print(f"Top-1 agreement of the predictions: {agreement * 100:.2f}%, max absolute difference of the outputs: {difference:.3e}")
+
+    delta = (int8["top1"] - fp32["top1"]) * 100
+    color = Fore.GREEN if delta > -1.0 else Fore.RED
+    print(color + f"Top-1 accuracy delta of the int8 model: {delta:+.2f} percentage points" + Style.RESET_ALL)
+    return results
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="EvaluateQuantization", description="Compare the int8 and the float32 HDHGN model on the test split.")
+
+    # Adding optional arguments
+    parser.add_argument("-l", "--language", help="Language of the model", type=str, choices=list(LANGUAGES), default="Python")
+    parser.add_argument("-mp", "--model_path", help="Path to the float32 model. Defaults to the path for the language", type=str, default="")
+    parser.add_argument("-qp", "--quantized_path", help="Path to the int8 model. Defaults to the path for the language", type=str, default="")
+    parser.add_argument("-r", "--root", help="Root directory of the test dataset. Defaults to the test split of the language", type=str, default="")
+    parser.add_argument("-pf", "--paths_file", help="File with the paths of the test files. Defaults to the test split of the language", type=str, default="")
+    parser.add_argument("-bs", "--batch_size", help="Number of graphs per batch", type=int, default=256)
+    parser.add_argument("-ls", "--latency_samples", help="Number of graphs whose single-graph latency is measured", type=int, default=64)
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    _, root, paths_file = TEST_SPLITS[args.language]
+    evaluate_quantization(args.language,
+                          args.model_path or LANGUAGES[args.language]["model_path"],
+                          args.quantized_path or LANGUAGES[args.language]["int8_path"],
+                          args.root or os.path.join(BASE_DIR, root),
+                          args.paths_file or os.path.join(BASE_DIR, paths_file),
+                          args.batch_size, args.latency_samples)
@@ -0,0 +1,54 @@
+import sys
+import os
+import re
+import argparse
+from colorama import Fore, Style
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from MyDataset import HDHGNDataset, pack_samples
+
+
+def pack_dataset(processed_dir: str):
+    """
+    Convert a processed dataset directory from the per-sample layout into the packed layout.
+
+    The samples are packed in the order of their indices, leaving out the files listed in failed.json,
+    which is the order of the dataset in the per-sample layout.
+
+    Args:
+        processed_dir (str): Path to the processed directory of the dataset.
+
+    Returns:
+        int: Number of packed samples.
+    """
+    failed = HDHGNDataset.read_failed(processed_dir)
+    indices = []
+    for file_name in os.listdir(processed_dir):
+        match = re.fullmatch(r"processed_data_(\d+)\.pt", file_name)
+        if match and int(match.group(1)) not in failed:
+            indices.append(int(match.group(1)))
+    file_names = [f"processed_data_{i}.pt" for i in sorted(indices)]
+
+    pack_samples(processed_dir, file_names)
+    return len(file_names)
+
+
+if __name__ == "__main__":
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(prog="PackDataset", description="Convert processed datasets into the packed single-file layout.")
+
+    # Adding optional arguments
+    parser.add_argument("-d", "--directories", help="Paths to the processed directories of the datasets", type=str, nargs="+",
+                        default=["data/train/processed", "data/valid/processed", "data/test/processed",
+                                 "data/train_c/processed", "data/valid_c/processed", "data/test_c/processed"])
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            print(Fore.YELLOW + "Skipping missing directory: " + Style.RESET_ALL + directory)
+            continue
+        count = pack_dataset(directory)
+        print(Fore.GREEN + f"Packed {count} samples in: " + Style.RESET_ALL + directory)
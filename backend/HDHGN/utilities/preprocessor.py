@@ -0,0 +1,617 @@
+import os
+import re
+import tempfile
+import threading
+from pycparser import c_parser, parse_file
+
+
+FAKE_LIBC_PATH = os.path.join(os.path.dirname(__file__), "fake_libc_include")
+
+# Preprocessor backend used when none is given, can be set with the HDHGN_C_PREPROCESSOR environment variable
+DEFAULT_BACKEND = os.environ.get("HDHGN_C_PREPROCESSOR", "python")
+
+# Macros defined by a C99 compiler that the source files may check
+PREDEFINED_MACROS = {
+    "__STDC__": "1",
+    "__STDC_VERSION__": "199901L",
+    "__STDC_HOSTED__": "1",
+}
+
+TOKEN_PATTERN = re.compile(r'''
+      (?P<string>L?"(?:\\.|[^"\\\n])*")
+    | (?P<char>L?'(?:\\.|[^'\\\n])*')
+    | (?P<ident>[A-Za-z_]\w*)
+    | (?P<number>\.?\d(?:[eEpP][+-]|[\w.])*)
+    | (?P<space>[ \t\r\f\v]+)
+    | (?P<newline>\n)
+    | (?P<punct>\#\#|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=|\.\.\.|.)
+''', re.VERBOSE | re.DOTALL)
+
+COMMENT_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*.*?\*/|//[^\n]*', re.DOTALL)
+
+DIRECTIVE_PATTERN = re.compile(r"^\s*#\s*(\w*)\s*(.*?)\s*$")
+
+INCLUDE_PATTERN = re.compile(r'^[<"](.+?)[>"]')
+
+# Cache of the header contents without comments, shared by all files preprocessed in the process
+_source_cache = {}
+
+# The C parser of each thread, reused because building it is expensive
+_parsers = threading.local()
+
+
+class PreprocessorError(Exception):
+    """
+    Error raised when the C source file cannot be preprocessed.
+    """
+    pass
+
+
+# Binary operators of the #if expressions by precedence, from the lowest
+BINARY_PRECEDENCE = {
+    "||": 1, "&&": 2, "|": 3, "^": 4, "&": 5, "==": 6, "!=": 6, "<": 7, ">": 7, "<=": 7, ">=": 7,
+    "<<": 8, ">>": 8, "+": 9, "-": 9, "*": 10, "/": 10, "%": 10,
+}
+
+NUMBER_PATTERN = re.compile(r"(0[xX][0-9a-fA-F]+|0[0-7]*|[1-9]\d*)[uUlL]*")
+
+CHAR_ESCAPES = {"n": 10, "t": 9, "r": 13, "0": 0, "a": 7, "b": 8, "f": 12, "v": 11, "\\": 92, "'": 39, '"': 34, "?": 63}
+
+
+def wrap_int64(value: int):
+    """
+    Wrap an integer to the range of a signed 64-bit integer.
+    """
+    return (value + (1 << 63)) % (1 << 64) - (1 << 63)
+
+
+class ConstantExpression:
+    """
+    Evaluator of the integer constant expressions of the #if and #elif directives.
+
+    The expression is parsed by precedence climbing and evaluated with the C integer operators only, on values
+    wrapped to signed 64 bits. The right operands of &&, || and ?: are evaluated only when needed, like in C,
+    so e.g. a division by zero in a skipped operand is not an error.
+    """
+    def __init__(self, tokens: list):
+        """
+        Initialize the evaluator.
+
+        Args:
+            tokens (list): Tokens of the expression without whitespace, after the macro expansion.
+        """
+        self.tokens = tokens
+        self.position = 0
+
+    def evaluate(self):
+        """
+        Evaluate the whole expression.
+
+        Returns:
+            int: The value of the expression.
+        """
+        tree = self.parse_conditional()
+        if self.position != len(self.tokens):
+            raise PreprocessorError(f"unexpected '{self.tokens[self.position]}'")
+        return self.compute(tree)
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected: str = None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise PreprocessorError(f"expected '{expected}'" if expected else "unexpected end of the expression")
+        self.position += 1
+        return token
+
+    def parse_conditional(self):
+        condition = self.parse_binary(1)
+        if self.peek() != "?":
+            return condition
+        self.take("?")
+        if_true = self.parse_conditional()
+        self.take(":")
+        return ("?:", condition, if_true, self.parse_conditional())
+
+    def parse_binary(self, min_precedence: int):
+        left = self.parse_unary()
+        while BINARY_PRECEDENCE.get(self.peek(), 0) >= min_precedence:
+            operator = self.take()
+            left = (operator, left, self.parse_binary(BINARY_PRECEDENCE[operator] + 1))
+        return left
+
+    def parse_unary(self):
+        token = self.take()
+        if token in ("+", "-", "~", "!"):
+            return ("unary" + token, self.parse_unary())
+        if token == "(":
+            value = self.parse_conditional()
+            self.take(")")
+            return value
+        if token[0].isalpha() or token[0] == "_":
+            # Identifiers left after the macro expansion are 0
+            return 0
+        if token[0] == "'":
+            return self.parse_char(token)
+        match = NUMBER_PATTERN.fullmatch(token)
+        if match is None:
+            raise PreprocessorError(f"unexpected '{token}'")
+        digits = match.group(1)
+        return wrap_int64(int(digits, 8 if re.fullmatch(r"0[0-7]+", digits) else 0))
+
+    @staticmethod
+    def parse_char(token: str):
+        body = token[1:-1]
+        if len(body) == 1:
+            return ord(body)
+        if len(body) == 2 and body[0] == "\\" and body[1] in CHAR_ESCAPES:
+            return CHAR_ESCAPES[body[1]]
+        raise PreprocessorError(f"unsupported character constant {token}")
+
+    def compute(self, node):
+        if isinstance(node, int):
+            return node
+        operator = node[0]
+        if operator == "?:":
+            return self.compute(node[2]) if self.compute(node[1]) else self.compute(node[3])
+        if operator.startswith("unary"):
+            value = self.compute(node[1])
+            return {"unary+": value, "unary-": wrap_int64(-value), "unary~": ~value, "unary!": int(not value)}[operator]
+        left = self.compute(node[1])
+        if operator == "&&":
+            return int(bool(left) and bool(self.compute(node[2])))
+        if operator == "||":
+            return int(bool(left) or bool(self.compute(node[2])))
+        right = self.compute(node[2])
+        if operator in ("/", "%"):
+            if right == 0:
+                raise PreprocessorError("division by zero")
+            quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+            return wrap_int64(quotient if operator == "/" else left - right * quotient)
+        if operator in ("<<", ">>"):
+            if not 0 <= right < 64:
+                raise PreprocessorError(f"shift count out of range: {right}")
+            return wrap_int64(left << right) if operator == "<<" else left >> right
+        return wrap_int64({
+            "+": lambda: left + right, "-": lambda: left - right, "*": lambda: left * right,
+            "&": lambda: left & right, "|": lambda: left | right, "^": lambda: left ^ right,
+            "==": lambda: int(left == right), "!=": lambda: int(left != right), "<": lambda: int(left < right),
+            ">": lambda: int(left > right), "<=": lambda: int(left <= right), ">=": lambda: int(left >= right),
+        }[operator]())
+
+
+class Macro:
+    """
+    A macro definition, object-like when params is None.
+    """
+    def __init__(self, name: str, params, body: list):
+        self.name = name
+        self.params = params
+        self.body = body
+
+
+def tokenize(text: str):
+    """
+    Split C code into preprocessing tokens, keeping the whitespace and newlines as tokens.
+
+    Args:
+        text (str): The code.
+
+    Returns:
+        list: The tokens.
+    """
+    return [match.group() for match in TOKEN_PATTERN.finditer(text)]
+
+
+def strip_comments(text: str):
+    """
+    Join the continued lines and replace the comments with spaces, keeping the number of lines.
+
+    Args:
+        text (str): The code.
+
+    Returns:
+        str: The code without comments.
+    """
+    text = text.replace("\\\r\n", "").replace("\\\n", "")
+
+    def replace(match):
+        comment = match.group()
+        if comment.startswith(("/*", "//")):
+            return " " + "\n" * comment.count("\n")
+        return comment
+
+    return COMMENT_PATTERN.sub(replace, text)
+
+
+class Preprocessor:
+    """
+    Minimal in-process C preprocessor.
+
+    Supports #include against the include directories, object-like and function-like macros (with # and ##),
+    #undef and the conditionals #if, #ifdef, #ifndef, #elif, #else and #endif. It is enough for the source files
+    used with the fake libc headers and replaces spawning an external preprocessor for every file.
+    """
+    def __init__(self, include_dirs: list = None, defines: dict = None):
+        """
+        Initialize the preprocessor.
+
+        Args:
+            include_dirs (list): Directories searched for the included files.
+            defines (dict): Additional object-like macros.
+        """
+        self.include_dirs = include_dirs if include_dirs is not None else [FAKE_LIBC_PATH]
+        self.macros = {}
+        for name, value in {**PREDEFINED_MACROS, **(defines or {})}.items():
+            self.macros[name] = Macro(name, None, tokenize(value))
+
+    def preprocess_file(self, file_path: str):
+        """
+        Preprocess a C source file.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            str: The preprocessed code with line markers.
+        """
+        output = []
+        self.process(file_path, output, 0)
+        return "".join(output)
+
+    def preprocess_source(self, code: str, file_name: str, local_dir: str = None):
+        """
+        Preprocess C code held in memory.
+
+        Args:
+            code (str): The code.
+            file_name (str): Name of the file used in the line markers and errors.
+            local_dir (str): Directory searched first for the quoted includes, as the directory of a file on
+                disk. None for an in-memory file, e.g. an upload, whose includes are searched only in the
+                include directories.
+
+        Returns:
+            str: The preprocessed code with line markers.
+        """
+        output = []
+        self.process(file_name, output, 0, code, local_dir)
+        return "".join(output)
+
+    def read(self, file_path: str, cache: bool):
+        if cache and file_path in _source_cache:
+            return _source_cache[file_path]
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            lines = strip_comments(file.read()).split("\n")
+        if cache:
+            _source_cache[file_path] = lines
+        return lines
+
+    def process(self, file_path: str, output: list, depth: int, code: str = None, local_dir: str = None):
+        """
+        Preprocess a file, or the code of an in-memory file if given, and append the result to the output.
+        """
+        if depth > 200:
+            raise PreprocessorError(f"{file_path}: #include nested too deeply")
+        lines = self.read(file_path, cache=depth > 0) if code is None else strip_comments(code).split("\n")
+        if code is None:
+            local_dir = os.path.dirname(file_path)
+        marker_path = file_path.replace("\\", "/")
+
+        # Each condition holds: whether the branch is active, whether any branch was taken, whether the parent is active
+        conditions = []
+        active = True
+        block = []
+        output.append(f'# 1 "{marker_path}"\n')
+
+        def flush():
+            if block:
+                output.append("".join(self.expand(tokenize("\n".join(block) + "\n"), frozenset())))
+                block.clear()
+
+        for number, line in enumerate(lines, 1):
+            directive = DIRECTIVE_PATTERN.match(line)
+            if directive is None:
+                block.append(line if active else "")
+                continue
+            flush()
+            name, argument = directive.groups()
+
+            if name in ("if", "ifdef", "ifndef"):
+                if not active:
+                    taken = True
+                elif name == "ifdef":
+                    taken = argument.split()[0] in self.macros if argument else False
+                elif name == "ifndef":
+                    taken = argument.split()[0] not in self.macros if argument else False
+                else:
+                    taken = self.evaluate(argument, file_path, number)
+                conditions.append([active and taken, taken, active])
+            elif name in ("elif", "else", "endif"):
+                if not conditions:
+                    raise PreprocessorError(f"{file_path}:{number}: #{name} without #if")
+                condition = conditions[-1]
+                if name == "endif":
+                    conditions.pop()
+                elif condition[1] or not condition[2]:
+                    condition[0] = False
+                else:
+                    taken = True if name == "else" else self.evaluate(argument, file_path, number)
+                    condition[0] = taken
+                    condition[1] = taken
+            elif not active:
+                pass
+            elif name == "define":
+                self.define(argument, file_path, number)
+            elif name == "undef":
+                self.macros.pop(argument.split()[0] if argument else "", None)
+            elif name == "include":
+                self.include(argument, file_path, number, output, depth, local_dir)
+                output.append(f'# {number + 1} "{marker_path}"\n')
+                active = not conditions or conditions[-1][0]
+                continue
+            elif name == "pragma":
+                block.append(line)
+                continue
+            elif name == "error":
+                raise PreprocessorError(f"{file_path}:{number}: #error {argument}")
+            active = not conditions or conditions[-1][0]
+            block.append("")
+
+        flush()
+        if conditions:
+            raise PreprocessorError(f"{file_path}: unterminated #if")
+
+    def define(self, argument: str, file_path: str, number: int):
+        """
+        Define a macro from the argument of a #define directive.
+        """
+        match = re.match(r"([A-Za-z_]\w*)(\(([^)]*)\))?\s*(.*)$", argument)
+        if match is None:
+            raise PreprocessorError(f"{file_path}:{number}: invalid macro definition")
+        name, has_params, params, body = match.groups()
+        if has_params is not None:
+            params = [param.strip() for param in params.split(",") if param.strip()]
+        else:
+            params = None
+        self.macros[name] = Macro(name, params, tokenize(body))
+
+    def include(self, argument: str, file_path: str, number: int, output: list, depth: int, local_dir: str):
+        """
+        Preprocess the included file and append it to the output. Files included with quotes are searched
+        first in the local directory, the directory of the including file (None for an in-memory file).
+        Absolute names and names resolving outside of the searched directory are rejected.
+        """
+        match = INCLUDE_PATTERN.match(argument)
+        if match is None:
+            match = INCLUDE_PATTERN.match("".join(self.expand(tokenize(argument), frozenset())).strip())
+        if match is None:
+            raise PreprocessorError(f"{file_path}:{number}: invalid #include")
+
+        name = match.group(1)
+        if os.path.isabs(name) or os.path.splitdrive(name)[0]:
+            raise PreprocessorError(f"{file_path}:{number}: absolute #include paths are not allowed: '{name}'")
+
+        include_dirs = self.include_dirs
+        if argument.startswith('"') and local_dir is not None:
+            include_dirs = [local_dir] + include_dirs
+        for include_dir in include_dirs:
+            # The included file has to stay inside the include directory, also after resolving ".." and links
+            include_dir = os.path.realpath(include_dir)
+            include_path = os.path.realpath(os.path.join(include_dir, name))
+            if os.path.commonpath([include_dir, include_path]) != include_dir:
+                raise PreprocessorError(f"{file_path}:{number}: #include outside of the include directories: '{name}'")
+            if os.path.isfile(include_path):
+                self.process(include_path, output, depth + 1)
+                return
+        raise PreprocessorError(f"{file_path}:{number}: '{match.group(1)}' file not found")
+
+    def evaluate(self, expression: str, file_path: str, number: int):
+        """
+        Evaluate the integer expression of an #if or #elif directive.
+        """
+        expression = re.sub(r"\bdefined\s*\(\s*(\w+)\s*\)|\bdefined\s+(\w+)",
+                            lambda match: "1" if (match.group(1) or match.group(2)) in self.macros else "0", expression)
+        tokens = [token for token in self.expand(tokenize(expression), frozenset()) if not token.isspace()]
+        try:
+            return ConstantExpression(tokens).evaluate() != 0
+        except (PreprocessorError, RecursionError) as e:
+            raise PreprocessorError(f"{file_path}:{number}: invalid #if expression: {expression} ({e})")
+
+    def expand(self, tokens: list, disabled: frozenset):
+        """
+        Expand the macros in the tokens.
+
+        Args:
+            tokens (list): The tokens to expand.
+            disabled (frozenset): Names of the macros being expanded, which are not expanded again.
+
+        Returns:
+            list: The expanded tokens.
+        """
+        out = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            macro = self.macros.get(token)
+            if macro is None or token in disabled:
+                out.append(token)
+                i += 1
+                continue
+
+            if macro.params is None:
+                out.extend(self.expand(macro.body, disabled | {token}))
+                i += 1
+                continue
+
+            # A function-like macro is expanded only when followed by its arguments
+            j = i + 1
+            while j < len(tokens) and tokens[j].isspace():
+                j += 1
+            if j == len(tokens) or tokens[j] != "(":
+                out.append(token)
+                i += 1
+                continue
+            args, end = self.collect_args(tokens, j)
+            body = self.substitute(macro, args, disabled)
+            out.extend(self.expand(body, disabled | {token}))
+            # Keep the number of lines when the arguments span several lines
+            out.extend("\n" for t in tokens[i:end + 1] if t == "\n")
+            i = end + 1
+        return out
+
+    def collect_args(self, tokens: list, start: int):
+        """
+        Collect the arguments of a function-like macro invocation starting at the opening parenthesis.
+
+        Returns:
+            list: The tokens of each argument.
+            int: Index of the closing parenthesis.
+        """
+        args = [[]]
+        level = 0
+        for i in range(start + 1, len(tokens)):
+            token = tokens[i]
+            if token == "(":
+                level += 1
+            elif token == ")":
+                if level == 0:
+                    return [[t for t in arg if t != "\n"] for arg in args], i
+                level -= 1
+            elif token == "," and level == 0:
+                args.append([])
+                continue
+            args[-1].append(token)
+        raise PreprocessorError("unterminated macro invocation")
+
+    def substitute(self, macro: Macro, args: list, disabled: frozenset):
+        """
+        Replace the parameters in the macro body with the arguments.
+        """
+        params = {param: i for i, param in enumerate(macro.params)}
+        if macro.params == [] and args == [[]]:
+            args = []
+        if "..." in params:
+            variadic = params["..."]
+            args = args[:variadic] + [[t for arg_i, arg in enumerate(args[variadic:]) for t in ([","] if arg_i else []) + arg]]
+            params["__VA_ARGS__"] = params.pop("...")
+        if len(args) != len(params):
+            raise PreprocessorError(f"macro '{macro.name}' expects {len(params)} arguments, {len(args)} given")
+
+        body = macro.body
+        out = []
+        i = 0
+        while i < len(body):
+            token = body[i]
+            # Stringification
+            if token == "#" and i + 1 < len(body):
+                j = i + 1
+                while j < len(body) and body[j].isspace():
+                    j += 1
+                if j < len(body) and body[j] in params:
+                    text = "".join(args[params[body[j]]]).strip()
+                    out.append('"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"')
+                    i = j + 1
+                    continue
+            if token in params:
+                arg = args[params[token]]
+                pasted = self.next_non_space(body, i, 1) == "##" or self.next_non_space(body, i, -1) == "##"
+                out.extend(arg if pasted else self.expand(arg, disabled))
+            else:
+                out.append(token)
+            i += 1
+
+        # Token pasting
+        pasted = []
+        i = 0
+        while i < len(out):
+            if out[i] == "##":
+                while pasted and pasted[-1].isspace():
+                    pasted.pop()
+                i += 1
+                while i < len(out) and out[i].isspace():
+                    i += 1
+                if i < len(out):
+                    pasted[-1:] = tokenize((pasted[-1] if pasted else "") + out[i])
+            else:
+                pasted.append(out[i])
+            i += 1
+        return pasted
+
+    @staticmethod
+    def next_non_space(tokens: list, i: int, step: int):
+        i += step
+        while 0 <= i < len(tokens) and tokens[i].isspace():
+            i += step
+        return tokens[i] if 0 <= i < len(tokens) else None
+
+
+def preprocess_python(file_path: str, include_dirs: list):
+    """
+    Preprocess a C file with the in-process preprocessor.
+    """
+    return Preprocessor(include_dirs).preprocess_file(file_path)
+
+
+def parse_c_file(file_path: str, backend: str = None, include_dirs: list = None):
+    """
+    Preprocess and parse a C source file.
+
+    Args:
+        file_path (str): Path to the C source file.
+        backend (str): Preprocessor backend: "python" for the in-process preprocessor or the name of
+            an external preprocessor, e.g. "clang", spawned for the file. Defaults to DEFAULT_BACKEND.
+        include_dirs (list): Directories searched for the included files. Defaults to the fake libc headers.
+
+    Returns:
+        c_ast.FileAST: The parsed AST.
+    """
+    backend = backend or DEFAULT_BACKEND
+    include_dirs = include_dirs or [FAKE_LIBC_PATH]
+    if backend == "python":
+        try:
+            code = preprocess_python(file_path, include_dirs)
+        except PreprocessorError as e:
+            raise c_parser.ParseError(str(e))
+        if not hasattr(_parsers, "parser"):
+            _parsers.parser = c_parser.CParser()
+        return _parsers.parser.parse(code, file_path)
+    return parse_file(file_path, use_cpp=True, cpp_path=backend,
+                      cpp_args=["-E"] + [f"-I{include_dir}" for include_dir in include_dirs] + ["-std=c99"])
+
+
+def parse_c_source(code: str, file_name: str = "<source>", backend: str = None, include_dirs: list = None,
+                   local_dir: str = None):
+    """
+    Preprocess and parse C code held in memory.
+
+    The in-process preprocessor works on the code directly. An external preprocessor needs a file, so the code
+    is written to a temporary file for it.
+
+    Args:
+        code (str): The C code.
+        file_name (str): Name of the file used in the line markers and errors.
+        backend (str): Preprocessor backend, as in parse_c_file.
+        include_dirs (list): Directories searched for the included files. Defaults to the fake libc headers.
+        local_dir (str): Directory of the file on disk the code was read from, searched first for the quoted
+            includes. An external preprocessor searches it first for all includes.
+
+    Returns:
+        c_ast.FileAST: The parsed AST.
+    """
+    backend = backend or DEFAULT_BACKEND
+    include_dirs = include_dirs or [FAKE_LIBC_PATH]
+    if backend == "python":
+        try:
+            code = Preprocessor(include_dirs).preprocess_source(code, file_name, local_dir)
+        except PreprocessorError as e:
+            raise c_parser.ParseError(str(e))
+        if not hasattr(_parsers, "parser"):
+            _parsers.parser = c_parser.CParser()
+        return _parsers.parser.parse(code, file_name)
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, os.path.basename(file_name) or "source.c")
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write(code)
+        return parse_c_file(file_path, backend, ([local_dir] if local_dir is not None else []) + include_dirs)
@@ -2,6 +2,7 @@ import numpy as np
 import random
 import matplotlib
 import ast
+from array import array
 from pycparser import c_parser, c_ast, parse_file
 
 matplotlib.use('Agg')
@@ -60,10 +61,12 @@ def show_2scores(score_list1: list, score_list2: list, yname: str, train_name1:
         plt.show()
         plt.clf()
 
-def pre_walk_tree(node: ast.AST, index: int, edge_index: int):
+def pre_walk_tree_recursive(node: ast.AST, index: int, edge_index: int):
     """
     Pre-walk the Python AST and extract features.
 
+    Recursive reference implementation of pre_walk_tree, used to check that both produce the same output.
+
     Args:
         node (ast.AST): The AST node.
         index (int): The current node index.
@@ -90,7 +93,7 @@ def pre_walk_tree(node: ast.AST, index: int, edge_index: int):
             edge_in_out_indexs_t.extend([index, child_index])
             edge_in_out_head_tail.extend([0, 1])
             child_edge_index = edge_index + 1
-            child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree(
+            child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_recursive(
                 field, child_index, child_edge_index)
             types.extend(child_types)
             features.extend(child_features)
@@ -109,7 +112,7 @@ def pre_walk_tree(node: ast.AST, index: int, edge_index: int):
                 edge_in_out_indexs_s.append(edge_index)
                 edge_in_out_indexs_t.append(child_index)
                 edge_in_out_head_tail.append(1)
-                child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree(item, child_index, child_edge_index)
+                child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_recursive(item, child_index, child_edge_index)
                 types.extend(child_types)
                 features.extend(child_features)
                 edge_types.extend(child_edge_types)
@@ -146,10 +149,12 @@ def pre_walk_tree(node: ast.AST, index: int, edge_index: int):
     return child_index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail
 
 
-def pre_walk_tree_c(node, index, edge_index):
+def pre_walk_tree_c_recursive(node, index, edge_index):
     """
     Pre-walk the C AST and extract features.
 
+    Recursive reference implementation of pre_walk_tree_c, used to check that both produce the same output.
+
     Args:
         node (c_ast.Node): The AST node.
         index (int): The current node index.
@@ -176,7 +181,7 @@ def pre_walk_tree_c(node, index, edge_index):
             edge_in_out_indexs_t.extend([index, child_index])
             edge_in_out_head_tail.extend([0, 1])
             child_edge_index = edge_index + 1
-            child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_c(
+            child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_c_recursive(
                 field, child_index, child_edge_index)
             types.extend(child_types)
             features.extend(child_features)
@@ -195,7 +200,7 @@ def pre_walk_tree_c(node, index, edge_index):
                 edge_in_out_indexs_s.append(edge_index)
                 edge_in_out_indexs_t.append(child_index)
                 edge_in_out_head_tail.append(1)
-                child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_c(
+                child_index, child_edge_index, child_types, child_features, child_edge_types, child_edge_in_out_indexs_s, child_edge_in_out_indexs_t, child_edge_in_out_head_tail = pre_walk_tree_c_recursive(
                     item, child_index, child_edge_index)
                 types.extend(child_types)
                 features.extend(child_features)
@@ -231,3 +236,135 @@ def pre_walk_tree_c(node, index, edge_index):
             edge_index += 1
 
     return child_index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail
+
+
+
+# Marks the end of an iterator in walk_tree
+_END = object()
+
+
+def walk_tree(node, index: int, edge_index: int, iter_fields, node_class):
+    """
+    Pre-walk an AST iteratively and extract features.
+
+    The tree is walked in pre-order with an explicit stack, so deep trees do not hit the recursion limit,
+    and the results are written in one pass into growable arrays shared by the whole walk.
+
+    Args:
+        node: The root AST node.
+        index (int): The index of the root node.
+        edge_index (int): The index of the first edge.
+        iter_fields (callable): Function returning the (field_name, field) pairs of a node.
+        node_class (type): Base class of the AST nodes.
+
+    Returns:
+        tuple: A tuple containing the updated indices, types, features, edge types, and edge indices.
+    """
+    types = []
+    features = []
+    edge_types = []
+    edge_in_out_indexs_s, edge_in_out_indexs_t = array('q'), array('q')
+    edge_in_out_head_tail = array('q')
+
+    # Each frame holds: node index, iterator over the node fields, iterator over the pending list items, list edge index
+    types.append("ast")
+    features.append(str(type(node)))
+    stack = [[index, iter(iter_fields(node)), None, 0]]
+    child_index = index + 1
+
+    while stack:
+        frame = stack[-1]
+        index = frame[0]
+
+        # Continue with the items of a list of nodes
+        if frame[2] is not None:
+            item = next(frame[2], _END)
+            if item is not _END:
+                edge_in_out_indexs_s.append(frame[3])
+                edge_in_out_indexs_t.append(child_index)
+                edge_in_out_head_tail.append(1)
+                types.append("ast")
+                features.append(str(type(item)))
+                stack.append([child_index, iter(iter_fields(item)), None, 0])
+                child_index += 1
+                continue
+            frame[2] = None
+
+        field_name, field = next(frame[1], (_END, None))
+        if field_name is _END:
+            stack.pop()
+        elif isinstance(field, node_class):
+            edge_types.append(field_name)
+            edge_in_out_indexs_s.extend((edge_index, edge_index))
+            edge_in_out_indexs_t.extend((index, child_index))
+            edge_in_out_head_tail.extend((0, 1))
+            edge_index += 1
+            types.append("ast")
+            features.append(str(type(field)))
+            stack.append([child_index, iter(iter_fields(field)), None, 0])
+            child_index += 1
+        elif isinstance(field, list) and field and isinstance(field[0], node_class):
+            edge_types.append(field_name)
+            edge_in_out_indexs_s.append(edge_index)
+            edge_in_out_indexs_t.append(index)
+            edge_in_out_head_tail.append(0)
+            frame[2] = iter(field)
+            frame[3] = edge_index
+            edge_index += 1
+        elif isinstance(field, list) and field:
+            edge_types.append(field_name)
+            edge_in_out_indexs_s.append(edge_index)
+            edge_in_out_indexs_t.append(index)
+            edge_in_out_head_tail.append(0)
+            for item in field:
+                types.append("ident")
+                features.append(str(item))
+                edge_in_out_indexs_s.append(edge_index)
+                edge_in_out_indexs_t.append(child_index)
+                edge_in_out_head_tail.append(1)
+                child_index += 1
+            edge_index += 1
+        elif field:
+            edge_types.append(field_name)
+            edge_in_out_indexs_s.append(edge_index)
+            edge_in_out_indexs_t.append(index)
+            edge_in_out_head_tail.append(0)
+            types.append("ident")
+            features.append(str(field))
+            edge_in_out_indexs_s.append(edge_index)
+            edge_in_out_indexs_t.append(child_index)
+            edge_in_out_head_tail.append(1)
+            child_index += 1
+            edge_index += 1
+
+    return child_index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail
+
+
+def pre_walk_tree(node: ast.AST, index: int, edge_index: int):
+    """
+    Pre-walk the Python AST and extract features.
+
+    Args:
+        node (ast.AST): The AST node.
+        index (int): The current node index.
+        edge_index (int): The current edge index.
+
+    Returns:
+        tuple: A tuple containing the updated indices, types, features, edge types, and edge indices.
+    """
+    return walk_tree(node, index, edge_index, ast.iter_fields, ast.AST)
+
+
+def pre_walk_tree_c(node, index, edge_index):
+    """
+    Pre-walk the C AST and extract features.
+
+    Args:
+        node (c_ast.Node): The AST node.
+        index (int): The current node index.
+        edge_index (int): The current edge index.
+
+    Returns:
+        tuple: A tuple containing the updated indices, types, features, edge types, and edge indices.
+    """
+    return walk_tree(node, index, edge_index, lambda n: n.children(), c_ast.Node)
@@ -1,11 +1,12 @@
 import argparse
 import ast
-from pycparser import c_parser, c_ast, parse_file
+from pycparser import c_parser, c_ast
 from collections import Counter
 from colorama import Fore, Style
 import json
 
 from utilities.utils import pre_walk_tree, pre_walk_tree_c
+from utilities.preprocessor import parse_c_file
 
 
 class VocabEntry:
@@ -109,7 +110,7 @@ class Vocab:
         for file_path in paths_file:
             file_path = file_path.strip()
             try:
-                root = parse_file(file_path, use_cpp=True, cpp_path="clang", cpp_args=["-E", "-I" + "utilities/fake_libc_include", "-std=c99"])
+                root = parse_c_file(file_path)
                 index, edge_index, types, features, edge_types, edge_in_out_indexs_s, edge_in_out_indexs_t, edge_in_out_head_tail = pre_walk_tree_c(root, 0, 0)
                 for (type, feature) in zip(types, features):
                     if type in tokens:
@@ -0,0 +1,207 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """
+    Error raised when a job is submitted while the maximum number of pending jobs is reached.
+    """
+    pass
+
+
+class PredictionJob:
+    """
+    A batch of uploaded files predicted in the background, chunk by chunk.
+
+    The job moves from "queued" to "running" and ends as "done", "failed" or "cancelled". Progress is the number
+    of processed files, updated after every chunk, which is also the point where a cancelled job stops.
+    """
+    def __init__(self, file_names: list, sources: list, results_size: int):
+        self.id = uuid.uuid4()
+        self.file_names = file_names
+        self.sources = sources
+        self.results_size = results_size
+        self.status = "queued"
+        self.progress = 0
+        self.results = []
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.future = None
+        self.condition = threading.Condition()
+
+    @property
+    def total(self):
+        return len(self.file_names)
+
+    def is_finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def update(self, **fields):
+        """
+        Change the fields of the job and wake up the clients waiting for it.
+        """
+        with self.condition:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if self.is_finished():
+                self.finished = time.time()
+                # The uploaded contents are not needed anymore
+                self.sources = None
+            self.condition.notify_all()
+
+    def wait(self, timeout: float, progress: int = None):
+        """
+        Wait until the job finishes or, if progress is given, until its progress differs from it.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+            progress (int): Progress known by the client.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.is_finished() or (progress is not None and self.progress != progress), timeout)
+
+    def to_dict(self):
+        """
+        Return the state of the job for the response. The results are included only when the job is done.
+        """
+        with self.condition:
+            return {
+                "id": str(self.id),
+                "status": self.status,
+                "progress": self.progress,
+                "total": self.total,
+                "results": self.results if self.status == "done" else None,
+                "error": self.error,
+            }
+
+
+class JobQueue:
+    """
+    Process-wide queue of the prediction jobs run by a local pool of worker threads.
+
+    The models are shared with the request threads through the process-wide registry, so the workers do not
+    load their own copies. The jobs are kept in memory, so they are visible only in the server process that
+    received them.
+    """
+    def __init__(self, max_concurrent_jobs: int = 2, max_pending_jobs: int = 32, max_job_bytes: int = 16 * 1024 * 1024,
+                 chunk_size: int = 8, result_ttl: float = 600.0, max_wait: float = 30.0):
+        """
+        Initialize the queue.
+
+        Args:
+            max_concurrent_jobs (int): Maximum number of jobs running at once, the size of the worker pool.
+            max_pending_jobs (int): Maximum number of queued and running jobs, further jobs are rejected.
+            max_job_bytes (int): Maximum total size of the files of a job. The files are kept in memory until the
+                job finishes, so the pending jobs hold at most max_pending_jobs * max_job_bytes bytes.
+            chunk_size (int): Number of files predicted in one batch, between the progress updates.
+            result_ttl (float): Number of seconds the finished jobs are kept.
+            max_wait (float): Maximum number of seconds a client can wait for a job in one request.
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_pending_jobs = max_pending_jobs
+        self.max_job_bytes = max_job_bytes
+        self.chunk_size = chunk_size
+        self.result_ttl = result_ttl
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="prediction-job")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job: PredictionJob, predict):
+        """
+        Queue a job.
+
+        Args:
+            job (PredictionJob): The job.
+            predict: Function predicting a chunk, called with the file names, the results size and the sources,
+                returning the results of the files.
+
+        Returns:
+            PredictionJob: The queued job.
+        """
+        with self.lock:
+            self.remove_expired()
+            if sum(not queued.is_finished() for queued in self.jobs.values()) >= self.max_pending_jobs:
+                raise JobQueueFull(f"The maximum number of pending jobs ({self.max_pending_jobs}) is reached.")
+            self.jobs[job.id] = job
+            job.future = self.executor.submit(self.run, job, predict)
+        return job
+
+    def run(self, job: PredictionJob, predict):
+        """
+        Predict the files of a job chunk by chunk.
+        """
+        if job.cancelled.is_set():
+            job.update(status="cancelled")
+            return
+        job.update(status="running")
+        try:
+            for start in range(0, job.total, self.chunk_size):
+                if job.cancelled.is_set():
+                    job.update(status="cancelled")
+                    return
+                end = start + self.chunk_size
+                results = predict(job.file_names[start:end], job.results_size, job.sources[start:end])
+                job.update(results=job.results + results, progress=min(end, job.total))
+            job.update(status="done")
+        except Exception as e:
+            job.update(status="failed", error=f"{type(e).__name__}: {e}")
+
+    def get(self, job_id: uuid.UUID):
+        """
+        Return a job, None if there is no such job or it expired.
+        """
+        with self.lock:
+            self.remove_expired()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: uuid.UUID):
+        """
+        Cancel a job. A queued job is cancelled at once, a running job stops before its next chunk.
+
+        Returns:
+            PredictionJob: The job, None if there is no such job.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.is_finished():
+            job.cancelled.set()
+            if job.future.cancel():
+                job.update(status="cancelled")
+        return job
+
+    def remove_expired(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and now - job.finished > self.result_ttl:
+                del self.jobs[job_id]
+
+
+job_queue = None
+
+
+def get_job_queue():
+    """
+    Return the process-wide job queue, creating it with the default settings if necessary.
+    """
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue()
+    return job_queue
+
+
+def configure_job_queue(**settings):
+    """
+    Replace the process-wide job queue with one using the given settings (the arguments of JobQueue).
+
+    Returns:
+        JobQueue: The new queue.
+    """
+    global job_queue
+    if job_queue is not None:
+        job_queue.executor.shutdown(wait=False)
+    job_queue = JobQueue(**settings)
+    return job_queue
@@ -5,13 +5,20 @@ from rest_framework.parsers import MultiPartParser
 from rest_framework import status
 import json
 
-from backend.settings import BASE_DIR, MEDIA_ROOT
+from backend.settings import PREDICTION_CACHE, PREDICTION_BACKEND, REFERENCE_STORE, PREDICTION_JOBS
 
 from .models import *
 from .serializer import *
+from .jobs import PredictionJob, JobQueueFull, get_job_queue, configure_job_queue
 
 import HDHGN.PredictFile
 
+# Set up the prediction cache, the model backend, the reference files and the prediction jobs from the settings
+HDHGN.PredictFile.configure_prediction_cache(**PREDICTION_CACHE)
+HDHGN.PredictFile.configure_registry(PREDICTION_BACKEND)
+HDHGN.PredictFile.configure_reference_stores(**REFERENCE_STORE)
+configure_job_queue(**PREDICTION_JOBS)
+
 
 # Class-based view for handling Text-related data (text input)
 class TextView(APIView):
@@ -131,15 +138,10 @@ class FilePredictView(APIView):
         if not files:
             return Response({"error": "No files provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create a serializer instance with the request data and run the file prediction
-        results = []
-        for file in files:
-            file_instance = File.objects.create(file=file)
-            # Run file prediction
-            file_path = os.path.join(MEDIA_ROOT,"uploads", file.name)
-            results.append(self.runFilePrediction(file_path, results_size))
-            # Delete the File instance from db and storage
-            file_instance.delete()
+        # Run the prediction for all files at once on the uploaded contents, without saving them
+        file_names = [file.name for file in files]
+        sources = [file.read() for file in files]
+        results = self.runFilesPrediction(file_names, results_size, sources)
 
         return Response(json.dumps(results), status=status.HTTP_201_CREATED)
 
@@ -163,16 +165,33 @@ class FilePredictView(APIView):
         }
         '''
         results, file_lang = HDHGN.PredictFile.predict(file_path)
-        
+        return self.formatPrediction(file_path, results, file_lang, results_size)
+
+    def runFilesPrediction(self, file_paths, results_size, sources=None):
+        '''
+        Run batched file prediction using HDHGN, with one forward pass per language.
+        If the contents of the files are given as bytes in sources, the files are not read and file_paths are only their names.
+
+        Returns:
+        list: Results for each file in the order of file_paths, in the format of runFilePrediction.
+        '''
+        predictions = HDHGN.PredictFile.predict_batch(file_paths, sources=sources)
+        return [self.formatPrediction(file_path, results, file_lang, results_size)
+                for file_path, (results, file_lang) in zip(file_paths, predictions)]
+
+    def formatPrediction(self, file_path, results, file_lang, results_size):
+        '''
+        Build the response entry for a single predicted file with the contents of the top results_size files.
+        '''
         files_contents = []
         results_contents = []
         if (results is not None):
+            # The contents of the reference files are kept in memory
+            reference_store = HDHGN.PredictFile.get_reference_store(file_lang)
             for i in range(len(results) if len(results) < results_size else results_size):
                 file_name = results[i][0] + (".c" if file_lang == "C" else ".py")
-                new_path = os.path.join(BASE_DIR, "HDHGN", "data", f"txt_{file_lang.lower()}_files", file_name)
-                with open(new_path, 'r') as file:
-                    file_content = file.read()
-                    files_contents.append((file_name, file_content))
+                # A label without a stored file is read from the disk
+                files_contents.append((file_name, reference_store.read(os.path.join(reference_store.directory, file_name))))
                 results_contents.append((results[i][0], results[i][1], results[i][2]))
         
         if results is not None:
@@ -186,4 +205,112 @@ class FilePredictView(APIView):
             results_dict = None
             
         return results_dict
-    
\ No newline at end of file
+
+
+class FileSimilarView(APIView):
+    parser_classes = [MultiPartParser]
+
+    # POST method to upload files and find the most similar files of the indexed corpus
+    def post(self, request, results_size=5):
+        # Check if the request is valid
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Search for all files at once on the uploaded contents, without saving them
+        file_names = [file.name for file in files]
+        sources = [file.read() for file in files]
+        try:
+            results = self.runFilesSearch(file_names, results_size, sources)
+        except HDHGN.PredictFile.IndexNotBuilt as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(json.dumps(results), status=status.HTTP_201_CREATED)
+
+    def runFilesSearch(self, file_paths, results_size, sources=None):
+        '''
+        Find the files most similar to each uploaded file in the embedding index of its language.
+        If the contents of the files are given as bytes in sources, the files are not read and file_paths are only their names.
+
+        Returns:
+        list: Results for each file in the order of file_paths: {
+            file_name: str,
+            file_lang: str,
+            results: [(
+                file_name: str,
+                similarity: float
+            )],
+            files_contents: [(
+                file_name: str,
+                file_content: str
+            )]
+        }
+        '''
+        searches = HDHGN.PredictFile.find_similar(file_paths, results_size, sources)
+        results = []
+        for file_path, (similar, file_lang) in zip(file_paths, searches):
+            if similar is None:
+                results.append(None)
+                continue
+            reference_store = HDHGN.PredictFile.get_reference_store(file_lang)
+            files_contents = [(file_name, reference_store.read(similar_path)) for file_name, similar_path, similarity in similar]
+            results.append({
+                "file_name": os.path.basename(file_path),
+                "file_lang": file_lang,
+                "results": [(file_name, similarity) for file_name, similar_path, similarity in similar],
+                "files_contents": files_contents
+            })
+        return results
+
+
+class PredictJobView(FilePredictView):
+    parser_classes = [MultiPartParser]
+
+    # POST method to upload files and queue their prediction
+    def post(self, request, results_size=5):
+        # Check if the request is valid
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The uploaded contents are kept in memory until the job finishes, so their size is limited
+        job_queue = get_job_queue()
+        total_size = sum(file.size for file in files)
+        if total_size > job_queue.max_job_bytes:
+            return Response({"error": f"The files have {total_size} bytes, a job can have at most {job_queue.max_job_bytes} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Queue the prediction of the uploaded contents, the results are polled at /predict/jobs/<id>/
+        job = PredictionJob([file.name for file in files], [file.read() for file in files], results_size)
+        try:
+            job_queue.submit(job, self.runFilesPrediction)
+        except JobQueueFull as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(job.to_dict(), status=status.HTTP_202_ACCEPTED)
+
+
+class PredictJobDetailView(APIView):
+    # GET method to poll the state of a prediction job, waiting up to "wait" seconds for it to finish
+    # or for its progress to differ from "progress"
+    def get(self, request, job_id):
+        job_queue = get_job_queue()
+        job = job_queue.get(job_id)
+        if job is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            wait = min(max(float(request.query_params.get('wait', 0)), 0), job_queue.max_wait)
+            progress = request.query_params.get('progress')
+            progress = int(progress) if progress is not None else None
+        except ValueError:
+            return Response({"error": "Invalid wait or progress."}, status=status.HTTP_400_BAD_REQUEST)
+        if wait > 0:
+            job.wait(wait, progress)
+        return Response(job.to_dict(), status=status.HTTP_200_OK)
+
+    # DELETE method to cancel a prediction job
+    def delete(self, request, job_id):
+        job = get_job_queue().cancel(job_id)
+        if job is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(job.to_dict(), status=status.HTTP_200_OK)
@@ -131,6 +131,32 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache of the prediction results (set 'path' to None to keep the cache only in memory)
+PREDICTION_CACHE = {
+    'max_size': 1024,
+    'path': os.path.join(BASE_DIR, 'cache', 'predictions.sqlite3'),
+}
+
+# Contents of the reference files returned with the predictions, kept in memory and reloaded when the files change
+REFERENCE_STORE = {
+    'check_files': True,
+    'check_interval': 1.0,
+    'preload': True,
+}
+
+# Prediction jobs run in the background by a pool of threads of the server process
+PREDICTION_JOBS = {
+    'max_concurrent_jobs': 2,
+    'max_pending_jobs': 32,
+    'max_job_bytes': 16 * 1024 * 1024,
+    'chunk_size': 8,
+    'result_ttl': 600,
+    'max_wait': 30,
+}
+
+# Backend running the HDHGN models: 'eager' (pickled models), 'torchscript', 'onnx' or 'int8' (models exported by HDHGN/ExportModel.py)
+PREDICTION_BACKEND = os.environ.get('HDHGN_BACKEND', 'eager')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
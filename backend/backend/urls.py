@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
-from app.views import TextView, FileListView, FileSingleView, FilePredictView
+from app.views import TextView, FileListView, FileSingleView, FilePredictView, FileSimilarView, PredictJobView, PredictJobDetailView
 from backend import settings
 
 urlpatterns = [
@@ -27,6 +27,9 @@ urlpatterns = [
     path('file/', FileListView.as_view(), name="file"),
     path('file/<int:pk>/', FileSingleView.as_view(), name="file-by-id"),
     path('predict/<int:results_size>/', FilePredictView.as_view(), name="predict-file"),
+    path('similar/<int:results_size>/', FileSimilarView.as_view(), name="similar-files"),
+    path('predict/jobs/<int:results_size>/', PredictJobView.as_view(), name="predict-job"),
+    path('predict/jobs/<uuid:job_id>/', PredictJobDetailView.as_view(), name="predict-job-by-id"),
 ]
 
 if settings.DEBUG: